@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark comparing the per-cell conversion loop previously used in
+migrate_data with the precompiled row converter, on a synthetic logs table.
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+
+from migrate_sqlite_to_pg import (
+    DEFAULT_CHUNK_SIZE,
+    compile_row_converter,
+    convert_type,
+    iter_table_chunks,
+)
+
+# one-hub logs 表结构
+LOGS_DDL = """
+CREATE TABLE logs (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    created_at INTEGER,
+    type INTEGER,
+    content TEXT,
+    username TEXT,
+    token_name TEXT,
+    model_name TEXT,
+    quota INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    channel_id INTEGER,
+    request_time INTEGER,
+    is_stream numeric,
+    metadata JSON
+);
+"""
+
+# convert_type 结果对应的 information_schema.columns.data_type
+PG_DATA_TYPES = {
+    "BIGINT": "bigint",
+    "BOOLEAN": "boolean",
+    "TEXT": "text",
+    "JSONB": "jsonb",
+    "NUMERIC(10,2)": "numeric",
+}
+
+def legacy_convert_rows(table, rows, columns, col_info, pg_col_types):
+    """
+    原 migrate_data 中逐单元格判断类型的转换循环
+    """
+    converted_rows = []
+    for row in rows:
+        converted_row = []
+        for i, value in enumerate(row):
+            col_name = columns[i]
+            col_type = col_info[i][2].lower()
+            pg_type = pg_col_types.get(col_name, "").lower()
+            is_pk = col_info[i][5]
+
+            if is_pk and value is None:
+                raise ValueError(f"Primary key column {col_name} cannot be null")
+
+            if pg_type == "boolean":
+                if value in [1, "1", "true", "True", "TRUE", "t", "T"]:
+                    converted_row.append(True)
+                elif value in [0, "0", "false", "False", "FALSE", "f", "F"]:
+                    converted_row.append(False)
+                else:
+                    converted_row.append(None)
+            elif col_type in ["numeric", "decimal", "real"] or pg_type == "numeric":
+                try:
+                    converted_row.append(float(value) if value is not None else None)
+                except (ValueError, TypeError):
+                    converted_row.append(None)
+            elif col_type in ["integer", "bigint"]:
+                if is_pk:
+                    converted_row.append(int(value))
+                else:
+                    converted_row.append(int(value) if value is not None else None)
+            else:
+                if table == "users" and col_name == "access_token":
+                    converted_row.append(str(value)[:32] if value else None)
+                else:
+                    converted_row.append(value)
+        converted_rows.append(tuple(converted_row))
+    return converted_rows
+
+def build_logs_table(rows):
+    """
+    在内存中生成指定行数的 logs 表
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute(LOGS_DDL)
+    rng = random.Random(42)
+    models = ["gpt-4o", "gpt-4o-mini", "claude-3-5-sonnet", "gemini-1.5-pro"]
+    conn.executemany(
+        "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        (
+            (
+                i,
+                rng.randint(1, 500),
+                1700000000 + i,
+                2,
+                f"模型倍率 {rng.random():.2f}",
+                f"user{i % 500}",
+                "default",
+                rng.choice(models),
+                rng.randint(0, 100000),
+                rng.randint(0, 4000),
+                rng.randint(0, 4000),
+                rng.randint(1, 50),
+                rng.randint(100, 30000),
+                rng.randint(0, 1),
+                None if i % 4 else '{"is_stream": true}',
+            )
+            for i in range(1, rows + 1)
+        ),
+    )
+    conn.commit()
+    return conn
+
+def run(label, convert_chunk, conn, col_info, chunk_size):
+    """
+    分块读取整张表并转换，返回 (转换耗时, 转换后的行数)
+    """
+    elapsed = 0.0
+    total = 0
+    for rows in iter_table_chunks(conn, "logs", col_info, chunk_size):
+        start = time.perf_counter()
+        converted = convert_chunk(rows)
+        elapsed += time.perf_counter() - start
+        total += len(converted)
+    print(f"{label:<12} {elapsed:8.3f}s  {total / elapsed:12.0f} rows/s")
+    return elapsed, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark row conversion for migrate_data")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows in the synthetic logs table")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print(f"Building synthetic logs table with {args.rows} rows...")
+    conn = build_logs_table(args.rows)
+    col_info = conn.execute("PRAGMA table_info(logs);").fetchall()
+    columns = [col[1] for col in col_info]
+    pg_col_types = {
+        col[1]: PG_DATA_TYPES.get(convert_type(col[2], "logs", col[1]), "text")
+        for col in col_info
+    }
+
+    # 确认两种实现结果一致
+    sample = conn.execute("SELECT * FROM logs LIMIT 1000;").fetchall()
+    convert_row = compile_row_converter("logs", col_info, pg_col_types)
+    legacy = legacy_convert_rows("logs", sample, columns, col_info, pg_col_types)
+    if legacy != list(map(convert_row, sample)):
+        raise SystemExit("Converter output differs from the legacy loop")
+
+    legacy_time, _ = run(
+        "legacy",
+        lambda rows: legacy_convert_rows("logs", rows, columns, col_info, pg_col_types),
+        conn,
+        col_info,
+        args.chunk_size,
+    )
+    compiled_time, _ = run(
+        "compiled",
+        lambda rows: list(map(convert_row, rows)),
+        conn,
+        col_info,
+        args.chunk_size,
+    )
+    print(f"Speedup: {legacy_time / compiled_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
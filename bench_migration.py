@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+End-to-end migration benchmark.
+
+Generates (or reuses) a one-hub SQLite database, runs the phases of
+migrate_sqlite_to_pg.py against PostgreSQL and records rows/sec, peak RSS
+and per-phase timings as JSON so runs can be compared.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import psycopg
+
+from db_conn import ConnectionPool, get_db_config, load_config
+from gen_onehub_db import SCALES, generate_database
+from metrics import peak_rss_bytes
+from migrate_sqlite_to_pg import (
+    add_migration_arguments,
+    build_migration_options,
+    count_table_rows,
+    list_tables,
+    open_source_sqlite,
+    remove_sqlite_snapshot,
+    run_migration,
+    take_sqlite_snapshot,
+)
+
+def find_free_port():
+    """
+    获取一个空闲的本地端口
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@contextmanager
+def throwaway_cluster(pg_bin, keep=False):
+    """
+    使用 initdb 创建临时 PostgreSQL 集群，退出时停止并删除
+    """
+    data_dir = tempfile.mkdtemp(prefix="bench_pg_")
+    port = find_free_port()
+    initdb = os.path.join(pg_bin, "initdb") if pg_bin else "initdb"
+    pg_ctl = os.path.join(pg_bin, "pg_ctl") if pg_bin else "pg_ctl"
+    subprocess.run(
+        [initdb, "-D", data_dir, "-U", "postgres", "--auth=trust", "-E", "UTF8", "--locale=C.UTF-8"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    subprocess.run(
+        [pg_ctl, "-D", data_dir, "-o", f"-p {port} -k {data_dir}", "-l",
+         os.path.join(data_dir, "server.log"), "-w", "start"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    print(f"Started throwaway PostgreSQL cluster in {data_dir} on port {port}")
+    try:
+        with psycopg.connect(
+            dbname="postgres", user="postgres", host="127.0.0.1", port=port, autocommit=True
+        ) as admin_conn:
+            admin_conn.execute("CREATE DATABASE bench;")
+        yield {"dbname": "bench", "user": "postgres", "password": "", "host": "127.0.0.1", "port": port}
+    finally:
+        subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
+        if keep:
+            print(f"Kept cluster data directory: {data_dir}")
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+def configured_database():
+    """
+    从 config.toml（或环境变量）读取目标 PostgreSQL，与 migrate_sqlite_to_pg.py 一致
+    """
+    config = load_config()
+    if not config:
+        raise SystemExit("Failed to load configuration. Use --initdb for a throwaway cluster.")
+    return get_db_config(config, "cloud")
+
+def run_benchmark(args, sqlite_db_file, pg_db_config):
+    """
+    对指定的 SQLite 文件和 PostgreSQL 执行一次完整迁移并汇总结果
+    """
+    options = build_migration_options(args, {}, sqlite_db_file, pg_db_config)
+    if not options:
+        raise SystemExit("Invalid migration options")
+
+    snapshot_seconds = None
+    if options["snapshot"]:
+        start = time.perf_counter()
+        options["sqlite_db_file"] = take_sqlite_snapshot(sqlite_db_file, options["snapshot"], options["snapshot_dir"])
+        options["immutable"] = True
+        snapshot_seconds = round(time.perf_counter() - start, 3)
+
+    # 阶段耗时由 run_migration 记录在 MetricsRecorder 中，--metrics-file 等参数同样生效
+    metrics = options["metrics"]
+    profiler = options["profiler"]
+    succeeded = False
+    sqlite_conn = open_source_sqlite(options)
+    pg_pool = ConnectionPool(pg_db_config, max_size=options["jobs"])
+    try:
+        rows_by_table = count_table_rows(sqlite_conn, list_tables(sqlite_conn, options))
+        with pg_pool.connection() as pg_conn:
+            server_version = pg_conn.info.parameter_status("server_version")
+
+        run_migration(sqlite_conn, pg_pool, options)
+        succeeded = True
+    finally:
+        sqlite_conn.close()
+        pg_pool.close()
+        if options["snapshot"]:
+            remove_sqlite_snapshot(options["sqlite_db_file"])
+        metrics.close(succeeded)
+        if profiler:
+            print(profiler.close())
+
+    phases = {
+        name: {"seconds": record["seconds"], "peak_rss_bytes": record["peak_rss_bytes"]}
+        for name, record in metrics.phase_records().items()
+    }
+    total_rows = sum(rows_by_table.values())
+    data_phase = next(
+        phases[name] for name in ["migrate_data", "migrate_tables_parallel", "sync_tables"] if name in phases
+    )
+    return {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "postgresql": server_version,
+        "sqlite_file": sqlite_db_file,
+        "sqlite_size_bytes": os.path.getsize(sqlite_db_file),
+        "options": {
+            key: value for key, value in options.items() if key not in ["sqlite_db_file", "pg_db_config", "catalog", "metrics", "profiler"]
+        },
+        "tables": rows_by_table,
+        "rows": total_rows,
+        "rows_per_sec": round(total_rows / data_phase["seconds"]) if data_phase["seconds"] else None,
+        "snapshot_seconds": snapshot_seconds,
+        "total_seconds": round(sum(phase["seconds"] for phase in phases.values()), 3),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "phases": phases,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark migrate_sqlite_to_pg.py on a synthetic one-hub database")
+    parser.add_argument("--sqlite-file", default=None, help="Existing SQLite database to migrate (default: generate one)")
+    parser.add_argument(
+        "--scale",
+        choices=SCALES,
+        default="10k",
+        help="Size of the generated database, by number of logs rows (default: 10k)",
+    )
+    parser.add_argument("--logs-rows", type=int, default=None, help="Exact number of generated logs rows, overrides --scale")
+    parser.add_argument(
+        "--initdb",
+        action="store_true",
+        help="Run against a throwaway cluster created with initdb instead of postgresql.cloud in config.toml",
+    )
+    parser.add_argument("--pg-bin", default=None, help="Directory containing initdb and pg_ctl (default: PATH)")
+    parser.add_argument("--keep-cluster", action="store_true", help="Do not delete the throwaway cluster's data directory")
+    parser.add_argument("--label", default=None, help="Free-form label stored in the result, e.g. a commit id")
+    parser.add_argument("--output", default=None, help="Append the JSON result as one line to this file")
+    add_migration_arguments(parser)
+    args = parser.parse_args()
+
+    work_dir = None
+    sqlite_db_file = args.sqlite_file
+    if not sqlite_db_file:
+        work_dir = tempfile.mkdtemp(prefix="bench_sqlite_")
+        sqlite_db_file = os.path.join(work_dir, "one-api.db")
+        logs_rows = args.logs_rows or SCALES[args.scale]
+        start = time.perf_counter()
+        generate_database(
+            sqlite_db_file,
+            logs_rows,
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "sqlite_status.txt"),
+        )
+        print(f"Generated benchmark database in {time.perf_counter() - start:.2f}s")
+
+    try:
+        if args.initdb:
+            with throwaway_cluster(args.pg_bin, args.keep_cluster) as pg_db_config:
+                result = run_benchmark(args, sqlite_db_file, pg_db_config)
+        else:
+            result = run_benchmark(args, sqlite_db_file, configured_database())
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = json.dumps(result, ensure_ascii=False, default=str)
+    print(report)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Load the PostgreSQL catalog of one schema in a few queries.
+
+information_schema views are slow (especially on remote hosts) and the
+scripts used to query them once or several times per table. load_catalog
+reads all tables with their estimated row counts, columns, primary, unique
+and foreign keys, indexes and owned sequences from pg_catalog in four
+queries. CatalogCache keeps the snapshot in memory for a whole run and
+reloads a single table after it has been created or altered.
+"""
+
+import threading
+
+# 表和列：列类型的写法与 information_schema.columns 的 data_type 一致（format_type 不带修饰符）
+TABLES_QUERY = """
+SELECT c.relname, c.reltuples::bigint, a.attname, format_type(a.atttypid, NULL),
+       CASE WHEN a.atttypid IN ('varchar'::regtype, 'bpchar'::regtype) AND a.atttypmod >= 0
+            THEN a.atttypmod - 4 END,
+       CASE WHEN a.atttypid = 'numeric'::regtype AND a.atttypmod >= 0
+            THEN ((a.atttypmod - 4) >> 16) & 65535 END,
+       CASE WHEN a.atttypid = 'numeric'::regtype AND a.atttypmod >= 0
+            THEN (a.atttypmod - 4) & 65535 END,
+       a.attnotnull, pg_get_expr(d.adbin, d.adrelid)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+WHERE n.nspname = COALESCE(%(schema)s, current_schema()) AND c.relkind IN ('r', 'p')
+  AND (%(tables)s::text[] IS NULL OR c.relname = ANY(%(tables)s::text[]))
+ORDER BY c.relname, a.attnum;
+"""
+
+# 主键、唯一约束和外键，列按约束中的顺序排列
+CONSTRAINTS_QUERY = """
+SELECT c.relname, con.conname, con.contype,
+       ARRAY(SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+             ORDER BY k.ord),
+       CASE WHEN con.contype = 'f' THEN con.confrelid::regclass::text END,
+       ARRAY(SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+             ORDER BY k.ord)
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = COALESCE(%(schema)s, current_schema()) AND con.contype IN ('p', 'u', 'f')
+  AND (%(tables)s::text[] IS NULL OR c.relname = ANY(%(tables)s::text[]))
+ORDER BY c.relname, con.conname;
+"""
+
+# 主键以外的普通列索引（不含表达式索引和部分索引），列按索引中的顺序排列
+INDEXES_QUERY = """
+SELECT c.relname, ic.relname, i.indisunique,
+       ARRAY(SELECT a.attname FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+             ORDER BY k.ord)
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indrelid
+JOIN pg_class ic ON ic.oid = i.indexrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = COALESCE(%(schema)s, current_schema()) AND NOT i.indisprimary
+  AND i.indpred IS NULL AND i.indexprs IS NULL
+  AND (%(tables)s::text[] IS NULL OR c.relname = ANY(%(tables)s::text[]))
+ORDER BY c.relname, ic.relname;
+"""
+
+# 属于某一列的序列（serial 或 identity 列）
+SEQUENCES_QUERY = """
+SELECT t.relname, a.attname, quote_ident(sn.nspname) || '.' || quote_ident(s.relname)
+FROM pg_class s
+JOIN pg_namespace sn ON sn.oid = s.relnamespace
+JOIN pg_depend d ON d.classid = 'pg_class'::regclass AND d.objid = s.oid
+     AND d.refclassid = 'pg_class'::regclass AND d.deptype IN ('a', 'i')
+JOIN pg_class t ON t.oid = d.refobjid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = d.refobjsubid
+WHERE s.relkind = 'S' AND n.nspname = COALESCE(%(schema)s, current_schema())
+  AND (%(tables)s::text[] IS NULL OR t.relname = ANY(%(tables)s::text[]))
+ORDER BY t.relname, a.attnum;
+"""
+
+class ColumnInfo:
+    """
+    单个列的定义，字段与 information_schema.columns 对应
+    """
+
+    def __init__(self, name, data_type, length, precision, scale, not_null, default):
+        self.name = name
+        self.data_type = data_type
+        self.character_maximum_length = length
+        self.numeric_precision = precision
+        self.numeric_scale = scale
+        self.not_null = not_null
+        self.default = default
+
+    def to_dict(self):
+        return {
+            "data_type": self.data_type,
+            "character_maximum_length": self.character_maximum_length,
+            "numeric_precision": self.numeric_precision,
+            "numeric_scale": self.numeric_scale,
+            "not_null": self.not_null,
+            "default": self.default,
+        }
+
+class TableInfo:
+    """
+    单个表的列（按定义顺序）、约束、索引、序列和估计行数（未 ANALYZE 时为 None）
+    """
+
+    def __init__(self, name, estimated_rows):
+        self.name = name
+        self.estimated_rows = estimated_rows if estimated_rows is not None and estimated_rows >= 0 else None
+        self.columns = {}
+        self.primary_key = []
+        self.unique_constraints = {}
+        # [(约束名, [列], 引用的表, [引用的列])]
+        self.foreign_keys = []
+        # {索引名: (是否唯一, [列])}，包括唯一约束的索引
+        self.indexes = {}
+        # {列名: 序列名}
+        self.sequences = {}
+
+    def column_types(self):
+        """
+        {列名: data_type}
+        """
+        return {name: column.data_type for name, column in self.columns.items()}
+
+    def numeric_columns(self):
+        """
+        numeric 列的 {列名: (精度, 小数位数)}，未限定精度时为 (None, None)
+        """
+        return {
+            name: (column.numeric_precision, column.numeric_scale)
+            for name, column in self.columns.items()
+            if column.data_type == "numeric"
+        }
+
+    def to_dict(self):
+        return {
+            "estimated_rows": self.estimated_rows,
+            "columns": {name: column.to_dict() for name, column in self.columns.items()},
+            "primary_key": self.primary_key,
+            "unique_constraints": self.unique_constraints,
+            "foreign_keys": [
+                {"name": name, "columns": columns, "references": table, "referenced_columns": referenced}
+                for name, columns, table, referenced in self.foreign_keys
+            ],
+            "indexes": {
+                name: {"unique": unique, "columns": columns}
+                for name, (unique, columns) in self.indexes.items()
+            },
+            "sequences": self.sequences,
+        }
+
+class CatalogSnapshot:
+    """
+    一个 schema 中所有表的目录信息：{表名: TableInfo}
+    """
+
+    def __init__(self, schema, tables):
+        self.schema = schema
+        self.tables = tables
+
+    def get(self, table):
+        return self.tables.get(table)
+
+    def sequences(self):
+        """
+        所有属于表中某列的序列 [(表名, 列名, 序列名)]
+        """
+        return [
+            (table.name, column, sequence)
+            for table in self.tables.values()
+            for column, sequence in table.sequences.items()
+        ]
+
+    def to_dict(self):
+        return {
+            "schema": self.schema,
+            "tables": {name: table.to_dict() for name, table in sorted(self.tables.items())},
+        }
+
+def load_catalog(conn, schema=None, tables=None):
+    """
+    用四条 pg_catalog 查询读取 schema（默认当前 schema）中的表，tables 不为 None 时只读取这些表
+    """
+    params = {"schema": schema, "tables": None if tables is None else list(tables)}
+    with conn.cursor() as cursor:
+        if schema is None:
+            schema = cursor.execute("SELECT current_schema();").fetchone()[0]
+        result = {}
+        for table, reltuples, *column in cursor.execute(TABLES_QUERY, params).fetchall():
+            info = result.setdefault(table, TableInfo(table, reltuples))
+            if column[0] is not None:
+                info.columns[column[0]] = ColumnInfo(*column)
+        for table, name, kind, columns, referenced_table, referenced in cursor.execute(
+            CONSTRAINTS_QUERY, params
+        ).fetchall():
+            info = result[table]
+            if kind == "p":
+                info.primary_key = columns
+            elif kind == "u":
+                info.unique_constraints[name] = columns
+            else:
+                info.foreign_keys.append((name, columns, referenced_table, referenced))
+        for table, name, unique, columns in cursor.execute(INDEXES_QUERY, params).fetchall():
+            result[table].indexes[name] = (unique, columns)
+        for table, column, sequence in cursor.execute(SEQUENCES_QUERY, params).fetchall():
+            result[table].sequences[column] = sequence
+    return CatalogSnapshot(schema, result)
+
+class CatalogCache:
+    """
+    在一次运行中缓存目录信息：第一次使用时读取整个 schema，
+    建表或修改表后调用 invalidate，下次使用时只重新读取该表。线程安全
+    """
+
+    def __init__(self, schema=None):
+        self.schema = schema
+        self._snapshot = None
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def table(self, conn, table):
+        """
+        返回表的 TableInfo，表不存在时返回 None
+        """
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = load_catalog(conn, self.schema)
+                self._stale.clear()
+            elif table in self._stale:
+                reloaded = load_catalog(conn, self._snapshot.schema, [table]).get(table)
+                if reloaded is None:
+                    self._snapshot.tables.pop(table, None)
+                else:
+                    self._snapshot.tables[table] = reloaded
+                self._stale.discard(table)
+            return self._snapshot.get(table)
+
+    def invalidate(self, table):
+        """
+        标记表的缓存已过期（表被创建、删除或修改后调用）
+        """
+        with self._lock:
+            self._stale.add(table)
@@ -0,0 +1,190 @@
+"""
+Overlap reading, converting and writing chunks with bounded queues.
+
+The read and convert stages run in background threads and hand chunks to
+the next stage through queues of at most `depth` items, so the SQLite read
+and Python conversion of the next chunks proceed while the previous chunk
+is still being sent to PostgreSQL. The write stage stays in the calling
+thread, which owns the database connection. Each stage records its busy
+time, so the slowest stage (the one limiting throughput) can be reported.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# 每个阶段之间的队列中最多缓存的数据块数量
+DEFAULT_DEPTH = 4
+
+# 流水线的阶段
+STAGES = ["read", "convert", "write"]
+
+# 队列结束标记
+_DONE = object()
+
+class StageStats:
+    """
+    单个阶段的统计：处理的块数、行数和实际工作时间（不含等待队列的时间）
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.chunks = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, rows, seconds):
+        self.chunks += 1
+        self.rows += rows
+        self.seconds += seconds
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+def format_stats(stats):
+    """
+    格式化各阶段的吞吐量，并标出工作时间最长、限制整体吞吐的阶段
+    """
+    bottleneck = max(stats.values(), key=lambda stage: stage.seconds)
+    return (
+        ", ".join(
+            f"{stage.name} {stage.rows_per_second:.0f} rows/s ({stage.seconds:.2f}s)"
+            for stage in stats.values()
+        )
+        + f"; bottleneck: {bottleneck.name}"
+    )
+
+def run_pipeline(read, convert, write, depth=DEFAULT_DEPTH, thread_context=nullcontext):
+    """
+    read() 返回数据块（行列表）的迭代器，convert(chunk) 返回要写入的数据，write(chunk, payload) 写入一块。
+    read 和 convert 在后台线程中执行，因此 read 应在迭代开始时自行打开所需的连接；
+    write 在调用线程中执行。depth 为 0 时三个阶段在调用线程中依次执行。
+    后台线程在 thread_context() 返回的上下文中运行（如 profiling.Profiler.thread_context）。
+    任一阶段出错时停止其他阶段并在调用线程中抛出该错误。返回 {阶段名: StageStats}
+    """
+    stats = {name: StageStats(name) for name in STAGES}
+    if depth <= 0:
+        chunks = iter(read())
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, _DONE)
+            if chunk is _DONE:
+                return stats
+            stats["read"].add(len(chunk), time.perf_counter() - start)
+            start = time.perf_counter()
+            payload = convert(chunk)
+            stats["convert"].add(len(chunk), time.perf_counter() - start)
+            start = time.perf_counter()
+            write(chunk, payload)
+            stats["write"].add(len(chunk), time.perf_counter() - start)
+
+    read_queue = queue.Queue(maxsize=depth)
+    write_queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    errors = []
+
+    def put(target, item):
+        # 下游出错后不再阻塞在已满的队列上
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(source):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def read_stage():
+        with thread_context():
+            read_chunks()
+
+    def read_chunks():
+        chunks = None
+        try:
+            chunks = iter(read())
+            while not stop.is_set():
+                start = time.perf_counter()
+                chunk = next(chunks, _DONE)
+                if chunk is _DONE:
+                    break
+                stats["read"].add(len(chunk), time.perf_counter() - start)
+                if not put(read_queue, chunk):
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # 在读取线程中关闭生成器，使其中打开的连接在同一线程中关闭
+            if hasattr(chunks, "close"):
+                chunks.close()
+            put(read_queue, _DONE)
+
+    def convert_stage():
+        with thread_context():
+            convert_chunks()
+
+    def convert_chunks():
+        try:
+            while True:
+                chunk = get(read_queue)
+                if chunk is _DONE:
+                    break
+                start = time.perf_counter()
+                payload = convert(chunk)
+                stats["convert"].add(len(chunk), time.perf_counter() - start)
+                if not put(write_queue, (chunk, payload)):
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(write_queue, _DONE)
+
+    threads = [
+        threading.Thread(target=read_stage, name="pipeline-read", daemon=True),
+        threading.Thread(target=convert_stage, name="pipeline-convert", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                break
+            chunk, payload = item
+            start = time.perf_counter()
+            write(chunk, payload)
+            stats["write"].add(len(chunk), time.perf_counter() - start)
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return stats
+
+def run_ordered(executor, function, tasks, write, depth):
+    """
+    将 tasks 逐个提交给 executor 执行 function(task)，按提交顺序在调用线程中 write(result)。
+    同时最多 depth 个任务在执行或等待写入，内存占用有上限
+    """
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(executor.submit(function, task))
+            if len(pending) >= depth:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    finally:
+        # 出错时不再执行尚未开始的任务
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,300 @@
+"""
+Shared configuration and PostgreSQL connection handling for all scripts.
+
+Connections are opened with psycopg 3, TCP keepalives and an optional
+statement_timeout. ConnectionPool reuses connections across threads and
+retry() re-runs idempotent operations with exponential backoff when the
+network or server drops a connection.
+"""
+
+import os
+import random
+import threading
+import time
+import tomllib
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import psycopg
+from psycopg import errors
+
+# 连接参数的默认值，可在配置文件的 [connection] 中覆盖
+DEFAULT_CONNECTION_SETTINGS = {
+    "connect_timeout": 10,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 5,
+    # 0 表示不限制
+    "statement_timeout": 0,
+    "retries": 5,
+    "retry_delay": 1.0,
+    "retry_max_delay": 30.0,
+}
+
+# 连接级别的错误中不应重试的类型：语句超时、权限和认证失败等重试也不会成功
+NON_TRANSIENT_ERRORS = (
+    errors.QueryCanceled,
+    errors.InvalidPassword,
+    errors.InvalidAuthorizationSpecification,
+    errors.InsufficientPrivilege,
+)
+
+def load_config():
+    """
+    加载配置文件，返回配置字典。
+    首先尝试从配置文件加载，如果失败则尝试从环境变量获取。
+    """
+    try:
+        # 先尝试从配置文件加载
+        config_path = os.environ.get("CONFIG_PATH", "config.toml")
+        print(f"Loading configuration from: {config_path}")
+
+        if not os.path.exists(config_path):
+            print(f"Warning: Configuration file not found at {config_path}")
+            # 尝试从环境变量构建配置
+            return load_config_from_env()
+
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f)
+
+        # 验证必要的配置项
+        if "database" not in config or "postgresql" not in config:
+            print("Error: Invalid configuration file structure")
+            return load_config_from_env()
+
+        # 验证PostgreSQL配置中是否有占位符值
+        pg_config = config["postgresql"]["cloud"]
+        if (pg_config["user"] == "your_cloud_user" or
+            pg_config["password"] == "your_cloud_password" or
+            pg_config["dbname"] == "your_cloud_db"):
+            print("Warning: PostgreSQL configuration contains placeholder values")
+            print("Attempting to use environment variables instead")
+            return load_config_from_env()
+
+        return config
+    except Exception as e:
+        print(f"Error loading configuration from file: {e}")
+        return load_config_from_env()
+
+def load_config_from_env():
+    """
+    从环境变量中加载配置
+    """
+    print("Loading configuration from environment variables")
+    try:
+        # 确保必要的环境变量已设置
+        required_vars = ["PG_HOST", "PG_PORT", "PG_USER", "PG_PASSWORD", "PG_DATABASE", "SQLITE_PATH"]
+        missing_vars = [var for var in required_vars if not os.environ.get(var)]
+
+        if missing_vars:
+            print(f"Error: Missing required environment variables: {', '.join(missing_vars)}")
+            print("Required variables are: PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DATABASE, SQLITE_PATH")
+            return None
+
+        # 构建配置字典
+        config = {
+            "database": {
+                "sqlite_file": os.environ.get("SQLITE_PATH")
+            },
+            "postgresql": {
+                "cloud": {
+                    "host": os.environ.get("PG_HOST"),
+                    "port": os.environ.get("PG_PORT"),
+                    "user": os.environ.get("PG_USER"),
+                    "password": os.environ.get("PG_PASSWORD"),
+                    "dbname": os.environ.get("PG_DATABASE")
+                }
+            }
+        }
+
+        return config
+    except Exception as e:
+        print(f"Error loading configuration from environment variables: {e}")
+        return None
+
+def get_db_config(config, db_type="cloud"):
+    """
+    获取 postgresql.<db_type> 的连接配置，合并 [connection] 中的连接参数
+    """
+    if db_type not in config.get("postgresql", {}):
+        raise KeyError(f"postgresql.{db_type} is not configured")
+    pg_config = config["postgresql"][db_type]
+    db_config = {
+        "dbname": pg_config["dbname"],
+        "user": pg_config["user"],
+        "password": pg_config["password"],
+        "host": pg_config["host"],
+        "port": int(pg_config["port"]),
+    }
+    connection_config = config.get("connection", {})
+    for name, default in DEFAULT_CONNECTION_SETTINGS.items():
+        db_config[name] = pg_config.get(name, connection_config.get(name, default))
+    return db_config
+
+def connection_kwargs(db_config):
+    """
+    生成 psycopg.connect 的参数：开启 TCP keepalive，并通过 options 设置 statement_timeout
+    """
+    settings = {**DEFAULT_CONNECTION_SETTINGS, **db_config}
+    kwargs = {
+        "dbname": db_config["dbname"],
+        "user": db_config["user"],
+        "password": db_config["password"],
+        "host": db_config["host"],
+        "port": db_config["port"],
+        "connect_timeout": settings["connect_timeout"],
+        "keepalives": 1,
+        "keepalives_idle": settings["keepalives_idle"],
+        "keepalives_interval": settings["keepalives_interval"],
+        "keepalives_count": settings["keepalives_count"],
+    }
+    if settings["statement_timeout"]:
+        kwargs["options"] = f"-c statement_timeout={settings['statement_timeout']}"
+    return kwargs
+
+def build_dsn(db_config):
+    """
+    生成 pg_dump/pg_restore 等命令行工具使用的连接串，同样开启 TCP keepalive
+    """
+    settings = {**DEFAULT_CONNECTION_SETTINGS, **db_config}
+    return (
+        f"postgresql://{quote(str(db_config['user']), safe='')}:{quote(str(db_config['password']), safe='')}"
+        f"@{db_config['host']}:{db_config['port']}/{db_config['dbname']}"
+        f"?connect_timeout={settings['connect_timeout']}&keepalives=1"
+        f"&keepalives_idle={settings['keepalives_idle']}"
+        f"&keepalives_interval={settings['keepalives_interval']}"
+        f"&keepalives_count={settings['keepalives_count']}"
+    )
+
+def connect(db_config, autocommit=False):
+    """
+    打开一个 PostgreSQL 连接，网络类错误时按退避策略重试
+    """
+    return retry(
+        lambda: psycopg.connect(**connection_kwargs(db_config), autocommit=autocommit),
+        db_config,
+        f"connecting to {db_config['host']}:{db_config['port']}",
+    )
+
+def is_transient_error(error):
+    """
+    判断是否为连接中断、服务端重启等重试可能成功的错误
+    """
+    if isinstance(error, NON_TRANSIENT_ERRORS):
+        return False
+    return isinstance(
+        error,
+        (
+            psycopg.OperationalError,
+            errors.SerializationFailure,
+            errors.DeadlockDetected,
+            ConnectionError,
+            TimeoutError,
+        ),
+    )
+
+def retry(operation, db_config=None, description="operation"):
+    """
+    执行幂等操作，遇到临时错误时按指数退避（带随机抖动）重试，重试次数用尽后抛出最后的错误
+    """
+    settings = {**DEFAULT_CONNECTION_SETTINGS, **(db_config or {})}
+    attempts = max(int(settings["retries"]), 0) + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == attempts or not is_transient_error(e):
+                raise
+            delay = min(settings["retry_delay"] * 2 ** (attempt - 1), settings["retry_max_delay"])
+            delay *= random.uniform(0.5, 1.0)
+            print(
+                f"Transient error while {description}: {e}".rstrip()
+                + f"; retrying in {delay:.1f}s ({attempt}/{attempts - 1})"
+            )
+            time.sleep(delay)
+
+class ConnectionPool:
+    """
+    简单的线程安全连接池：归还时检查连接状态，已断开的连接直接丢弃，
+    空闲连接最多保留 max_size 个
+    """
+
+    def __init__(self, db_config, max_size=4, autocommit=False, configure=None):
+        self.db_config = db_config
+        self.max_size = max_size
+        self.autocommit = autocommit
+        self.configure = configure
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        """
+        取出一个空闲连接，没有时新建
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None and not conn.closed:
+            return conn
+        conn = connect(self.db_config, self.autocommit)
+        if self.configure:
+            self.configure(conn)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        归还连接：未结束的事务回滚，连接已损坏或池已满时关闭
+        """
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg.pq.TransactionStatus.UNKNOWN:
+                discard = True
+            elif status != psycopg.pq.TransactionStatus.IDLE:
+                try:
+                    conn.rollback()
+                except psycopg.Error:
+                    discard = True
+        with self._lock:
+            if not discard and not conn.closed and len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        以上下文管理器的方式使用连接，发生网络类错误时丢弃该连接
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception as e:
+            self.putconn(conn, discard=is_transient_error(e))
+            raise
+        else:
+            self.putconn(conn)
+
+    def run(self, operation, description="operation"):
+        """
+        用池中的连接执行幂等操作 operation(conn)，失败时换一个连接重试
+        """
+
+        def attempt():
+            with self.connection() as conn:
+                return operation(conn)
+
+        return retry(attempt, self.db_config, description)
+
+    def close(self):
+        """
+        关闭所有空闲连接
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic one-hub SQLite database for benchmarking the migration.
+
+The table layout is read from sqlite_status.txt so the generated database
+follows the same schema as a real one-hub installation.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+
+# 不同规模对应的 logs 行数
+SCALES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "20m": 20_000_000,
+}
+
+# sqlite_status.txt 只标记了复合主键的第一列，这里补全
+COMPOSITE_PRIMARY_KEYS = {
+    "abilities": ["group", "model", "channel_id"],
+    "statistics": ["date", "user_id", "channel_id", "model_name"],
+}
+
+# one-hub 在 SQLite 中创建的索引
+INDEXES = [
+    'CREATE INDEX "idx_abilities_channel_id" ON "abilities" ("channel_id");',
+    'CREATE INDEX "idx_channels_name" ON "channels" ("name");',
+    'CREATE INDEX "idx_logs_user_id" ON "logs" ("user_id");',
+    'CREATE INDEX "idx_created_at_type" ON "logs" ("created_at", "type");',
+    'CREATE INDEX "idx_tokens_user_id" ON "tokens" ("user_id");',
+    'CREATE UNIQUE INDEX "idx_tokens_key" ON "tokens" ("key");',
+    'CREATE UNIQUE INDEX "idx_users_username" ON "users" ("username");',
+]
+
+# 每批写入的行数
+BATCH_SIZE = 50_000
+
+MODELS = ["gpt-4o", "gpt-4o-mini", "claude-3-5-sonnet", "gemini-1.5-pro", "deepseek-chat"]
+
+def parse_status_schema(status_file):
+    """
+    解析 sqlite_check.py 输出的 sqlite_status.txt，返回 {表名: [(列名, 类型, 非空, 主键)]}
+    """
+    schema = {}
+    columns = None
+    with open(status_file, encoding="utf-8") as f:
+        for line in f:
+            match = re.match(r"Details for table '(\w+)':", line)
+            if match:
+                columns = schema.setdefault(match.group(1), [])
+                continue
+            if columns is None or not line.strip():
+                columns = None if not line.strip() else columns
+                continue
+            parts = line.split()
+            if len(parts) != 4 or parts[0] == "Column" or set(parts[0]) == {"-"}:
+                continue
+            name, col_type, not_null, pk = parts
+            columns.append((name, col_type, not_null == "YES", pk == "YES"))
+    # sqlite_sequence 由 SQLite 自动维护
+    schema.pop("sqlite_sequence", None)
+    return {table: columns for table, columns in schema.items() if columns}
+
+def primary_key_columns(table, columns):
+    """
+    获取表的主键列
+    """
+    if table in COMPOSITE_PRIMARY_KEYS:
+        return COMPOSITE_PRIMARY_KEYS[table]
+    return [col[0] for col in columns if col[3]]
+
+def build_create_statement(table, columns):
+    """
+    生成与 one-hub (gorm) 相同风格的建表语句
+    """
+    pk_columns = primary_key_columns(table, columns)
+    definitions = []
+    for name, col_type, not_null, _ in columns:
+        definition = f'"{name}" {col_type}'
+        if pk_columns == [name] and col_type.lower() == "integer":
+            definition += " PRIMARY KEY AUTOINCREMENT"
+        elif not_null:
+            definition += " NOT NULL"
+        definitions.append(definition)
+    if pk_columns and not (len(pk_columns) == 1 and "AUTOINCREMENT" in " ".join(definitions)):
+        quoted = ", ".join(f'"{col}"' for col in pk_columns)
+        definitions.append(f"PRIMARY KEY ({quoted})")
+    return f'CREATE TABLE "{table}" ({", ".join(definitions)});'
+
+def table_row_counts(logs_rows):
+    """
+    根据 logs 行数估算其余表的行数，比例参考实际 one-hub 数据库
+    """
+    users = max(logs_rows // 2000, 20)
+    channels = max(logs_rows // 100_000, 20)
+    return {
+        "logs": logs_rows,
+        "statistics": max(logs_rows // 50, 100),
+        "users": users,
+        "tokens": users * 2,
+        "channels": channels,
+        "abilities": channels * len(MODELS),
+        "midjourneys": max(logs_rows // 1000, 10),
+        "tasks": max(logs_rows // 1000, 10),
+        "orders": max(logs_rows // 5000, 10),
+        "redemptions": max(logs_rows // 5000, 10),
+        "chat_caches": max(logs_rows // 1000, 10),
+    }
+
+def compile_key_digits(table, context):
+    """
+    将行号按混合进制拆分为复合主键各列的取值下标，保证组合唯一
+    """
+    radices = {
+        "user_id": context["users"],
+        "channel_id": context["channels"],
+        "model": len(MODELS),
+        "model_name": len(MODELS),
+    }
+    digits = {}
+    divisor = 1
+    pk_columns = COMPOSITE_PRIMARY_KEYS.get(table, [])
+    for name in sorted(pk_columns, key=lambda col: col not in radices):
+        radix = radices.get(name)
+        if radix is None:
+            digits[name] = lambda i, divisor=divisor: (i - 1) // divisor
+        else:
+            digits[name] = lambda i, divisor=divisor, radix=radix: (i - 1) // divisor % radix
+            divisor *= radix
+    return digits
+
+def compile_value_generator(table, name, col_type, not_null, is_pk, rng, context):
+    """
+    为单列生成取值函数，输入为行号（从 1 开始）
+    """
+    col_type = col_type.lower()
+    length = re.search(r"\((\d+)", col_type)
+    length = int(length.group(1)) if length else None
+    base_time = context["base_time"]
+    users = context["users"]
+    channels = context["channels"]
+
+    digit = compile_key_digits(table, context).get(name)
+    if digit is not None:
+        if name in ["user_id", "channel_id"]:
+            return lambda i: digit(i) + 1
+        if name in ["model", "model_name"]:
+            return lambda i: MODELS[digit(i)]
+        if name == "date":
+            return lambda i: time.strftime("%Y-%m-%d", time.gmtime(base_time + digit(i) * 86400))
+        return lambda i: "default" if digit(i) == 0 else f"group{digit(i)}"
+
+    if col_type == "integer":
+        if is_pk:
+            return lambda i: i
+        if name.endswith("_time") or name in ["created_at", "updated_at", "expiration"]:
+            return lambda i: base_time + i * 2 + rng.randint(0, 60)
+        if name == "user_id":
+            return lambda i: rng.randint(1, users)
+        if name == "channel_id":
+            return lambda i: rng.randint(1, channels)
+        if name.endswith("_id") or name in ["type", "status", "role"]:
+            return lambda i: rng.randint(1, 5)
+        return lambda i: rng.randint(0, 100_000)
+    if col_type == "bigint":
+        return lambda i: base_time + i
+    if col_type == "numeric":
+        # one-hub 用 numeric 存储布尔值
+        return lambda i: rng.randint(0, 1)
+    if col_type == "real" or col_type.startswith("decimal"):
+        return lambda i: round(rng.random() * 100, 2)
+    if col_type == "datetime":
+        # 只有少量记录被软删除
+        if not_null:
+            return lambda i: "2024-06-01 12:00:00+00:00"
+        return lambda i: None if i % 50 else "2024-06-01 12:00:00+00:00"
+    if col_type == "json":
+        payload = lambda i: json.dumps({"is_stream": bool(i % 2), "request_id": f"req-{i}"})
+        if not_null:
+            return payload
+        return lambda i: None if i % 4 else payload(i)
+    if is_pk:
+        return lambda i: f"{name}-{i:x}"[-length:] if length else f"{name}-{i:x}"
+    if name in ["model", "model_name"]:
+        return lambda i: rng.choice(MODELS)
+    if name in ["key", "access_token", "uuid"]:
+        return lambda i: f"{i:032x}"[-length:] if length else f"sk-{i:048x}"
+    if name == "username":
+        return lambda i: f"user{i}" if table == "users" else f"user{rng.randint(1, users)}"
+    if name == "content":
+        return lambda i: f"模型倍率 {rng.random():.2f}，补全倍率 {rng.random():.2f}"
+    if length:
+        return lambda i: f"{name}{i % 1000}"[:length]
+    return lambda i: f"{name} {i}"
+
+def populate_table(sqlite_conn, table, columns, rows, rng, context):
+    """
+    分批写入合成数据
+    """
+    pk_columns = primary_key_columns(table, columns)
+    generators = [
+        compile_value_generator(table, name, col_type, not_null, name in pk_columns, rng, context)
+        for name, col_type, not_null, _ in columns
+    ]
+    placeholders = ", ".join("?" for _ in columns)
+    statement = f'INSERT INTO "{table}" VALUES ({placeholders});'
+    for start in range(1, rows + 1, BATCH_SIZE):
+        end = min(start + BATCH_SIZE, rows + 1)
+        sqlite_conn.executemany(
+            statement,
+            (tuple(generate(i) for generate in generators) for i in range(start, end)),
+        )
+    sqlite_conn.commit()
+
+def generate_database(path, logs_rows, status_file, seed=42):
+    """
+    生成合成的 one-hub SQLite 数据库，返回各表的行数
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    schema = parse_status_schema(status_file)
+    counts = table_row_counts(logs_rows)
+    context = {
+        "base_time": 1_700_000_000,
+        "users": counts["users"],
+        "channels": counts["channels"],
+    }
+    rng = random.Random(seed)
+
+    sqlite_conn = sqlite3.connect(path)
+    try:
+        # 生成数据时不需要持久化保证
+        sqlite_conn.execute("PRAGMA journal_mode=OFF;")
+        sqlite_conn.execute("PRAGMA synchronous=OFF;")
+        for table, columns in schema.items():
+            sqlite_conn.execute(build_create_statement(table, columns))
+        for statement in INDEXES:
+            sqlite_conn.execute(statement)
+
+        rows_by_table = {}
+        for table, columns in schema.items():
+            rows = counts.get(table, 20)
+            start = time.perf_counter()
+            populate_table(sqlite_conn, table, columns, rows, rng, context)
+            rows_by_table[table] = rows
+            print(f"Generated {rows} rows in table {table} in {time.perf_counter() - start:.2f}s")
+        return rows_by_table
+    finally:
+        sqlite_conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic one-hub SQLite database")
+    parser.add_argument("output", help="Path of the SQLite file to create (overwritten)")
+    parser.add_argument(
+        "--scale",
+        choices=SCALES,
+        default="10k",
+        help="Preset size, by number of logs rows (default: 10k)",
+    )
+    parser.add_argument("--logs-rows", type=int, default=None, help="Exact number of logs rows, overrides --scale")
+    parser.add_argument(
+        "--status-file",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "sqlite_status.txt"),
+        help="Schema dump produced by sqlite_check.py (default: sqlite_status.txt)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logs_rows = args.logs_rows or SCALES[args.scale]
+    start = time.perf_counter()
+    rows_by_table = generate_database(args.output, logs_rows, args.status_file, args.seed)
+    print(
+        f"Generated {sum(rows_by_table.values())} rows in {len(rows_by_table)} tables "
+        f"in {time.perf_counter() - start:.2f}s: {args.output}"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Record per-phase and per-table metrics of a migration or sync run.
+
+MetricsRecorder collects wall time, rows, bytes, rows/sec, the busy time of
+the SQLite read, conversion and PostgreSQL write stages (see chunk_pipeline)
+and peak RSS for each table and phase. Each finished table or phase is
+appended to a JSON lines file as soon as it completes, so a run that dies
+halfway still leaves its numbers. At the end the totals are written as a
+Prometheus textfile (for node_exporter's textfile collector), replaced
+atomically so a scrape never sees a partial file. With progress enabled, a
+throttled line with rows/s, MB/s and ETA is printed to stderr.
+"""
+
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = "onehub_sync"
+
+# 进度行的输出间隔（秒）：终端中原地刷新，输出到文件（如 cron 日志）时每行一条，间隔更长
+PROGRESS_INTERVAL_TTY = 1.0
+PROGRESS_INTERVAL_LOG = 30.0
+
+def peak_rss_bytes():
+    """
+    当前进程的峰值常驻内存（Linux 上 ru_maxrss 单位为 KB，macOS 上为字节）
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def format_duration(seconds):
+    """
+    将秒数格式化为 1h02m03s / 2m03s / 3s
+    """
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+def escape_label(value):
+    """
+    转义 Prometheus 标签值中的反斜杠、引号和换行
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class TableMetrics:
+    """
+    单个表的累计指标：行数、字节数和各阶段的实际工作时间（拆分或多进程时为各部分之和）
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+        self.stage_seconds = {}
+
+    def add_stages(self, stats):
+        for stage in stats.values():
+            self.stage_seconds[stage.name] = self.stage_seconds.get(stage.name, 0.0) + stage.seconds
+
+class MetricsRecorder:
+    """
+    一次运行的指标记录器，线程安全。job 为脚本名，用作 JSON 记录和 Prometheus 指标的标签
+    """
+
+    def __init__(self, job, metrics_file=None, prometheus_file=None, progress=False):
+        self.job = job
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        self.progress = progress
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._table_records = {}
+        self._phases = {}
+        self._expected_rows = None
+        self._progress_rows = 0
+        self._progress_bytes = 0
+        self._last_progress = 0.0
+        self._progress_tty = sys.stderr.isatty()
+
+    def _table(self, table):
+        if table not in self._tables:
+            self._tables[table] = TableMetrics(table)
+        return self._tables[table]
+
+    def _write_record(self, record):
+        """追加一条 JSON 记录，每条记录单独打开文件，进程中断时已完成的记录不会丢失"""
+        if not self.metrics_file:
+            return
+        record = {
+            "job": self.job,
+            "run_started_at": self.started_at.isoformat(timespec="seconds"),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **record,
+        }
+        with open(self.metrics_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def set_expected_rows(self, rows):
+        """
+        设置本次运行预计写入的总行数，用于计算进度和 ETA
+        """
+        with self._lock:
+            self._expected_rows = rows
+
+    def add_chunk(self, table, rows, size=0):
+        """
+        记录写入的一块数据（size 为发送的字节数，未知时为 0），并按间隔输出进度行
+        """
+        with self._lock:
+            metrics = self._table(table)
+            metrics.rows += rows
+            metrics.bytes += size
+            self._progress_rows += rows
+            self._progress_bytes += size
+            if self.progress:
+                self._print_progress(table)
+
+    def add_stages(self, table, stats):
+        """
+        累加 chunk_pipeline.run_pipeline 返回的各阶段统计
+        """
+        with self._lock:
+            self._table(table).add_stages(stats)
+
+    def _print_progress(self, table, final=False):
+        now = time.perf_counter()
+        interval = PROGRESS_INTERVAL_TTY if self._progress_tty else PROGRESS_INTERVAL_LOG
+        if not final and now - self._last_progress < interval:
+            return
+        self._last_progress = now
+        elapsed = now - self._start
+        rate = self._progress_rows / elapsed if elapsed > 0 else 0.0
+        line = f"Progress: {self._progress_rows} rows"
+        if self._expected_rows:
+            percent = min(self._progress_rows / self._expected_rows, 1.0) * 100
+            line += f"/{self._expected_rows} ({percent:.1f}%)"
+        line += f", {rate:.0f} rows/s"
+        if self._progress_bytes:
+            line += f", {self._progress_bytes / elapsed / 1024**2:.1f} MB/s"
+        if self._expected_rows and rate > 0:
+            remaining = max(self._expected_rows - self._progress_rows, 0)
+            line += f", ETA {format_duration(remaining / rate)}"
+        line += f", elapsed {format_duration(elapsed)} [{table}]"
+        if self._progress_tty:
+            sys.stderr.write("\r\033[K" + line + ("\n" if final else ""))
+        else:
+            sys.stderr.write(line + "\n")
+        sys.stderr.flush()
+
+    def finish_table(self, table, phase, rows, seconds, status="ok", **fields):
+        """
+        记录一个表在某阶段完成（或失败），立即写入 JSON 记录。
+        rows 为 None 时使用 add_chunk 累计的行数
+        """
+        with self._lock:
+            metrics = self._table(table)
+            rows = metrics.rows if rows is None else rows
+            record = {
+                "type": "table",
+                "phase": phase,
+                "table": table,
+                "status": status,
+                "rows": rows,
+                "bytes": metrics.bytes,
+                "seconds": round(seconds, 3),
+                "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+                "stage_seconds": {name: round(value, 3) for name, value in metrics.stage_seconds.items()},
+                "peak_rss_bytes": peak_rss_bytes(),
+                **fields,
+            }
+            self._table_records[table] = record
+            self._write_record(record)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        记录一个阶段的耗时和结束时的峰值内存，阶段出错时状态为 error 并继续抛出异常
+        """
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record_phase(name, time.perf_counter() - start, status)
+
+    def record_phase(self, name, seconds, status="ok"):
+        """
+        记录一个已完成阶段的耗时
+        """
+        with self._lock:
+            record = {
+                "type": "phase",
+                "phase": name,
+                "status": status,
+                "seconds": round(seconds, 3),
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+            self._phases[name] = record
+            self._write_record(record)
+
+    def phase_records(self):
+        """
+        返回已记录的各阶段 {名称: 记录}，记录包含 seconds、status 和 peak_rss_bytes
+        """
+        with self._lock:
+            return {name: dict(record) for name, record in self._phases.items()}
+
+    def close(self, success):
+        """
+        结束运行：输出最后的进度行，写入汇总记录和 Prometheus 文本文件。有表失败时运行状态为 error
+        """
+        seconds = time.perf_counter() - self._start
+        with self._lock:
+            # 单个表失败时脚本会继续处理其他表，整个运行仍记为失败
+            success = success and all(record["status"] == "ok" for record in self._table_records.values())
+            if self.progress and self._progress_rows:
+                self._print_progress("done", final=True)
+            rows = sum(record["rows"] or 0 for record in self._table_records.values())
+            summary = {
+                "type": "run",
+                "status": "ok" if success else "error",
+                "tables": len(self._table_records),
+                "rows": rows,
+                "bytes": sum(metrics.bytes for metrics in self._tables.values()),
+                "seconds": round(seconds, 3),
+                "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+            self._write_record(summary)
+            if self.prometheus_file:
+                self._write_prometheus(summary)
+
+    def _write_prometheus(self, summary):
+        """按 Prometheus 文本格式写入临时文件后替换，node_exporter 不会读到不完整的文件"""
+        job = f'job="{escape_label(self.job)}"'
+        metrics = [
+            ("last_run_timestamp_seconds", "Unix time the last run finished", [(job, time.time())]),
+            ("last_run_success", "1 if the last run finished without errors", [(job, int(summary["status"] == "ok"))]),
+            ("run_seconds", "Wall time of the last run", [(job, summary["seconds"])]),
+            ("run_rows", "Rows written by the last run", [(job, summary["rows"])]),
+            ("peak_rss_bytes", "Peak resident memory of the last run", [(job, summary["peak_rss_bytes"])]),
+            (
+                "phase_seconds",
+                "Wall time of each phase",
+                [(f'{job},phase="{escape_label(name)}"', record["seconds"]) for name, record in self._phases.items()],
+            ),
+        ]
+        table_labels = {name: f'{job},table="{escape_label(name)}"' for name in self._table_records}
+        for metric, field, help_text in [
+            ("table_rows", "rows", "Rows written per table"),
+            ("table_bytes", "bytes", "Bytes sent per table"),
+            ("table_seconds", "seconds", "Wall time per table"),
+            ("table_rows_per_second", "rows_per_sec", "Throughput per table"),
+        ]:
+            metrics.append(
+                (
+                    metric,
+                    help_text,
+                    [
+                        (table_labels[name], record[field])
+                        for name, record in self._table_records.items()
+                        if record[field] is not None
+                    ],
+                )
+            )
+        metrics.append(
+            (
+                "table_stage_seconds",
+                "Busy time of the read, convert and write stages per table",
+                [
+                    (f'{table_labels[name]},stage="{escape_label(stage)}"', value)
+                    for name, record in self._table_records.items()
+                    for stage, value in record["stage_seconds"].items()
+                ],
+            )
+        )
+
+        lines = []
+        for metric, help_text, samples in metrics:
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples)
+        temp_file = f"{self.prometheus_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_file, self.prometheus_file)
@@ -6,10 +6,115 @@ Handles table structure, data migration, and sequence synchronization.
 
 import os
 import sys
+import math
+import shutil
 import sqlite3
-import psycopg2
-from psycopg2 import sql
-import tomllib
+import tempfile
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing, nullcontext
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from operator import call
+from pathlib import Path
+from psycopg import sql
+
+from chunk_pipeline import STAGES, DEFAULT_DEPTH, StageStats, format_stats, run_ordered, run_pipeline
+from db_conn import ConnectionPool, connect, get_db_config, is_transient_error, load_config
+from catalog_snapshot import CatalogCache, load_catalog
+from metrics import MetricsRecorder
+from profiling import DEFAULT_PROFILE_TOP, Profiler
+from schema_diff import describe_pg_columns, diff_table_columns
+
+from table_filters import (
+    WINDOW_COLUMNS,
+    add_filter_arguments,
+    filter_tables,
+    parse_since,
+    window_bound,
+)
+
+# 每次从 SQLite 读取并写入 PostgreSQL 的默认行数
+DEFAULT_CHUNK_SIZE = 10000
+
+# 读取 SQLite 时的默认内存映射大小和页缓存大小（MB，每个连接）
+DEFAULT_MMAP_SIZE_MB = 256
+DEFAULT_CACHE_SIZE_MB = 64
+
+# 源库快照的复制方式：backup 按页复制，vacuum 使用 VACUUM INTO 同时整理碎片
+SNAPSHOT_METHODS = ["backup", "vacuum"]
+
+# 键集分页的起始键（SQLite 整数的最小值）
+MIN_KEY = -(2**63)
+
+# SQLite 整数的最大值
+MAX_KEY = 2**63 - 1
+
+# 转换进程的启动方式：主进程中有多个线程，forkserver 避免直接 fork 带锁的状态
+CONVERT_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# 转换进程中的状态，由 init_convert_worker 初始化
+_convert_worker = {}
+
+# 超过该行数的表在 --split-parts 大于 1 时按主键范围拆分
+DEFAULT_SPLIT_THRESHOLD = 1000000
+
+# 拆分大表时多个线程向同一个 clamp_counts 累加截断计数（包括合并转换进程的计数）
+_clamp_counts_lock = threading.Lock()
+
+# 增量同步的检查点表，保存在目标 PostgreSQL 中
+STATE_TABLE = "sqlite_migration_state"
+
+# 可续传迁移的进度表，记录每个表已提交的最大主键
+CHECKPOINT_TABLE = "sqlite_migration_checkpoint"
+
+# 只追加不修改的表，增量同步时只需按主键检查点复制新行
+APPEND_ONLY_TABLES = ["logs"]
+
+# 没有整数主键的表用于检测新增或修改行的列，按优先级排列
+CHANGE_COLUMNS = ["updated_at", "created_at", "date"]
+
+# 校验和比对时 NULL 的渲染结果和列分隔符
+CHECKSUM_NULL = "\\N"
+CHECKSUM_SEPARATOR = "\x1f"
+
+# 校验时在 SQLite 中注册的文本哈希函数：每行文本列的 md5 前 32 位，2^31 行以内求和不会溢出 64 位整数
+VERIFY_HASH_FUNCTION = "verify_md5_32"
+
+# 校验报告中每个表最多列出的不一致主键数量
+VERIFY_MAX_REPORTED_KEYS = 20
+
+# PostgreSQL 中的整数和文本类型
+PG_INTEGER_TYPES = ["smallint", "integer", "bigint"]
+PG_TEXT_TYPES = ["text", "character varying", "character"]
+
+# SQLite 中的日期时间文本：日期时间部分、小数秒、时区
+TIMESTAMP_PATTERN = re.compile(
+    r"^(\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?)?)(?:\.(\d+))?\s*(.*)$"
+)
+
+# 数据写入方式：copy 使用 COPY ... FROM STDIN，values 使用 executemany 批量 INSERT
+LOADERS = ["copy", "values"]
+
+# COPY 文本格式中需要转义的字符
+COPY_TEXT_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+)
+
+# 可识别的 boolean 表示
+BOOLEAN_VALUES = {
+    **dict.fromkeys([1, "1", "true", "True", "TRUE", "t", "T"], True),
+    **dict.fromkeys([0, "0", "false", "False", "FALSE", "f", "F"], False),
+}
 
 # 数据类型映射配置
 SCHEMA_MAPPING = {
@@ -32,79 +137,6 @@ SCHEMA_MAPPING = {
     "users": {"access_token": "VARCHAR(32)"},
 }
 
-def load_config():
-    """
-    加载配置文件，返回配置字典。
-    首先尝试从配置文件加载，如果失败则尝试从环境变量获取。
-    """
-    try:
-        # 先尝试从配置文件加载
-        config_path = os.environ.get("CONFIG_PATH", "config.toml")
-        print(f"Loading configuration from: {config_path}")
-        
-        if not os.path.exists(config_path):
-            print(f"Warning: Configuration file not found at {config_path}")
-            # 尝试从环境变量构建配置
-            return load_config_from_env()
-            
-        with open(config_path, "rb") as f:
-            config = tomllib.load(f)
-        
-        # 验证必要的配置项
-        if "database" not in config or "postgresql" not in config:
-            print("Error: Invalid configuration file structure")
-            return load_config_from_env()
-            
-        # 验证PostgreSQL配置中是否有占位符值
-        pg_config = config["postgresql"]["cloud"]
-        if (pg_config["user"] == "your_cloud_user" or 
-            pg_config["password"] == "your_cloud_password" or
-            pg_config["dbname"] == "your_cloud_db"):
-            print("Warning: PostgreSQL configuration contains placeholder values")
-            print("Attempting to use environment variables instead")
-            return load_config_from_env()
-            
-        return config
-    except Exception as e:
-        print(f"Error loading configuration from file: {e}")
-        return load_config_from_env()
-
-def load_config_from_env():
-    """
-    从环境变量中加载配置
-    """
-    print("Loading configuration from environment variables")
-    try:
-        # 确保必要的环境变量已设置
-        required_vars = ["PG_HOST", "PG_PORT", "PG_USER", "PG_PASSWORD", "PG_DATABASE", "SQLITE_PATH"]
-        missing_vars = [var for var in required_vars if not os.environ.get(var)]
-        
-        if missing_vars:
-            print(f"Error: Missing required environment variables: {', '.join(missing_vars)}")
-            print("Required variables are: PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DATABASE, SQLITE_PATH")
-            return None
-            
-        # 构建配置字典
-        config = {
-            "database": {
-                "sqlite_file": os.environ.get("SQLITE_PATH")
-            },
-            "postgresql": {
-                "cloud": {
-                    "host": os.environ.get("PG_HOST"),
-                    "port": os.environ.get("PG_PORT"),
-                    "user": os.environ.get("PG_USER"),
-                    "password": os.environ.get("PG_PASSWORD"),
-                    "dbname": os.environ.get("PG_DATABASE")
-                }
-            }
-        }
-        
-        return config
-    except Exception as e:
-        print(f"Error loading configuration from environment variables: {e}")
-        return None
-
 def convert_type(sqlite_type, table_name, col_name):
     """
     根据schema映射表转换数据类型
@@ -140,18 +172,77 @@ def convert_type(sqlite_type, table_name, col_name):
 
     return "TEXT"
 
-def test_pg_connection(pg_config):
+def connect_sqlite_readonly(sqlite_db_file, immutable=False, check_same_thread=True, read_pragmas=None):
+    """
+    以只读方式打开 SQLite 数据库，避免修改或锁住正在使用的源库。
+    immutable 适用于不会再被修改的快照文件，SQLite 将跳过所有锁和变更检测。
+    read_pragmas 为打开后执行的 PRAGMA（见 build_read_pragmas）
+    """
+    uri = Path(sqlite_db_file).resolve().as_uri() + "?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+    for name, value in (read_pragmas or {}).items():
+        conn.execute(f"PRAGMA {name}={value};")
+    return conn
+
+def build_read_pragmas(mmap_size_mb, cache_size_mb):
     """
-    测试PostgreSQL连接是否可用
+    读取源库时使用的 PRAGMA：大表扫描通过内存映射读取，较大的页缓存，临时排序在内存中进行，
+    query_only 保证连接不会写入
     """
+    return {
+        "query_only": 1,
+        "mmap_size": mmap_size_mb * 1024 * 1024,
+        "cache_size": -cache_size_mb * 1024,
+        "temp_store": "MEMORY",
+    }
+
+def open_source_sqlite(options, check_same_thread=True):
+    """
+    按迁移参数打开源库（或其快照）的只读连接
+    """
+    return connect_sqlite_readonly(
+        options["sqlite_db_file"], options["immutable"], check_same_thread, options["read_pragmas"]
+    )
+
+def take_sqlite_snapshot(sqlite_db_file, method="backup", snapshot_dir=None):
+    """
+    在一个读事务中将源库复制到临时目录中的快照文件，返回快照路径。
+    迁移只读取快照，各表数据一致，也不会长时间持有源库的读锁；
+    backup 使用 SQLite 的 backup API 按页复制，vacuum 使用 VACUUM INTO 生成紧凑的文件。
+    snapshot_dir 为 tmpfs（如 /dev/shm）时快照完全在内存中
+    """
+    directory = tempfile.mkdtemp(prefix="sqlite_snapshot_", dir=snapshot_dir)
+    snapshot_file = os.path.join(directory, Path(sqlite_db_file).name)
+    try:
+        with closing(connect_sqlite_readonly(sqlite_db_file)) as source:
+            if method == "vacuum":
+                source.execute("VACUUM INTO ?;", (snapshot_file,))
+            else:
+                with closing(sqlite3.connect(snapshot_file)) as target:
+                    source.backup(target)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return snapshot_file
+
+def remove_sqlite_snapshot(snapshot_file):
+    """
+    删除 take_sqlite_snapshot 创建的快照目录
+    """
+    shutil.rmtree(os.path.dirname(snapshot_file), ignore_errors=True)
+
+def open_pg_connection(pg_pool):
+    """
+    从连接池中打开第一个PostgreSQL连接（网络错误时自动重试），失败时打印排查建议并返回 None
+    """
+    pg_config = pg_pool.db_config
     try:
-        print(f"Testing PostgreSQL connection to {pg_config['host']}:{pg_config['port']} as {pg_config['user']}")
-        conn = psycopg2.connect(**pg_config)
-        conn.close()
-        print("PostgreSQL connection test successful")
-        return True
+        print(f"Connecting to PostgreSQL at {pg_config['host']}:{pg_config['port']} as {pg_config['user']}")
+        return pg_pool.getconn()
     except Exception as e:
-        print(f"PostgreSQL connection test failed: {e}")
+        print(f"PostgreSQL connection failed: {e}")
         # 提供更详细的故障排除建议
         print("\nTroubleshooting suggestions:")
         print("1. Check if your PostgreSQL credentials are correct")
@@ -166,7 +257,7 @@ def test_pg_connection(pg_config):
         print("   export PG_DATABASE=your_database")
         print("   export SQLITE_PATH=path_to_sqlite_file")
         print("   Then run the script again")
-        return False
+        return None
 
 def format_default_value(col_type, default_value):
     """
@@ -195,304 +286,2657 @@ def format_default_value(col_type, default_value):
     # 其他类型的默认值按原样处理
     return f" DEFAULT '{default_value}'"
 
-def migrate_table_structure(sqlite_conn, pg_conn):
+def list_tables(sqlite_conn, options=None):
     """
-    迁移表结构从SQLite到PostgreSQL
+    获取 SQLite 中需要迁移的所有表，传入 options 时按 --include/--exclude 过滤
     """
     sqlite_cursor = sqlite_conn.cursor()
-
-    # 获取 SQLite 中的所有表
     sqlite_cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
     tables = [row[0] for row in sqlite_cursor.fetchall()]
 
     # 排除不需要迁移的表
     tables_to_exclude = ["sqlite_sequence"]
     tables = [table for table in tables if table not in tables_to_exclude]
+    if options:
+        tables = filter_tables(tables, options["include"], options["exclude"])
+    return tables
 
-    for table in tables:
-        # 为每个表创建使用独立连接
+def build_window_filter(table, col_info, options):
+    """
+    根据 --since 构建时间窗口过滤条件，返回 (where, where_params)
+    """
+    col_type = next((col[2] for col in col_info if col[1] == WINDOW_COLUMNS.get(table)), None)
+    bound = window_bound(table, options["since"], col_type) if col_type else None
+    if bound is None:
+        return None, ()
+    return f"{bound[0]} >= ?", (bound[1],)
+
+def combine_filters(*filters):
+    """
+    用 AND 合并多个 (where, where_params) 过滤条件
+    """
+    conditions = [f"({where})" for where, _ in filters if where]
+    params = tuple(param for where, where_params in filters if where for param in where_params)
+    return " AND ".join(conditions) or None, params
+
+def migrate_table_structure(sqlite_conn, pg_pool, options):
+    """
+    迁移表结构从SQLite到PostgreSQL，连接中断时换一个连接重试
+    """
+    for table in list_tables(sqlite_conn, options):
+        pg_pool.run(
+            lambda pg_conn: prepare_table(sqlite_conn, pg_conn, table, options),
+            f"creating table {table}",
+        )
+
+def prepare_table(sqlite_conn, pg_conn, table, options):
+    """
+    创建表；续传模式下已存在且有续传进度的表保留，以便从检查点继续写入。
+    没有进度记录的已存在表不是本次续传写入的数据（如上一次完整迁移的结果），重新创建
+    """
+    if options["resume"] and options["catalog"].table(pg_conn, table):
         with pg_conn.cursor() as pg_cursor:
-            try:
-                # 开始新的事务
-                pg_cursor.execute("BEGIN;")
-
-                # 获取表结构
-                sqlite_cursor.execute(f"PRAGMA table_info({table});")
-                columns = sqlite_cursor.fetchall()
-
-                # 构建 CREATE TABLE 语句
-                column_defs = []
-                for col in columns:
-                    col_name = f'"{col[1]}"' if col[1].lower() == "group" else col[1]
-                    col_type = convert_type(col[2], table, col[1])
-                    not_null = " NOT NULL" if col[3] else ""
-                    
-                    # 使用新的格式化函数处理默认值
-                    default = format_default_value(col_type, col[4]) if col[4] else ""
-                    
-                    column_defs.append(f"{col_name} {col_type}{not_null}{default}")
-
-                # 添加主键
-                sqlite_cursor.execute(f"PRAGMA table_info({table});")
-                pk_columns = [col[1] for col in columns if col[5]]
-                if pk_columns:
-                    column_defs.append(f"PRIMARY KEY ({', '.join(pk_columns)})")
-
-                # 如果表存在则先删除
-                pg_cursor.execute(f"DROP TABLE IF EXISTS {table};")
-
-                # 特殊处理 abilities 表的主键
-                if table == "abilities":
-                    column_defs = [
-                        col for col in column_defs if not col.startswith("PRIMARY KEY")
-                    ]
-                    column_defs.append('PRIMARY KEY ("group", model, channel_id)')
-
-                # 创建表
-                create_table_sql = (
-                    f"CREATE TABLE {table} (\n    "
-                    + ",\n    ".join(column_defs)
-                    + "\n);"
-                )
-                pg_cursor.execute(create_table_sql)
-                pg_cursor.execute("COMMIT;")
-                print(f"Created table {table}")
-            except Exception as e:
-                pg_cursor.execute("ROLLBACK;")
-                print(f"Error creating table {table}: {e}")
-                print(f"SQL was: {create_table_sql if 'create_table_sql' in locals() else 'Not available'}")
+            checkpoint = load_checkpoint(pg_cursor, table)
+        pg_conn.rollback()
+        if checkpoint:
+            print(f"Table {table} already exists, keeping it to resume")
+            return
+    create_table(sqlite_conn, pg_conn, table, options["fast_load"])
+    options["catalog"].invalidate(table)
 
-def validate_numeric_data(sqlite_cursor, table, columns):
+def create_table(sqlite_conn, pg_conn, table, fast_load=False):
     """
-    验证并修正数值数据，确保符合PostgreSQL的数值范围
+    在 PostgreSQL 中创建单个表（已存在则先删除）。
+    fast_load 时不创建主键，由 build_indexes 在数据写入后创建。
     """
-    # 获取 PostgreSQL 列类型
-    sqlite_cursor.execute(f"PRAGMA table_info({table});")
-    col_info = sqlite_cursor.fetchall()
+    sqlite_cursor = sqlite_conn.cursor()
+
+    # 为每个表创建使用独立连接
+    with pg_conn.cursor() as pg_cursor:
+        try:
+            # 获取表结构
+            sqlite_cursor.execute(f"PRAGMA table_info({table});")
+            columns = sqlite_cursor.fetchall()
+
+            # 构建 CREATE TABLE 语句
+            column_defs = []
+            for name, col_type, not_null, default in build_column_definitions(table, columns):
+                col_name = f'"{name}"' if name.lower() == "group" else name
+                not_null = " NOT NULL" if not_null else ""
+                default = f" DEFAULT {default}" if default is not None else ""
+                column_defs.append(f"{col_name} {col_type}{not_null}{default}")
+
+            # 添加主键
+            sqlite_cursor.execute(f"PRAGMA table_info({table});")
+            pk_columns = [col[1] for col in columns if col[5]]
+            if pk_columns:
+                column_defs.append(f"PRIMARY KEY ({', '.join(pk_columns)})")
+
+            # 如果表存在则先删除
+            pg_cursor.execute(f"DROP TABLE IF EXISTS {table};")
+
+            # 特殊处理 abilities 表的主键
+            if table == "abilities":
+                column_defs = [
+                    col for col in column_defs if not col.startswith("PRIMARY KEY")
+                ]
+                column_defs.append('PRIMARY KEY ("group", model, channel_id)')
 
-    # 检查每个数值列
+            # 快速导入模式下主键在数据写入后再创建
+            if fast_load:
+                column_defs = [
+                    col for col in column_defs if not col.startswith("PRIMARY KEY")
+                ]
+
+            # 创建表
+            create_table_sql = (
+                f"CREATE TABLE {table} (\n    "
+                + ",\n    ".join(column_defs)
+                + "\n);"
+            )
+            pg_cursor.execute(create_table_sql)
+            pg_conn.commit()
+            print(f"Created table {table}")
+        except Exception as e:
+            # 连接中断由调用方换连接重试
+            if is_transient_error(e):
+                raise
+            pg_conn.rollback()
+            print(f"Error creating table {table}: {e}")
+            print(f"SQL was: {create_table_sql if 'create_table_sql' in locals() else 'Not available'}")
+
+def build_column_definitions(table, col_info):
+    """
+    根据 PRAGMA table_info 的结果生成 PostgreSQL 列定义 [(列名, 类型, 是否 NOT NULL, 默认值表达式)]，
+    建表和结构比对共用
+    """
+    definitions = []
     for col in col_info:
-        col_name = col[1]
-        col_type = col[2].lower()
-
-        # 处理 numeric 类型
-        if col_type in ["numeric", "decimal", "real"]:
-            # 更新超出范围的数值
-            sqlite_cursor.execute(
-                f"UPDATE {table} SET {col_name} = 99999999.99 "
-                f"WHERE {col_name} > 99999999.99;"
+        col_type = convert_type(col[2], table, col[1])
+        # 使用新的格式化函数处理默认值
+        default = format_default_value(col_type, col[4]) if col[4] else ""
+        definitions.append(
+            (col[1], col_type, bool(col[3]), default[len(" DEFAULT "):] if default else None)
+        )
+    return definitions
+
+def diff_table_schema(sqlite_conn, pg_table):
+    """
+    比较 SQLite 表结构与 PostgreSQL 中已有的表（TableInfo），返回 (ALTER TABLE 语句或 None, 说明列表, 新增的列)
+    """
+    table = pg_table.name
+    col_info = sqlite_conn.execute(f"PRAGMA table_info({table});").fetchall()
+    definitions = build_column_definitions(table, col_info)
+    statement, notes = diff_table_columns(
+        table, definitions, describe_pg_columns(pg_table), pg_table.primary_key
+    )
+    return statement, notes, [col[0] for col in definitions if col[0] not in pg_table.columns]
+
+def apply_schema_diff(sqlite_conn, pg_conn, pg_table, options):
+    """
+    只执行使已有的表与 SQLite 结构一致所需的 ALTER TABLE，保留表中的数据。
+    新增了列时清除该表的增量检查点，下次同步时合并所有行以填充新列
+    """
+    table = pg_table.name
+    with pg_conn.cursor() as pg_cursor:
+        try:
+            statement, notes, added_columns = diff_table_schema(sqlite_conn, pg_table)
+            for note in notes:
+                print(f"  {table}: {note}")
+            if statement is None:
+                pg_conn.rollback()
+                return
+            start_time = time.perf_counter()
+            pg_cursor.execute(statement)
+            if added_columns:
+                clear_table_state(pg_cursor, table)
+            pg_conn.commit()
+            options["catalog"].invalidate(table)
+            elapsed = time.perf_counter() - start_time
+            print(f"Altered table {table} in {elapsed:.2f}s: {statement.as_string(pg_conn)}")
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            pg_conn.rollback()
+            print(f"Error altering table {table}: {e}")
+
+def print_schema_diff(sqlite_conn, pg_pool, options):
+    """
+    打印使 PostgreSQL 中已有的表与 SQLite 结构一致所需的 ALTER TABLE 语句，不修改目标库
+    """
+    with pg_pool.connection() as pg_conn:
+        for table in list_tables(sqlite_conn, options):
+            pg_table = options["catalog"].table(pg_conn, table)
+            if pg_table is None:
+                print(f"-- {table}: missing in PostgreSQL, would be created")
+                continue
+            statement, notes, _ = diff_table_schema(sqlite_conn, pg_table)
+            for note in notes:
+                print(f"-- {table}: {note}")
+            if statement is not None:
+                print(f"{statement.as_string(pg_conn)};")
+        pg_conn.rollback()
+
+def get_primary_key_columns(table, col_info):
+    """
+    根据 PRAGMA table_info 的结果获取主键列（按主键中的顺序）
+    """
+    # 特殊处理 abilities 表的主键
+    if table == "abilities":
+        return ["group", "model", "channel_id"]
+    pk_cols = sorted((col for col in col_info if col[5]), key=lambda col: col[5])
+    return [col[1] for col in pk_cols]
+
+def get_keyset_column(table, col_info):
+    """
+    如果表只有一个整数主键列，返回 (列名, 列下标) 用于键集分页，否则返回 None
+    """
+    pk_columns = get_primary_key_columns(table, col_info)
+    if len(pk_columns) != 1:
+        return None
+    for i, col in enumerate(col_info):
+        if col[1] == pk_columns[0] and col[2].lower() in ["integer", "bigint"]:
+            return col[1], i
+    return None
+
+def is_rowid_alias(table, col_info):
+    """
+    单一主键列声明为 INTEGER 时是 rowid 的别名，主键值即 rowid；BIGINT 等其他整数主键不是
+    """
+    keyset = get_keyset_column(table, col_info)
+    return keyset is not None and col_info[keyset[1]][2].upper() == "INTEGER"
+
+def iter_table_chunks(
+    sqlite_conn,
+    table,
+    col_info,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    start_key=None,
+    end_key=None,
+    where=None,
+    where_params=(),
+    order_by=None,
+):
+    """
+    分块读取 SQLite 表数据的生成器，内存占用只与 chunk_size 有关。
+    单一整数主键的表使用键集分页，可用 start_key（包含）和 end_key（不包含）限定主键范围；
+    其余表使用 fetchmany 顺序读取，可用 order_by 指定顺序。where 为附加的过滤条件。
+    """
+    cursor = sqlite_conn.cursor()
+    keyset = get_keyset_column(table, col_info)
+    try:
+        if keyset is None:
+            query = f"SELECT * FROM {table}"
+            if where:
+                query += f" WHERE {where}"
+            if order_by:
+                query += f" ORDER BY {order_by}"
+            cursor.execute(query + ";", where_params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+
+        key_name, key_index = keyset
+        upper_bound = "" if end_key is None else f" AND {key_name} < {int(end_key)}"
+        if where:
+            upper_bound += f" AND ({where})"
+        cursor.execute(
+            f"SELECT * FROM {table} WHERE {key_name} >= ?{upper_bound} "
+            f"ORDER BY {key_name} LIMIT ?;",
+            (MIN_KEY if start_key is None else start_key, *where_params, chunk_size),
+        )
+        while True:
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            cursor.execute(
+                f"SELECT * FROM {table} WHERE {key_name} > ?{upper_bound} "
+                f"ORDER BY {key_name} LIMIT ?;",
+                (rows[-1][key_index], *where_params, chunk_size),
             )
+    finally:
+        cursor.close()
 
-def migrate_data(sqlite_conn, pg_conn):
+def convert_boolean(value):
     """
-    迁移数据从SQLite到PostgreSQL
+    将各种可能的 boolean 表示转换为 True/False，无法识别时返回 None
     """
-    sqlite_cursor = sqlite_conn.cursor()
+    return BOOLEAN_VALUES.get(value)
 
-    # 获取 SQLite 中的所有表
-    sqlite_cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [row[0] for row in sqlite_cursor.fetchall()]
+def convert_numeric(value):
+    """
+    将 numeric 值转换为 float，无法转换时返回 None
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
 
-    # 排除不需要迁移的表
-    tables_to_exclude = ["sqlite_sequence"]
-    tables = [table for table in tables if table not in tables_to_exclude]
+def convert_integer(value):
+    """
+    将 integer 值转换为 int
+    """
+    return int(value) if value is not None else None
 
-    # 验证并修正数值数据
-    for table in tables:
-        sqlite_cursor.execute(f"PRAGMA table_info({table});")
-        columns = [col[1] for col in sqlite_cursor.fetchall()]
-        validate_numeric_data(sqlite_cursor, table, columns)
+def convert_access_token(value):
+    """
+    截断 users 表的 access_token，使其符合 VARCHAR(32)
+    """
+    return str(value)[:32] if value else None
 
-    for table in tables:
-        # 为每个表创建使用独立连接
-        with pg_conn.cursor() as pg_cursor:
-            try:
-                # 检查表是否存在
-                pg_cursor.execute("SELECT to_regclass(%s);", (table,))
-                if pg_cursor.fetchone()[0] is None:
-                    print(f"Table {table} does not exist in PostgreSQL, skipping data migration")
-                    continue
-                
-                # 开始新的事务
-                pg_cursor.execute("BEGIN;")
+def passthrough(value):
+    """
+    原样返回值，用于无需转换的列
+    """
+    return value
 
-                # 获取列名
-                sqlite_cursor.execute(f"PRAGMA table_info({table});")
-                columns = [col[1] for col in sqlite_cursor.fetchall()]
+def make_numeric_clamp(col_name, limit, clamp_counts):
+    """
+    生成 numeric 转换函数，将超出 PostgreSQL 精度范围的值截断到 ±limit，并按列计数。
+    NaN 原样写入（PostgreSQL 的 numeric 接受 'NaN'）
+    """
 
-                # 查询数据
-                sqlite_cursor.execute(f"SELECT * FROM {table};")
-                rows = sqlite_cursor.fetchall()
+    def convert_clamped_numeric(value):
+        number = convert_numeric(value)
+        if number is None or math.isnan(number):
+            return number
+        if not -limit <= number <= limit:
+            with _clamp_counts_lock:
+                clamp_counts[col_name] = clamp_counts.get(col_name, 0) + 1
+            return limit if number > 0 else -limit
+        return number
 
-                # 获取列类型信息
-                sqlite_cursor.execute(f"PRAGMA table_info({table});")
-                col_info = sqlite_cursor.fetchall()
+    return convert_clamped_numeric
 
-                # 获取 PostgreSQL 列类型
-                pg_cursor.execute(
-                    f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = %s;",
-                    (table,),
-                )
-                pg_col_types = {col[0]: col[1] for col in pg_cursor.fetchall()}
-
-                # 转换数据
-                converted_rows = []
-                for row in rows:
-                    converted_row = []
-                    for i, value in enumerate(row):
-                        col_name = columns[i]
-                        col_type = col_info[i][2].lower()
-                        pg_type = pg_col_types.get(col_name, "").lower()
-                        is_pk = col_info[i][5]  # 检查是否是主键列
-
-                        # 处理主键列，确保不为空
-                        if is_pk and value is None:
-                            raise ValueError(
-                                f"Primary key column {col_name} cannot be null"
-                            )
-
-                        # 处理 boolean 类型
-                        if pg_type == "boolean":
-                            # 将各种可能的boolean表示转换为True/False
-                            if value in [1, "1", "true", "True", "TRUE", "t", "T"]:
-                                converted_row.append(True)
-                            elif value in [0, "0", "false", "False", "FALSE", "f", "F"]:
-                                converted_row.append(False)
-                            else:
-                                converted_row.append(None)
-                        # 处理 numeric 类型
-                        elif (
-                            col_type in ["numeric", "decimal", "real"]
-                            or pg_type == "numeric"
-                        ):
-                            # 确保 numeric 值被正确转换为 Decimal
-                            try:
-                                converted_row.append(
-                                    float(value) if value is not None else None
-                                )
-                            except (ValueError, TypeError):
-                                converted_row.append(None)
-                        # 处理 integer 类型
-                        elif col_type in ["integer", "bigint"]:
-                            # 对于主键列，确保值被正确转换
-                            if is_pk:
-                                converted_row.append(int(value))
-                            else:
-                                converted_row.append(
-                                    int(value) if value is not None else None
-                                )
-                        else:
-                            # 特殊处理 users 表的 access_token 列
-                            if table == "users" and col_name == "access_token":
-                                converted_row.append(str(value)[:32] if value else None)
-                            else:
-                                converted_row.append(value)
-                    converted_rows.append(tuple(converted_row))
-
-                # 插入数据
-                if converted_rows:  # 只有当有数据时才执行插入操作
-                    insert_sql = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
-                        sql.Identifier(table),
-                        sql.SQL(", ").join(map(sql.Identifier, columns)),
-                        sql.SQL(", ").join(sql.Placeholder() * len(columns)),
-                    )
-                    pg_cursor.executemany(insert_sql, converted_rows)
-                
-                pg_cursor.execute("COMMIT;")
-                print(f"Migrated {len(converted_rows)} rows to table {table}")
-            except Exception as e:
-                pg_cursor.execute("ROLLBACK;")
-                print(f"Error migrating data to table {table}: {e}")
+def make_primary_key_converter(col_name, convert):
+    """
+    包装主键列的转换函数，确保主键不为空
+    """
+    def convert_primary_key(value):
+        if value is None:
+            raise ValueError(f"Primary key column {col_name} cannot be null")
+        return convert(value)
+    return convert_primary_key
 
-def sync_sequences(pg_conn):
+def compile_column_converter(table, col, pg_col_types, pg_numeric_columns, clamp_counts):
     """
-    同步所有表的序列值，确保自增ID从正确的值开始
+    根据 SQLite 列信息和 PostgreSQL 列类型选择列的转换函数，无需转换时返回 None
+    """
+    col_name = col[1]
+    col_type = col[2].lower()
+    pg_type = pg_col_types.get(col_name, "").lower()
+    is_pk = col[5]
+
+    if pg_type == "boolean":
+        convert = convert_boolean
+    elif col_type in ["numeric", "decimal", "real"] or pg_type == "numeric":
+        precision, scale = pg_numeric_columns.get(col_name, (None, None))
+        if precision is None:
+            convert = convert_numeric
+        else:
+            # 例如 NUMERIC(10,2) 的范围是 ±99999999.99
+            limit = float(10 ** (precision - scale) - Decimal(1).scaleb(-scale))
+            convert = make_numeric_clamp(col_name, limit, clamp_counts)
+    elif col_type in ["integer", "bigint"]:
+        # 主键列已保证不为空，直接使用 int
+        convert = int if is_pk else convert_integer
+    elif table == "users" and col_name == "access_token":
+        convert = convert_access_token
+    else:
+        convert = None
+
+    if is_pk:
+        return make_primary_key_converter(col_name, convert or passthrough)
+    return convert
+
+def compile_row_converter(
+    table, col_info, pg_col_types, pg_numeric_columns=None, clamp_counts=None
+):
+    """
+    为每个表预先生成行转换函数，避免对每个单元格重复判断类型。
+    pg_numeric_columns 为 numeric 列的 (精度, 小数位数)，超出范围的值会被截断并计入 clamp_counts。
+    所有列都无需转换时返回 None。
+    """
+    pg_numeric_columns = pg_numeric_columns or {}
+    clamp_counts = {} if clamp_counts is None else clamp_counts
+    converters = tuple(
+        compile_column_converter(table, col, pg_col_types, pg_numeric_columns, clamp_counts)
+        for col in col_info
+    )
+    if all(convert is None for convert in converters):
+        return None
+    converters = tuple(convert or passthrough for convert in converters)
+
+    def convert_row(row):
+        return tuple(map(call, converters, row))
+
+    return convert_row
+
+def format_copy_value(value):
+    """
+    将单个值格式化为 COPY 文本格式
+    """
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, (bytes, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    return str(value).translate(COPY_TEXT_ESCAPES)
+
+def build_copy_data(rows):
+    """
+    将一块数据格式化为 COPY ... FROM STDIN 的文本
+    """
+    return "".join("\t".join(map(format_copy_value, row)) + "\n" for row in rows)
+
+def build_load_statement(table, columns, loader):
+    """
+    根据写入方式构建 COPY 或 INSERT 语句
+    """
+    if loader == "copy":
+        return sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(table),
+            sql.SQL(", ").join(map(sql.Identifier, columns)),
+        )
+    return sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
+        sql.SQL(", ").join(sql.Placeholder() * len(columns)),
+    )
+
+def compile_chunk_encoder(convert_row, loader):
     """
+    生成将一块原始行转换为写入数据的函数：copy 方式输出 COPY 文本，values 方式输出转换后的行
+    """
+    def encode(rows):
+        converted_rows = rows if convert_row is None else list(map(convert_row, rows))
+        return build_copy_data(converted_rows) if loader == "copy" else converted_rows
+
+    return encode
+
+def write_chunk(pg_cursor, statement, payload, loader):
+    """
+    将 compile_chunk_encoder 生成的一块数据写入 PostgreSQL
+    """
+    if loader == "copy":
+        with pg_cursor.copy(statement) as copy:
+            copy.write(payload)
+    else:
+        pg_cursor.executemany(statement, payload)
+
+def load_rows(pg_cursor, statement, rows, loader):
+    """
+    将一块已转换的数据写入 PostgreSQL
+    """
+    write_chunk(pg_cursor, statement, build_copy_data(rows) if loader == "copy" else rows, loader)
+
+def read_table_chunks(options, table, col_info, **chunk_args):
+    """
+    使用独立的只读 SQLite 连接分块读取，连接在开始迭代的线程（流水线的读取线程）中打开和关闭
+    """
+    sqlite_conn = open_source_sqlite(options)
     try:
-        with pg_conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT table_name, column_name
-                FROM information_schema.columns
-                WHERE column_default LIKE 'nextval%'
-            """
+        yield from iter_table_chunks(
+            sqlite_conn, table, col_info, options["chunk_size"], **chunk_args
+        )
+    finally:
+        sqlite_conn.close()
+
+def transfer_table_chunks(
+    sqlite_conn,
+    pg_cursor,
+    table,
+    col_info,
+    statement,
+    pg_col_types,
+    pg_numeric_columns,
+    clamp_counts,
+    options,
+    on_chunk=None,
+    start_key=None,
+    end_key=None,
+    where=None,
+    where_params=(),
+):
+    """
+    按块读取、转换并写入一个表（或一个主键范围）的数据，返回写入的行数。
+    convert_processes 大于 0 时，没有整数主键或主键是 rowid 别名的表由转换进程按 rowid 范围读取和转换
+    （见 transfer_rowid_ranges，主键范围和检查点即 rowid 范围）；
+    否则 pipeline_depth 大于 0 时读取和转换在后台线程中与写入重叠进行，读取使用独立的 SQLite 连接，
+    sqlite_conn 为 None 时总是使用独立连接。
+    on_chunk(loaded_rows, last_key) 在每块写入后调用，last_key 为该块最后一行的整数主键。
+    结束后打印各阶段的吞吐量
+    """
+    loader = options["loader"]
+    depth = options["pipeline_depth"]
+    keyset = get_keyset_column(table, col_info)
+    chunk_args = {"start_key": start_key, "end_key": end_key, "where": where, "where_params": where_params}
+
+    if options["convert_processes"] > 0 and (keyset is None or is_rowid_alias(table, col_info)):
+        bounds = get_rowid_bounds(sqlite_conn, table, start_key, end_key, options)
+        # 数据太少时启动进程的开销大于收益
+        if bounds and bounds[1] - bounds[0] >= 2 * options["chunk_size"]:
+            return transfer_rowid_ranges(
+                pg_cursor,
+                table,
+                col_info,
+                statement,
+                pg_col_types,
+                pg_numeric_columns,
+                clamp_counts,
+                options,
+                bounds,
+                on_chunk,
+                where,
+                where_params,
             )
-            sequences = cursor.fetchall()
 
-            for table, column in sequences:
-                # 检查表是否存在
-                cursor.execute("SELECT to_regclass(%s);", (table,))
-                if cursor.fetchone()[0] is None:
-                    print(f"Table {table} does not exist, skipping sequence synchronization")
-                    continue
-                    
-                try:
-                    cursor.execute(
-                        f"""
-                        SELECT setval(pg_get_serial_sequence('{table}', '{column}'),
-                        COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false)
-                    """
-                    )
-                    print(f"Synchronized sequence for {table}.{column}")
-                except Exception as e:
-                    print(f"Error synchronizing sequence for {table}.{column}: {e}")
-    except Exception as e:
-        print(f"Error in sync_sequences: {e}")
+    convert_row = compile_row_converter(
+        table, col_info, pg_col_types, pg_numeric_columns, clamp_counts
+    )
+    loaded_rows = 0
 
-def main():
+    def read():
+        if depth > 0 or sqlite_conn is None:
+            return read_table_chunks(options, table, col_info, **chunk_args)
+        return iter_table_chunks(sqlite_conn, table, col_info, options["chunk_size"], **chunk_args)
+
+    def write(rows, payload):
+        nonlocal loaded_rows
+        write_chunk(pg_cursor, statement, payload, loader)
+        loaded_rows += len(rows)
+        # values 方式发送的是参数，不统计字节数
+        options["metrics"].add_chunk(table, len(rows), len(payload) if loader == "copy" else 0)
+        if on_chunk:
+            on_chunk(loaded_rows, rows[-1][keyset[1]] if keyset else None)
+
+    stats = run_pipeline(
+        read, compile_chunk_encoder(convert_row, loader), write, depth, profile_thread_context(options)
+    )
+    options["metrics"].add_stages(table, stats)
+    if loaded_rows:
+        print(f"  {table} stages: {format_stats(stats)}")
+    return loaded_rows
+
+def get_rowid_bounds(sqlite_conn, table, start_key, end_key, options):
     """
-    Main function to handle the database migration process
+    获取表（或主键范围内）rowid 的 [最小值, 最大值 + 1)，空表或 WITHOUT ROWID 表返回 None
     """
-    # 初始化连接变量
-    sqlite_conn = None
-    pg_conn = None
-    
+    conn = sqlite_conn or open_source_sqlite(options)
     try:
-        # 加载配置
-        config = load_config()
-        if not config:
-            print("Failed to load configuration. Exiting.")
-            sys.exit(1)
-        
-        # 设置连接参数
-        sqlite_db_file = config["database"]["sqlite_file"]
-        pg_db_config = {
-            "dbname": config["postgresql"]["cloud"]["dbname"],
-            "user": config["postgresql"]["cloud"]["user"],
-            "password": config["postgresql"]["cloud"]["password"],
-            "host": config["postgresql"]["cloud"]["host"],
-            "port": int(config["postgresql"]["cloud"]["port"]),
-        }
-        
-        # 打印连接信息（不显示密码）
-        print(f"SQLite database: {sqlite_db_file}")
-        print(f"PostgreSQL host: {pg_db_config['host']}, port: {pg_db_config['port']}, database: {pg_db_config['dbname']}, user: {pg_db_config['user']}")
-        
-        # 连接SQLite数据库
+        min_rowid, max_rowid = conn.execute(
+            f"SELECT MIN(rowid), MAX(rowid) FROM {table} WHERE rowid >= ? AND rowid < ?;",
+            (MIN_KEY if start_key is None else start_key, MAX_KEY if end_key is None else end_key),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        if sqlite_conn is None:
+            conn.close()
+    if min_rowid is None:
+        return None
+    return min_rowid, max_rowid + 1
+
+def init_convert_worker(
+    sqlite_db_file, immutable, read_pragmas, table, col_info, pg_col_types, pg_numeric_columns, where, where_params
+):
+    """
+    转换进程的初始化函数：打开只读 SQLite 连接并编译该表的行转换函数
+    """
+    clamp_counts = {}
+    convert_row = compile_row_converter(
+        table, col_info, pg_col_types, pg_numeric_columns, clamp_counts
+    )
+    keyset = get_keyset_column(table, col_info)
+    query = f"SELECT * FROM {table} WHERE rowid >= ? AND rowid < ?"
+    if where:
+        query += f" AND ({where})"
+    _convert_worker.update(
+        sqlite_conn=connect_sqlite_readonly(sqlite_db_file, immutable, read_pragmas=read_pragmas),
+        encode=compile_chunk_encoder(convert_row, "copy"),
+        clamp_counts=clamp_counts,
+        query=query + " ORDER BY rowid;",
+        where_params=where_params,
+        key_index=keyset[1] if keyset else None,
+    )
+
+def convert_rowid_range(rowid_range):
+    """
+    在转换进程中读取一个 rowid 范围的行并生成 COPY 文本的 UTF-8 字节，
+    返回 (行数, 最后一行的整数主键, 数据, 读取耗时, 转换耗时, 本范围的截断计数)
+    """
+    worker = _convert_worker
+    start = time.perf_counter()
+    rows = worker["sqlite_conn"].execute(
+        worker["query"], (*rowid_range, *worker["where_params"])
+    ).fetchall()
+    read_seconds = time.perf_counter() - start
+    if not rows:
+        return 0, None, b"", read_seconds, 0.0, {}
+    start = time.perf_counter()
+    payload = worker["encode"](rows).encode()
+    convert_seconds = time.perf_counter() - start
+    clamp_counts = dict(worker["clamp_counts"])
+    worker["clamp_counts"].clear()
+    last_key = rows[-1][worker["key_index"]] if worker["key_index"] is not None else None
+    return len(rows), last_key, payload, read_seconds, convert_seconds, clamp_counts
+
+def transfer_rowid_ranges(
+    pg_cursor,
+    table,
+    col_info,
+    statement,
+    pg_col_types,
+    pg_numeric_columns,
+    clamp_counts,
+    options,
+    bounds,
+    on_chunk=None,
+    where=None,
+    where_params=(),
+):
+    """
+    将 rowid 范围 bounds 按 chunk_size 切分，由进程池中的转换进程各自读取 SQLite 并生成 COPY 数据，
+    写入端按顺序原样发送，不受 GIL 限制。读取和转换阶段的耗时为各进程耗时之和除以进程数
+    """
+    processes = options["convert_processes"]
+    step = options["chunk_size"]
+    ranges = [(low, min(low + step, bounds[1])) for low in range(bounds[0], bounds[1], step)]
+    stats = {name: StageStats(name) for name in STAGES}
+    loaded_rows = 0
+
+    def write(result):
+        nonlocal loaded_rows
+        rows, last_key, payload, read_seconds, convert_seconds, range_clamp_counts = result
+        stats["read"].add(rows, read_seconds / processes)
+        stats["convert"].add(rows, convert_seconds / processes)
+        with _clamp_counts_lock:
+            for col_name, count in range_clamp_counts.items():
+                clamp_counts[col_name] = clamp_counts.get(col_name, 0) + count
+        if not rows:
+            return
+        start = time.perf_counter()
+        write_chunk(pg_cursor, statement, payload, "copy")
+        stats["write"].add(rows, time.perf_counter() - start)
+        loaded_rows += rows
+        options["metrics"].add_chunk(table, rows, len(payload))
+        if on_chunk:
+            on_chunk(loaded_rows, last_key)
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context(CONVERT_START_METHOD),
+        initializer=init_convert_worker,
+        initargs=(
+            options["sqlite_db_file"],
+            options["immutable"],
+            options["read_pragmas"],
+            table,
+            col_info,
+            pg_col_types,
+            pg_numeric_columns,
+            where,
+            where_params,
+        ),
+    ) as executor:
+        run_ordered(executor, convert_rowid_range, ranges, write, 2 * processes)
+    options["metrics"].add_stages(table, stats)
+    if loaded_rows:
+        print(f"  {table} stages ({processes} convert processes): {format_stats(stats)}")
+    return loaded_rows
+
+def profile_section(options, name):
+    """
+    --profile 时在 name（表名或阶段名）下分析代码，否则不做任何事
+    """
+    profiler = options.get("profiler")
+    return profiler.section(name) if profiler else nullcontext()
+
+def profile_thread_context(options):
+    """
+    --profile 时返回后台线程（流水线阶段、拆分的主键范围）使用的上下文管理器工厂，使其计入当前表
+    """
+    profiler = options.get("profiler")
+    return profiler.thread_context() if profiler else nullcontext
+
+def migrate_data(sqlite_conn, pg_pool, options):
+    """
+    迁移数据从SQLite到PostgreSQL，按块流式读取、转换和写入。
+    每个表的写入失败时整体回滚（续传模式下从检查点继续），因此连接中断后可以换连接重试
+    """
+    for table in list_tables(sqlite_conn, options):
+        with profile_section(options, table):
+            pg_pool.run(
+                lambda pg_conn: migrate_table_data(sqlite_conn, pg_conn, table, options),
+                f"migrating table {table}",
+            )
+
+def migrate_table_data(sqlite_conn, pg_conn, table, options):
+    """
+    迁移单个表的数据，整个表在一个事务中写入。
+    超过拆分阈值的大表按主键范围拆分后并行写入，续传模式下按块提交。
+    返回迁移的行数，失败或跳过时返回 None。
+    """
+    if options["resume"]:
+        return migrate_table_data_resumable(sqlite_conn, pg_conn, table, options)
+
+    sqlite_cursor = sqlite_conn.cursor()
+    loader = options["loader"]
+
+    # 为每个表创建使用独立连接
+    with pg_conn.cursor() as pg_cursor:
         try:
-            sqlite_conn = sqlite3.connect(sqlite_db_file)
-            print("SQLite connection established successfully.")
+            # 检查表是否存在
+            pg_table = options["catalog"].table(pg_conn, table)
+            if pg_table is None:
+                print(f"Table {table} does not exist in PostgreSQL, skipping data migration")
+                return
+            
+            # 获取列名和列类型信息
+            sqlite_cursor.execute(f"PRAGMA table_info({table});")
+            col_info = sqlite_cursor.fetchall()
+            columns = [col[1] for col in col_info]
+
+            # 获取 PostgreSQL 列类型
+            pg_col_types = pg_table.column_types()
+            pg_numeric_columns = pg_table.numeric_columns()
+
+            # 大表按主键范围拆分
+            keyset = get_keyset_column(table, col_info)
+            if keyset and should_split_table(sqlite_conn, table, options):
+                pg_conn.rollback()
+                return migrate_table_data_split(
+                    sqlite_conn,
+                    table,
+                    col_info,
+                    keyset,
+                    pg_col_types,
+                    pg_numeric_columns,
+                    options,
+                )
+
+            clamp_counts = {}
+            statement = build_load_statement(table, columns, loader)
+
+            # 按块读取、转换并写入数据
+            where, where_params = build_window_filter(table, col_info, options)
+            if where:
+                print(f"  {table}: only rows where {where.replace('?', repr(where_params[0]))}")
+            start_time = time.perf_counter()
+            total_rows = transfer_table_chunks(
+                sqlite_conn,
+                pg_cursor,
+                table,
+                col_info,
+                statement,
+                pg_col_types,
+                pg_numeric_columns,
+                clamp_counts,
+                options,
+                on_chunk=lambda loaded_rows, last_key: print(f"  {table}: {loaded_rows} rows copied"),
+                where=where,
+                where_params=where_params,
+            )
+            pg_conn.commit()
+            elapsed = time.perf_counter() - start_time
+            rate = total_rows / elapsed if elapsed > 0 else 0
+            print(
+                f"Migrated {total_rows} rows to table {table} "
+                f"in {elapsed:.2f}s ({rate:.0f} rows/s)"
+            )
+            report_clamped_values(table, clamp_counts)
+            options["metrics"].finish_table(table, "migrate_data", total_rows, elapsed)
+            return total_rows
         except Exception as e:
-            print(f"Error connecting to SQLite database: {e}")
+            if is_transient_error(e):
+                raise
+            pg_conn.rollback()
+            print(f"Error migrating data to table {table}: {e}")
+            options["metrics"].finish_table(table, "migrate_data", 0, 0.0, status="error", error=str(e))
+
+def report_clamped_values(table, clamp_counts):
+    """
+    打印每列被截断的超出范围数值的数量
+    """
+    for col_name, count in sorted(clamp_counts.items()):
+        print(f"  {table}.{col_name}: clamped {count} out-of-range values")
+
+def should_split_table(sqlite_conn, table, options):
+    """
+    判断表的行数是否超过拆分阈值
+    """
+    if options["split_parts"] <= 1:
+        return False
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"SELECT COUNT(*) FROM {table};")
+    return sqlite_cursor.fetchone()[0] >= options["split_threshold"]
+
+def compute_key_ranges(sqlite_conn, table, key_name, parts):
+    """
+    根据 MIN/MAX 将主键拆分为若干个左闭右开的范围
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"SELECT MIN({key_name}), MAX({key_name}) FROM {table};")
+    min_key, max_key = sqlite_cursor.fetchone()
+    if min_key is None:
+        return []
+    step = max((max_key - min_key + 1) // parts, 1)
+    bounds = list(range(min_key, max_key + 1, step))[:parts] + [max_key + 1]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def load_key_range(
+    pg_conn,
+    table,
+    col_info,
+    staging_table,
+    key_range,
+    pg_col_types,
+    pg_numeric_columns,
+    clamp_counts,
+    options,
+):
+    """
+    将一个主键范围的数据写入 staging 表，完成后提交。
+    整个范围在一个事务中写入，失败后可以换一个连接重新执行
+    """
+    columns = [col[1] for col in col_info]
+    statement = build_load_statement(staging_table, columns, options["loader"])
+    where, where_params = build_window_filter(table, col_info, options)
+    with pg_conn.cursor() as pg_cursor:
+        total_rows = transfer_table_chunks(
+            None,
+            pg_cursor,
+            table,
+            col_info,
+            statement,
+            pg_col_types,
+            pg_numeric_columns,
+            clamp_counts,
+            options,
+            start_key=key_range[0],
+            end_key=key_range[1],
+            where=where,
+            where_params=where_params,
+        )
+    pg_conn.commit()
+    print(f"  {table}: {total_rows} rows copied for keys [{key_range[0]}, {key_range[1]})")
+    return total_rows
+
+def migrate_table_data_split(
+    sqlite_conn, table, col_info, keyset, pg_col_types, pg_numeric_columns, options
+):
+    """
+    将大表按主键范围拆分，通过连接池中的多个连接并行写入 UNLOGGED staging 表，
+    全部完成后在一个事务中替换原表
+    """
+    key_name = keyset[0]
+    staging_table = f"{table}__staging"
+    key_ranges = compute_key_ranges(sqlite_conn, table, key_name, options["split_parts"])
+    clamp_counts = {}
+    print(f"Splitting table {table} into {len(key_ranges)} key ranges")
+
+    start_time = time.perf_counter()
+    pg_conn = connect(options["pg_db_config"])
+    range_pool = ConnectionPool(options["pg_db_config"], max_size=len(key_ranges) or 1)
+    try:
+        with pg_conn.cursor() as pg_cursor:
+            pg_cursor.execute(f"DROP TABLE IF EXISTS {staging_table};")
+            pg_cursor.execute(
+                f"CREATE UNLOGGED TABLE {staging_table} (LIKE {table} INCLUDING DEFAULTS);"
+            )
+        pg_conn.commit()
+        thread_context = profile_thread_context(options)
+
+        def load_range(key_range):
+            with thread_context():
+                return range_pool.run(
+                    lambda range_conn: load_key_range(
+                        range_conn,
+                        table,
+                        col_info,
+                        staging_table,
+                        key_range,
+                        pg_col_types,
+                        pg_numeric_columns,
+                        clamp_counts,
+                        options,
+                    ),
+                    f"copying keys [{key_range[0]}, {key_range[1]}) of table {table}",
+                )
+
+        try:
+            total_rows = 0
+            with ThreadPoolExecutor(max_workers=len(key_ranges) or 1) as executor:
+                futures = [executor.submit(load_range, key_range) for key_range in key_ranges]
+                for future in futures:
+                    total_rows += future.result()
+
+            # 在一个事务中用 staging 表替换原表，并保留原表的主键
+            with pg_conn.cursor() as pg_cursor:
+                pg_cursor.execute(
+                    """
+                    SELECT conname, pg_get_constraintdef(oid)
+                    FROM pg_constraint
+                    WHERE conrelid = %s::regclass AND contype = 'p';
+                """,
+                    (table,),
+                )
+                primary_key = pg_cursor.fetchone()
+                pg_cursor.execute(f"ALTER TABLE {staging_table} SET LOGGED;")
+                pg_cursor.execute(f"DROP TABLE {table};")
+                if primary_key:
+                    pg_cursor.execute(
+                        f'ALTER TABLE {staging_table} ADD CONSTRAINT "{primary_key[0]}" {primary_key[1]};'
+                    )
+                pg_cursor.execute(f"ALTER TABLE {staging_table} RENAME TO {table};")
+            pg_conn.commit()
+            options["catalog"].invalidate(table)
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            pg_conn.rollback()
+            with pg_conn.cursor() as pg_cursor:
+                pg_cursor.execute(f"DROP TABLE IF EXISTS {staging_table};")
+            pg_conn.commit()
+            print(f"Error migrating data to table {table}: {e}")
+            options["metrics"].finish_table(table, "migrate_data", 0, 0.0, status="error", error=str(e))
+            return None
+    finally:
+        range_pool.close()
+        pg_conn.close()
+
+    elapsed = time.perf_counter() - start_time
+    rate = total_rows / elapsed if elapsed > 0 else 0
+    print(
+        f"Migrated {total_rows} rows to table {table} "
+        f"in {elapsed:.2f}s ({rate:.0f} rows/s)"
+    )
+    report_clamped_values(table, clamp_counts)
+    options["metrics"].finish_table(table, "migrate_data", total_rows, elapsed, split_parts=len(key_ranges))
+    return total_rows
+
+def ensure_checkpoint_table(pg_conn):
+    """
+    创建保存续传进度的表
+    """
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+                table_name TEXT PRIMARY KEY,
+                last_key BIGINT,
+                rows_loaded BIGINT NOT NULL DEFAULT 0,
+                completed BOOLEAN NOT NULL DEFAULT false,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+            );
+        """
+        )
+    pg_conn.commit()
+
+def prepare_progress_tables(pg_conn, options):
+    """
+    创建增量同步和续传所需的进度表；完整迁移时删除旧的续传进度。
+    校验和比对在没有主键的表上回退为增量同步的整表重写，同样需要检查点表
+    """
+    if options["incremental"] or options["checksum"]:
+        ensure_state_table(pg_conn)
+    if options["resume"]:
+        ensure_checkpoint_table(pg_conn)
+    elif not (options["incremental"] or options["checksum"]):
+        drop_checkpoint_table(pg_conn)
+
+def drop_checkpoint_table(pg_conn):
+    """
+    完整迁移会重建所有表，旧的续传进度不再有效
+    """
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(f"DROP TABLE IF EXISTS {CHECKPOINT_TABLE};")
+    pg_conn.commit()
+
+def clear_completed_checkpoints(pg_conn, tables):
+    """
+    续传模式下所有表都已完成时删除续传进度，下一次 --resume 运行重新迁移所有表；
+    有表未完成时保留进度，重新运行时从断点继续。返回是否已删除
+    """
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            f"SELECT COUNT(*) FROM {CHECKPOINT_TABLE} WHERE completed AND table_name = ANY(%s);",
+            (tables,),
+        )
+        completed = pg_cursor.fetchone()[0]
+    if completed < len(tables):
+        pg_conn.rollback()
+        print(f"{len(tables) - completed} tables not completed, keeping resume checkpoints")
+        return False
+    drop_checkpoint_table(pg_conn)
+    print("All tables migrated, resume checkpoints cleared")
+    return True
+
+def load_checkpoint(pg_cursor, table):
+    """
+    读取表的续传进度，返回 (last_key, rows_loaded, completed)，没有记录时返回 None
+    """
+    pg_cursor.execute(
+        f"SELECT last_key, rows_loaded, completed FROM {CHECKPOINT_TABLE} WHERE table_name = %s;",
+        (table,),
+    )
+    return pg_cursor.fetchone()
+
+def save_checkpoint(pg_cursor, table, last_key, rows_loaded, completed=False):
+    """
+    保存表的续传进度，与该块数据在同一个事务中提交
+    """
+    pg_cursor.execute(
+        f"""
+        INSERT INTO {CHECKPOINT_TABLE} (table_name, last_key, rows_loaded, completed, updated_at)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (table_name) DO UPDATE SET
+            last_key = EXCLUDED.last_key,
+            rows_loaded = EXCLUDED.rows_loaded,
+            completed = EXCLUDED.completed,
+            updated_at = EXCLUDED.updated_at;
+    """,
+        (table, last_key, rows_loaded, completed),
+    )
+
+def migrate_table_data_resumable(sqlite_conn, pg_conn, table, options):
+    """
+    可续传地迁移单个表：有单一整数主键的表每块数据和进度在同一个事务中提交，
+    重新运行（或连接中断后重试）时从最后提交的主键之后继续；其他表在一个事务中清空并重新写入。
+    返回表中已迁移的总行数，失败或跳过时返回 None。
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    loader = options["loader"]
+
+    with pg_conn.cursor() as pg_cursor:
+        try:
+            pg_table = options["catalog"].table(pg_conn, table)
+            if pg_table is None:
+                print(f"Table {table} does not exist in PostgreSQL, skipping data migration")
+                return
+
+            checkpoint = load_checkpoint(pg_cursor, table)
+            if checkpoint and checkpoint[2]:
+                print(f"Table {table} was already migrated ({checkpoint[1]} rows), skipping")
+                pg_conn.rollback()
+                return checkpoint[1]
+
+            sqlite_cursor.execute(f"PRAGMA table_info({table});")
+            col_info = sqlite_cursor.fetchall()
+            columns = [col[1] for col in col_info]
+            keyset = get_keyset_column(table, col_info)
+
+            pg_col_types = pg_table.column_types()
+            pg_numeric_columns = pg_table.numeric_columns()
+            clamp_counts = {}
+            statement = build_load_statement(table, columns, loader)
+            where, where_params = build_window_filter(table, col_info, options)
+
+            if keyset and checkpoint:
+                last_key, total_rows = checkpoint[0], checkpoint[1]
+                if last_key is not None:
+                    print(f"Resuming table {table} after key {last_key} ({total_rows} rows already loaded)")
+                start_key = None if last_key is None else last_key + 1
+            else:
+                # 无法按主键续传，或没有进度记录（每块数据与进度在同一个事务中提交，
+                # 表中已有的数据不是本次续传写入的前缀），整表重新写入
+                pg_cursor.execute(f"TRUNCATE {table};")
+                last_key, total_rows, start_key = None, 0, None
+
+            start_time = time.perf_counter()
+            previous_rows = total_rows
+
+            def commit_chunk(loaded_rows, chunk_last_key):
+                nonlocal last_key, total_rows
+                total_rows = previous_rows + loaded_rows
+                if keyset:
+                    last_key = chunk_last_key
+                    save_checkpoint(pg_cursor, table, last_key, total_rows)
+                    pg_conn.commit()
+                print(f"  {table}: {total_rows} rows copied")
+
+            loaded_rows = transfer_table_chunks(
+                sqlite_conn,
+                pg_cursor,
+                table,
+                col_info,
+                statement,
+                pg_col_types,
+                pg_numeric_columns,
+                clamp_counts,
+                options,
+                on_chunk=commit_chunk,
+                start_key=start_key,
+                where=where,
+                where_params=where_params,
+            )
+
+            save_checkpoint(pg_cursor, table, last_key, total_rows, completed=True)
+            pg_conn.commit()
+            elapsed = time.perf_counter() - start_time
+            rate = loaded_rows / elapsed if elapsed > 0 else 0
+            print(
+                f"Migrated {loaded_rows} rows to table {table} "
+                f"in {elapsed:.2f}s ({rate:.0f} rows/s), {total_rows} rows in total"
+            )
+            report_clamped_values(table, clamp_counts)
+            options["metrics"].finish_table(table, "migrate_data", loaded_rows, elapsed, total_rows=total_rows)
+            return total_rows
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            pg_conn.rollback()
+            print(f"Error migrating data to table {table}: {e}")
+            options["metrics"].finish_table(table, "migrate_data", 0, 0.0, status="error", error=str(e))
+
+def get_change_column(col_info, keyset):
+    """
+    选择用于检测新增或修改行的列。
+    有整数主键的表只需 updated_at，新增行通过主键检测。
+    """
+    col_names = [col[1] for col in col_info]
+    candidates = ["updated_at"] if keyset else CHANGE_COLUMNS
+    for name in candidates:
+        if name in col_names:
+            return name
+    return None
+
+def ensure_state_table(pg_conn):
+    """
+    创建保存增量同步检查点的表
+    """
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                table_name TEXT PRIMARY KEY,
+                last_id BIGINT,
+                change_column TEXT,
+                last_change TEXT,
+                synced_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+            );
+        """
+        )
+    pg_conn.commit()
+
+def load_table_state(pg_cursor, table):
+    """
+    读取表的检查点，返回 (last_id, change_column, last_change)，没有检查点时返回 None
+    """
+    pg_cursor.execute(
+        f"SELECT last_id, change_column, last_change FROM {STATE_TABLE} WHERE table_name = %s;",
+        (table,),
+    )
+    return pg_cursor.fetchone()
+
+def save_table_state(pg_cursor, table, watermarks):
+    """
+    保存表的检查点
+    """
+    last_id, change_column, last_change = watermarks
+    pg_cursor.execute(
+        f"""
+        INSERT INTO {STATE_TABLE} (table_name, last_id, change_column, last_change, synced_at)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (table_name) DO UPDATE SET
+            last_id = EXCLUDED.last_id,
+            change_column = EXCLUDED.change_column,
+            last_change = EXCLUDED.last_change,
+            synced_at = EXCLUDED.synced_at;
+    """,
+        (
+            table,
+            last_id,
+            change_column,
+            None if last_change is None else str(last_change),
+        ),
+    )
+
+def clear_table_state(pg_cursor, table):
+    """
+    删除表的检查点，下次增量同步时重新合并所有行
+    """
+    pg_cursor.execute(f"DELETE FROM {STATE_TABLE} WHERE table_name = %s;", (table,))
+
+def capture_watermarks(sqlite_conn, table, keyset, change_column):
+    """
+    在读取数据之前记录主键和变更列的最大值，作为本次同步的检查点
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    key_expr = f"MAX({keyset[0]})" if keyset else "NULL"
+    change_expr = f"MAX({change_column})" if change_column else "NULL"
+    sqlite_cursor.execute(f"SELECT {key_expr}, {change_expr} FROM {table};")
+    last_id, last_change = sqlite_cursor.fetchone()
+    return last_id, change_column, last_change
+
+def build_delta_filter(col_info, keyset, change_column, state):
+    """
+    根据检查点构建只读取新增或修改行的过滤条件，返回 (start_key, where, where_params)
+    """
+    if state is None:
+        return None, None, ()
+    last_id, state_change_column, last_change = state
+    if change_column and change_column == state_change_column and last_change is not None:
+        # 变更列的检查点以文本保存，按 SQLite 列类型还原
+        col_type = next(col[2].lower() for col in col_info if col[1] == change_column)
+        if col_type in ["integer", "bigint"]:
+            last_change = int(last_change)
+        conditions = [f"{change_column} >= ?"]
+        params = [last_change]
+        if keyset and last_id is not None:
+            conditions.insert(0, f"{keyset[0]} > ?")
+            params.insert(0, last_id)
+        return None, " OR ".join(conditions), tuple(params)
+    if keyset and last_id is not None and not change_column:
+        return last_id + 1, None, ()
+    return None, None, ()
+
+def build_merge_statement(table, staging_table, columns, pk_columns):
+    """
+    构建将 staging 表合并到目标表的 INSERT ... ON CONFLICT DO UPDATE 语句
+    """
+    update_columns = [col for col in columns if col not in pk_columns]
+    if update_columns:
+        conflict_action = sql.SQL("DO UPDATE SET {}").format(
+            sql.SQL(", ").join(
+                sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(col), sql.Identifier(col))
+                for col in update_columns
+            )
+        )
+    else:
+        conflict_action = sql.SQL("DO NOTHING")
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    return sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}").format(
+        sql.Identifier(table),
+        column_list,
+        column_list,
+        sql.Identifier(staging_table),
+        sql.SQL(", ").join(map(sql.Identifier, pk_columns)),
+        conflict_action,
+    )
+
+def sync_tables(sqlite_conn, pg_pool, options):
+    """
+    增量或校验和方式同步所有表，每个表在一个事务中同步，连接中断时换连接重试
+    """
+    for table in list_tables(sqlite_conn, options):
+        with profile_section(options, table):
+            pg_pool.run(
+                lambda pg_conn: sync_table(sqlite_conn, pg_conn, table, options),
+                f"syncing table {table}",
+            )
+
+def sync_table(sqlite_conn, pg_conn, table, options):
+    """
+    选择单个表的同步方式：
+    启用 --checksum 时，没有变更列可用且不是只追加的表（或未启用 --incremental 时的所有表）
+    使用校验和比对，其余表使用检查点增量同步。
+    已存在的表先按 SQLite 结构执行所需的 ALTER TABLE，新增的列可以直接同步
+    """
+    pg_table = options["catalog"].table(pg_conn, table)
+    if pg_table is not None:
+        apply_schema_diff(sqlite_conn, pg_conn, pg_table, options)
+    if options["checksum"]:
+        sqlite_cursor = sqlite_conn.cursor()
+        sqlite_cursor.execute(f"PRAGMA table_info({table});")
+        col_info = sqlite_cursor.fetchall()
+        keyset = get_keyset_column(table, col_info)
+        if not options["incremental"] or (
+            get_change_column(col_info, keyset) is None
+            and table not in APPEND_ONLY_TABLES
+        ):
+            sync_table_checksum(sqlite_conn, pg_conn, table, options)
+            return
+    sync_table_incremental(sqlite_conn, pg_conn, table, options)
+
+def create_and_load_table(sqlite_conn, pg_conn, table, options, watermarks=None):
+    """
+    创建表并完整迁移数据，启用增量同步时同时记录检查点
+    """
+    create_table(sqlite_conn, pg_conn, table, options["fast_load"])
+    options["catalog"].invalidate(table)
+    total_rows = migrate_table_data(sqlite_conn, pg_conn, table, options)
+    if total_rows is not None and options["incremental"] and watermarks:
+        with pg_conn.cursor() as pg_cursor:
+            save_table_state(pg_cursor, table, watermarks)
+        pg_conn.commit()
+    return total_rows
+
+def sync_table_incremental(sqlite_conn, pg_conn, table, options):
+    """
+    增量同步单个表。
+    表在 PostgreSQL 中不存在时完整迁移；有主键的表只复制检查点之后新增或修改的行，
+    先 COPY 到临时表再合并；没有主键的表清空后重新写入。
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"PRAGMA table_info({table});")
+    col_info = sqlite_cursor.fetchall()
+    columns = [col[1] for col in col_info]
+    keyset = get_keyset_column(table, col_info)
+    change_column = get_change_column(col_info, keyset)
+    watermarks = capture_watermarks(sqlite_conn, table, keyset, change_column)
+
+    # 表不存在时完整迁移并记录检查点
+    pg_table = options["catalog"].table(pg_conn, table)
+    if pg_table is None:
+        create_and_load_table(sqlite_conn, pg_conn, table, options, watermarks)
+        return
+
+    loader = options["loader"]
+    with pg_conn.cursor() as pg_cursor:
+        try:
+            start_time = time.perf_counter()
+            state = load_table_state(pg_cursor, table)
+            pk_columns = pg_table.primary_key
+            pg_col_types = pg_table.column_types()
+            pg_numeric_columns = pg_table.numeric_columns()
+            clamp_counts = {}
+
+            if pk_columns:
+                # 只读取新增或修改的行，写入临时表后合并
+                start_key, where, where_params = build_delta_filter(
+                    col_info, keyset, change_column, state
+                )
+                where, where_params = combine_filters(
+                    (where, where_params), build_window_filter(table, col_info, options)
+                )
+                target_table = f"{table}__delta"
+                pg_cursor.execute(
+                    f"CREATE TEMP TABLE {target_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP;"
+                )
+            else:
+                # 没有主键无法合并，清空后重新写入
+                start_key, where, where_params = None, None, ()
+                target_table = table
+                pg_cursor.execute(f"TRUNCATE {table};")
+
+            statement = build_load_statement(target_table, columns, loader)
+            total_rows = transfer_table_chunks(
+                sqlite_conn,
+                pg_cursor,
+                table,
+                col_info,
+                statement,
+                pg_col_types,
+                pg_numeric_columns,
+                clamp_counts,
+                options,
+                start_key=start_key,
+                where=where,
+                where_params=where_params,
+            )
+
+            if pk_columns:
+                pg_cursor.execute(
+                    build_merge_statement(table, target_table, columns, pk_columns)
+                )
+            save_table_state(pg_cursor, table, watermarks)
+            pg_conn.commit()
+
+            elapsed = time.perf_counter() - start_time
+            mode = "upserted" if pk_columns else "reloaded"
+            print(f"Incrementally {mode} {total_rows} rows in table {table} in {elapsed:.2f}s")
+            report_clamped_values(table, clamp_counts)
+            options["metrics"].finish_table(table, "sync_incremental", total_rows, elapsed, mode=mode)
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            pg_conn.rollback()
+            print(f"Error syncing table {table} incrementally: {e}")
+            options["metrics"].finish_table(table, "sync_incremental", 0, 0.0, status="error", error=str(e))
+
+def render_pg_numeric(value, scale):
+    """
+    按 PostgreSQL numeric 的文本输出格式渲染数值
+    """
+    number = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+    if scale is not None:
+        number = number.quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP)
+    # numeric 没有负零
+    if number.is_zero():
+        number = abs(number)
+    return format(number, "f")
+
+def render_pg_jsonb(value):
+    """
+    按 PostgreSQL jsonb 的文本输出格式渲染 JSON：键按长度和字节序排序，数字按 numeric 输出
+    """
+    def render(node):
+        if isinstance(node, dict):
+            keys = sorted(node, key=lambda key: (len(key.encode()), key.encode()))
+            return "{" + ", ".join(
+                f"{json.dumps(key, ensure_ascii=False)}: {render(node[key])}" for key in keys
+            ) + "}"
+        if isinstance(node, list):
+            return "[" + ", ".join(map(render, node)) + "]"
+        if isinstance(node, Decimal):
+            return render_pg_numeric(node, None)
+        return json.dumps(node, ensure_ascii=False)
+
+    if isinstance(value, bytes):
+        value = value.decode()
+    return render(json.loads(value, parse_float=Decimal, parse_int=Decimal))
+
+def parse_timestamp(value):
+    """
+    解析 SQLite 中的时间文本，小数秒按 PostgreSQL 的方式舍入到微秒，没有时区时按 UTC 处理
+    """
+    match = TIMESTAMP_PATTERN.match(str(value).strip())
+    if not match:
+        raise ValueError(f"Unrecognized timestamp: {value}")
+    base, fraction, zone = match.groups()
+    microseconds = int(Decimal(f"0.{fraction or 0}").scaleb(6).quantize(Decimal(1)))
+    parsed = datetime.fromisoformat(base + zone) + timedelta(microseconds=microseconds)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def compile_value_renderer(data_type, scale):
+    """
+    根据 PostgreSQL 列类型生成 Python 端的值渲染函数，
+    输出与 pg_render_expression 在数据库端的渲染结果一致
+    """
+    if data_type == "boolean":
+        return lambda value: "t" if value else "f"
+    if data_type == "numeric":
+        return lambda value: render_pg_numeric(value, scale)
+    if data_type == "jsonb":
+        return render_pg_jsonb
+    if data_type == "date":
+        return lambda value: parse_timestamp(value).date().isoformat()
+    if data_type == "timestamp with time zone":
+        return lambda value: parse_timestamp(value).astimezone(timezone.utc).strftime(
+            "%Y-%m-%d %H:%M:%S.%f"
+        )
+    if data_type == "timestamp without time zone":
+        return lambda value: parse_timestamp(value).strftime("%Y-%m-%d %H:%M:%S.%f")
+    if data_type == "bytea":
+        return lambda value: (value if isinstance(value, bytes) else str(value).encode()).hex()
+
+    def render_text(value):
+        if isinstance(value, bytes):
+            return "\\x" + value.hex()
+        return str(value)
+
+    return render_text
+
+def pg_render_expression(col_name, data_type):
+    """
+    生成在 PostgreSQL 端渲染列值的 SQL 表达式，NULL 渲染为 CHECKSUM_NULL
+    """
+    column = sql.Identifier(col_name)
+    if data_type == "boolean":
+        expression = sql.SQL("CASE WHEN {0} THEN 't' WHEN NOT {0} THEN 'f' END").format(column)
+    elif data_type == "date":
+        expression = sql.SQL("to_char({}, 'YYYY-MM-DD')").format(column)
+    elif data_type == "timestamp with time zone":
+        expression = sql.SQL(
+            "to_char({} AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS.US')"
+        ).format(column)
+    elif data_type == "timestamp without time zone":
+        expression = sql.SQL("to_char({}, 'YYYY-MM-DD HH24:MI:SS.US')").format(column)
+    elif data_type == "bytea":
+        expression = sql.SQL("encode({}, 'hex')").format(column)
+    else:
+        expression = sql.SQL("{}::text").format(column)
+    return sql.SQL("COALESCE({}, {})").format(expression, sql.Literal(CHECKSUM_NULL))
+
+def build_pg_row_expression(columns, pg_col_types):
+    """
+    生成在 PostgreSQL 端渲染整行文本的表达式，对其计算的 md5 与 compile_row_hasher 一致
+    """
+    return sql.SQL("concat_ws({}, {})").format(
+        sql.Literal(CHECKSUM_SEPARATOR),
+        sql.SQL(", ").join(
+            pg_render_expression(col, pg_col_types.get(col, "text")) for col in columns
+        ),
+    )
+
+def compile_row_hasher(col_info, pg_col_types, pg_numeric_scales):
+    """
+    生成对已转换的行计算 md5 的函数
+    """
+    renderers = []
+    for col in col_info:
+        renderer = compile_value_renderer(
+            pg_col_types.get(col[1], "text"), pg_numeric_scales.get(col[1])
+        )
+
+        def render(value, renderer=renderer):
+            if value is None:
+                return CHECKSUM_NULL
+            try:
+                return renderer(value)
+            except (ValueError, TypeError, ArithmeticError):
+                # 无法渲染的值会使所在块被判定为不一致
+                return f"{CHECKSUM_NULL}{value!r}"
+
+        renderers.append(render)
+    renderers = tuple(renderers)
+
+    def hash_row(row):
+        text = CHECKSUM_SEPARATOR.join(map(call, renderers, row))
+        return hashlib.md5(text.encode()).hexdigest()
+
+    return hash_row
+
+def sum_row_hashes(row_hashes):
+    """
+    将行 md5 的前 15 位十六进制数求和作为块的校验和，与行顺序无关
+    """
+    return sum(int(row_hash[:15], 16) for row_hash in row_hashes)
+
+def build_key_range_condition(pk_columns, pg_col_types, lower, upper):
+    """
+    构建主键范围 [lower, upper) 的过滤条件，文本主键按字节序比较以与 SQLite 一致
+    """
+    keys = []
+    for col in pk_columns:
+        key = sql.Identifier(col)
+        if pg_col_types.get(col) in ["text", "character varying", "character"]:
+            key = sql.SQL('{} COLLATE "C"').format(key)
+        keys.append(key)
+    key_expr = sql.SQL("({})").format(sql.SQL(", ").join(keys))
+    placeholders = sql.SQL("({})").format(
+        sql.SQL(", ").join(sql.Placeholder() * len(pk_columns))
+    )
+
+    conditions = []
+    params = []
+    if lower is not None:
+        conditions.append(sql.SQL("{} >= {}").format(key_expr, placeholders))
+        params.extend(lower)
+    if upper is not None:
+        conditions.append(sql.SQL("{} < {}").format(key_expr, placeholders))
+        params.extend(upper)
+    if not conditions:
+        return sql.SQL("TRUE"), params
+    return sql.SQL(" AND ").join(conditions), params
+
+def iter_key_ordered_chunks(sqlite_conn, table, col_info, pk_columns, chunk_size):
+    """
+    按主键顺序分块读取，返回 (下界, 上界, 行) ，相邻块的范围首尾相接，首块和末块不设边界
+    """
+    pk_indexes = [[col[1] for col in col_info].index(col) for col in pk_columns]
+    order_by = ", ".join(f'"{col}"' for col in pk_columns)
+
+    def chunk_key(rows):
+        return tuple(rows[0][i] for i in pk_indexes)
+
+    previous = None
+    lower = None
+    for rows in iter_table_chunks(
+        sqlite_conn, table, col_info, chunk_size, order_by=order_by
+    ):
+        if previous is not None:
+            upper = chunk_key(rows)
+            yield lower, upper, previous
+            lower = upper
+        previous = rows
+    yield lower, None, previous or []
+
+def diff_key_range(
+    pg_cursor,
+    table,
+    pk_columns,
+    pg_col_types,
+    row_expr,
+    range_condition,
+    range_params,
+    sqlite_hashes,
+):
+    """
+    逐行比较一个主键范围内两端的数据，返回需要写入的行下标和需要删除的 PostgreSQL 主键
+    """
+    rendered_keys = [
+        pg_render_expression(col, pg_col_types.get(col, "text")) for col in pk_columns
+    ]
+    pg_cursor.execute(
+        sql.SQL("SELECT {}, {}, md5({}) FROM {} WHERE {}").format(
+            sql.SQL(", ").join(rendered_keys),
+            sql.SQL(", ").join(map(sql.Identifier, pk_columns)),
+            row_expr,
+            sql.Identifier(table),
+            range_condition,
+        ),
+        range_params,
+    )
+    key_count = len(pk_columns)
+    pg_rows = {
+        tuple(row[:key_count]): (tuple(row[key_count:-1]), row[-1])
+        for row in pg_cursor.fetchall()
+    }
+
+    changed = []
+    for i, (rendered_key, row_hash) in enumerate(sqlite_hashes):
+        pg_row = pg_rows.pop(rendered_key, None)
+        if pg_row is None or pg_row[1] != row_hash:
+            changed.append(i)
+    deleted = [raw_key for raw_key, _ in pg_rows.values()]
+    return changed, deleted
+
+def sync_table_checksum(sqlite_conn, pg_conn, table, options):
+    """
+    按主键顺序分块计算两端每块的校验和，只对不一致的块逐行比较，
+    写入新增或修改的行并删除 SQLite 中已不存在的行。
+    表不存在时完整迁移，没有主键的表回退为清空后重新写入。
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"PRAGMA table_info({table});")
+    col_info = sqlite_cursor.fetchall()
+    columns = [col[1] for col in col_info]
+    pk_columns = get_primary_key_columns(table, col_info)
+
+    pg_table = options["catalog"].table(pg_conn, table)
+    if pg_table is None:
+        create_and_load_table(sqlite_conn, pg_conn, table, options)
+        return
+    if not pk_columns:
+        print(f"Table {table} has no primary key, falling back to a full reload")
+        sync_table_incremental(sqlite_conn, pg_conn, table, options)
+        return
+
+    loader = options["loader"]
+    with pg_conn.cursor() as pg_cursor:
+        try:
+            start_time = time.perf_counter()
+            pg_col_types = pg_table.column_types()
+            pg_numeric_columns = pg_table.numeric_columns()
+            pg_numeric_scales = {
+                col: scale for col, (_, scale) in pg_numeric_columns.items()
+            }
+            clamp_counts = {}
+            convert_row = compile_row_converter(
+                table, col_info, pg_col_types, pg_numeric_columns, clamp_counts
+            )
+            hash_row = compile_row_hasher(col_info, pg_col_types, pg_numeric_scales)
+            pk_indexes = [columns.index(col) for col in pk_columns]
+            key_renderers = [
+                compile_value_renderer(
+                    pg_col_types.get(col, "text"), pg_numeric_scales.get(col)
+                )
+                for col in pk_columns
+            ]
+            row_expr = build_pg_row_expression(columns, pg_col_types)
+            delta_table = f"{table}__delta"
+            pg_cursor.execute(
+                f"CREATE TEMP TABLE {delta_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP;"
+            )
+            statement = build_load_statement(delta_table, columns, loader)
+
+            total_chunks = changed_chunks = upserted_rows = deleted_rows = 0
+            for lower, upper, rows in iter_key_ordered_chunks(
+                sqlite_conn, table, col_info, pk_columns, options["chunk_size"]
+            ):
+                total_chunks += 1
+                converted_rows = (
+                    rows if convert_row is None else list(map(convert_row, rows))
+                )
+                row_hashes = [hash_row(row) for row in converted_rows]
+                range_condition, range_params = build_key_range_condition(
+                    pk_columns, pg_col_types, lower, upper
+                )
+
+                # 先比较整块的行数和校验和
+                pg_cursor.execute(
+                    sql.SQL(
+                        "SELECT count(*), sum(('x' || substr(md5({}), 1, 15))::bit(60)::bigint) "
+                        "FROM {} WHERE {}"
+                    ).format(row_expr, sql.Identifier(table), range_condition),
+                    range_params,
+                )
+                pg_count, pg_sum = pg_cursor.fetchone()
+                if pg_count == len(row_hashes) and (pg_sum or 0) == sum_row_hashes(row_hashes):
+                    continue
+
+                # 块不一致时逐行比较
+                changed_chunks += 1
+                sqlite_hashes = [
+                    (
+                        tuple(render(row[i]) for render, i in zip(key_renderers, pk_indexes)),
+                        row_hash,
+                    )
+                    for row, row_hash in zip(converted_rows, row_hashes)
+                ]
+                changed, deleted = diff_key_range(
+                    pg_cursor,
+                    table,
+                    pk_columns,
+                    pg_col_types,
+                    row_expr,
+                    range_condition,
+                    range_params,
+                    sqlite_hashes,
+                )
+                if changed:
+                    load_rows(
+                        pg_cursor,
+                        statement,
+                        [converted_rows[i] for i in changed],
+                        loader,
+                    )
+                    upserted_rows += len(changed)
+                if deleted:
+                    pg_cursor.executemany(
+                        sql.SQL("DELETE FROM {} WHERE ({}) = ({})").format(
+                            sql.Identifier(table),
+                            sql.SQL(", ").join(map(sql.Identifier, pk_columns)),
+                            sql.SQL(", ").join(sql.Placeholder() * len(pk_columns)),
+                        ),
+                        deleted,
+                    )
+                    deleted_rows += len(deleted)
+
+            if upserted_rows:
+                pg_pk_columns = pg_table.primary_key or pk_columns
+                pg_cursor.execute(
+                    build_merge_statement(table, delta_table, columns, pg_pk_columns)
+                )
+            pg_conn.commit()
+
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"Checksum sync of table {table}: {changed_chunks}/{total_chunks} chunks differed, "
+                f"{upserted_rows} rows upserted, {deleted_rows} rows deleted in {elapsed:.2f}s"
+            )
+            report_clamped_values(table, clamp_counts)
+            options["metrics"].finish_table(
+                table,
+                "sync_checksum",
+                upserted_rows,
+                elapsed,
+                chunks=total_chunks,
+                changed_chunks=changed_chunks,
+                deleted_rows=deleted_rows,
+            )
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            pg_conn.rollback()
+            print(f"Error syncing table {table} by checksum: {e}")
+            options["metrics"].finish_table(table, "sync_checksum", 0, 0.0, status="error", error=str(e))
+
+def verify_text_hash(*values):
+    """
+    计算一行中各文本列写入 PostgreSQL 后的文本（与 format_copy_value 一致）用分隔符连接后的 md5 前 32 位，
+    用作 SQLite 函数。每行只调用一次，比逐列调用快数倍
+    """
+    text = CHECKSUM_SEPARATOR.join(
+        CHECKSUM_NULL if value is None else "\\x" + value.hex() if isinstance(value, bytes) else str(value)
+        for value in values
+    )
+    return int.from_bytes(hashlib.md5(text.encode()).digest()[:4], "big")
+
+def combine_integer_sum(high, low):
+    """
+    合并 SQLite 端分为高 32 位和低 32 位分别求和的结果，避免大表求和溢出
+    """
+    if high is None:
+        return None
+    return high * 2**32 + low
+
+def build_verify_checks(table, col_info, pg_table):
+    """
+    生成表的聚合校验项 [(名称, [SQLite 表达式], 合并函数, PostgreSQL 表达式, 每行允许的误差)]。
+    SQLite 端的表达式按 compile_column_converter 的规则计算转换后的值，两端各扫描一次即可得到所有结果：
+    所有列比较非空值数量，整数列比较总和，布尔列比较 true 的数量，numeric 列按小数位数允许舍入误差比较总和，
+    所有文本列比较每行文本 md5 前 32 位的总和
+    """
+    pg_col_types = pg_table.column_types()
+    pg_numeric_columns = pg_table.numeric_columns()
+    checks = [("count(*)", ["count(*)"], None, sql.SQL("count(*)"), 0)]
+    keyset = get_keyset_column(table, col_info)
+    if keyset:
+        for function in ["min", "max"]:
+            checks.append(
+                (
+                    f"{function}({keyset[0]})",
+                    [f'{function}("{keyset[0]}")'],
+                    None,
+                    sql.SQL(f"{function}({{}})").format(sql.Identifier(keyset[0])),
+                    0,
+                )
+            )
+
+    text_values = []
+    text_columns = []
+    for col in col_info:
+        col_name = col[1]
+        pg_type = pg_col_types.get(col_name)
+        if pg_type is None:
+            continue
+        column = sql.Identifier(col_name)
+        value = f'"{col_name}"'
+        if pg_type == "boolean":
+            value = "CASE WHEN {} IN ({}) THEN 1 WHEN {} IN ({}) THEN 0 END".format(
+                value,
+                ", ".join(repr(key) for key, flag in BOOLEAN_VALUES.items() if flag),
+                value,
+                ", ".join(repr(key) for key, flag in BOOLEAN_VALUES.items() if not flag),
+            )
+            aggregate = (
+                f"count_true({col_name})",
+                [f"sum({value})"],
+                None,
+                sql.SQL("count(*) FILTER (WHERE {})").format(column),
+                0,
+            )
+        elif pg_type in PG_INTEGER_TYPES:
+            value = f"CAST({value} AS INTEGER)"
+            aggregate = (
+                f"sum({col_name})",
+                [f"sum({value} >> 32)", f"sum({value} & 4294967295)"],
+                combine_integer_sum,
+                sql.SQL("sum({})").format(column),
+                0,
+            )
+        elif pg_type in ["numeric", "real", "double precision"]:
+            scale = pg_numeric_columns.get(col_name, (None, None))[1]
+            aggregate = (
+                f"sum({col_name})",
+                [f"total({value})"],
+                None,
+                sql.SQL("sum({})::float8").format(column),
+                0 if scale is None else Decimal(5).scaleb(-scale - 1),
+            )
+        elif pg_type in PG_TEXT_TYPES:
+            if table == "users" and col_name == "access_token":
+                value = f"NULLIF(substr({value}, 1, 32), '')"
+            text_values.append(value)
+            text_columns.append(col_name)
+            aggregate = None
+        else:
+            aggregate = None
+        checks.append((f"count({col_name})", [f"count({value})"], None, sql.SQL("count({})").format(column), 0))
+        if aggregate:
+            checks.append(aggregate)
+
+    if text_columns:
+        pg_text = sql.SQL("concat_ws({}, {})").format(
+            sql.Literal(CHECKSUM_SEPARATOR),
+            sql.SQL(", ").join(
+                sql.SQL("COALESCE({}::text, {})").format(sql.Identifier(col), sql.Literal(CHECKSUM_NULL))
+                for col in text_columns
+            ),
+        )
+        checks.append(
+            (
+                f"text_hash({', '.join(text_columns)})",
+                [f"sum({VERIFY_HASH_FUNCTION}({', '.join(text_values)}))"],
+                None,
+                sql.SQL("sum(('x' || substr(md5({}), 1, 8))::bit(32)::bigint)").format(pg_text),
+                0,
+            )
+        )
+    return checks
+
+def verify_values_match(sqlite_value, pg_value, tolerance, rows):
+    """
+    比较一个校验项两端的结果，浮点总和允许每行 tolerance 的舍入误差和相对误差
+    """
+    if sqlite_value is None or pg_value is None:
+        return sqlite_value is None and pg_value is None
+    if isinstance(sqlite_value, float) or isinstance(pg_value, float):
+        difference = abs(Decimal(repr(float(sqlite_value))) - Decimal(repr(float(pg_value))))
+        return difference <= Decimal(tolerance) * rows + Decimal("1e-9") * max(abs(Decimal(pg_value)), 1)
+    return sqlite_value == pg_value
+
+def build_pg_window_condition(table, pg_col_types, options):
+    """
+    根据 --since 构建 PostgreSQL 端的时间窗口条件，与 build_window_filter 对应，不需要过滤时返回 None
+    """
+    column = WINDOW_COLUMNS.get(table)
+    bound = window_bound(table, options["since"], pg_col_types[column]) if column in pg_col_types else None
+    if bound is None:
+        return None
+    return sql.SQL("{} >= {}").format(sql.Identifier(bound[0]), sql.Literal(bound[1]))
+
+def sample_sqlite_rows(sqlite_conn, table, col_info, pk_columns, sample_size, where, where_params):
+    """
+    随机抽取最多 sample_size 行：单一整数主键的表在主键范围内随机取起点，按索引各查找一行；
+    其他表使用 ORDER BY random()
+    """
+    condition = f" AND ({where})" if where else ""
+    keyset = get_keyset_column(table, col_info)
+    if keyset is None:
+        query = f"SELECT * FROM {table}" + (f" WHERE {where}" if where else "")
+        return sqlite_conn.execute(f"{query} ORDER BY random() LIMIT ?;", (*where_params, sample_size)).fetchall()
+
+    key_name, key_index = keyset
+    min_key, max_key = sqlite_conn.execute(f"SELECT min({key_name}), max({key_name}) FROM {table};").fetchone()
+    if min_key is None:
+        return []
+    rows = {}
+    for _ in range(sample_size):
+        row = sqlite_conn.execute(
+            f"SELECT * FROM {table} WHERE {key_name} >= ?{condition} ORDER BY {key_name} LIMIT 1;",
+            (random.randint(min_key, max_key), *where_params),
+        ).fetchone()
+        if row is not None:
+            rows[row[key_index]] = row
+    return list(rows.values())
+
+def diff_sampled_rows(sqlite_conn, pg_conn, table, col_info, pg_table, sample_size, where, where_params):
+    """
+    逐行比较随机抽取的行，返回 (抽取的行数, [(渲染后的主键, missing/different)])；没有主键的表返回 None
+    """
+    columns = [col[1] for col in col_info]
+    pk_columns = get_primary_key_columns(table, col_info)
+    if not pk_columns or any(col not in pg_table.columns for col in columns):
+        return None
+    rows = sample_sqlite_rows(sqlite_conn, table, col_info, pk_columns, sample_size, where, where_params)
+    if not rows:
+        return 0, []
+
+    pg_col_types = pg_table.column_types()
+    pg_numeric_scales = {col: scale for col, (_, scale) in pg_table.numeric_columns().items()}
+    convert_row = compile_row_converter(table, col_info, pg_col_types, pg_table.numeric_columns())
+    converted_rows = rows if convert_row is None else list(map(convert_row, rows))
+    hash_row = compile_row_hasher(col_info, pg_col_types, pg_numeric_scales)
+    pk_indexes = [columns.index(col) for col in pk_columns]
+    key_renderers = [
+        compile_value_renderer(pg_col_types.get(col, "text"), pg_numeric_scales.get(col))
+        for col in pk_columns
+    ]
+
+    key_placeholders = sql.SQL("({})").format(sql.SQL(", ").join(sql.Placeholder() * len(pk_columns)))
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            sql.SQL("SELECT {}, md5({}) FROM {} WHERE ({}) IN ({})").format(
+                sql.SQL(", ").join(
+                    pg_render_expression(col, pg_col_types.get(col, "text")) for col in pk_columns
+                ),
+                build_pg_row_expression(columns, pg_col_types),
+                sql.Identifier(table),
+                sql.SQL(", ").join(map(sql.Identifier, pk_columns)),
+                sql.SQL(", ").join([key_placeholders] * len(converted_rows)),
+            ),
+            [row[i] for row in converted_rows for i in pk_indexes],
+        )
+        pg_hashes = {tuple(row[:-1]): row[-1] for row in pg_cursor.fetchall()}
+    pg_conn.rollback()
+
+    mismatches = []
+    for row in converted_rows:
+        key = tuple(render(row[i]) for render, i in zip(key_renderers, pk_indexes))
+        if key not in pg_hashes:
+            mismatches.append((key, "missing"))
+        elif pg_hashes[key] != hash_row(row):
+            mismatches.append((key, "different"))
+    return len(converted_rows), mismatches
+
+def verify_table(sqlite_conn, pg_pool, table, options, executor):
+    """
+    比较表在两端的行数、主键范围和各列的聚合指纹，可选逐行比较随机抽取的行，返回该表的校验结果。
+    PostgreSQL 端的聚合查询在另一个线程中与 SQLite 端的扫描同时进行
+    """
+    start_time = time.perf_counter()
+    col_info = sqlite_conn.execute(f"PRAGMA table_info({table});").fetchall()
+    pg_table = pg_pool.run(lambda pg_conn: options["catalog"].table(pg_conn, table), f"loading catalog of {table}")
+    if pg_table is None:
+        return {"status": "missing", "mismatches": [{"check": "table", "sqlite": "present", "postgresql": None}]}
+
+    mismatches = [
+        {"check": f"column {col[1]}", "sqlite": col[2], "postgresql": None}
+        for col in col_info
+        if col[1] not in pg_table.columns
+    ]
+    checks = build_verify_checks(table, col_info, pg_table)
+    where, where_params = build_window_filter(table, col_info, options)
+    pg_condition = build_pg_window_condition(table, pg_table.column_types(), options)
+    pg_query = sql.SQL("SELECT {} FROM {}").format(
+        sql.SQL(", ").join(check[3] for check in checks), sql.Identifier(table)
+    )
+    if pg_condition is not None:
+        pg_query += sql.SQL(" WHERE {}").format(pg_condition)
+
+    def run_pg_query(pg_conn):
+        row = pg_conn.execute(pg_query).fetchone()
+        pg_conn.rollback()
+        return row
+
+    pg_future = executor.submit(pg_pool.run, run_pg_query, f"verifying table {table}")
+    sqlite_query = f"SELECT {', '.join(expr for check in checks for expr in check[1])} FROM {table}"
+    if where:
+        sqlite_query += f" WHERE {where}"
+    sqlite_row = iter(sqlite_conn.execute(sqlite_query + ";", where_params).fetchone())
+    pg_row = pg_future.result()
+
+    rows = pg_row[0]
+    results = {}
+    for (name, sqlite_exprs, combine, _, tolerance), pg_value in zip(checks, pg_row):
+        values = [next(sqlite_row) for _ in sqlite_exprs]
+        if isinstance(pg_value, Decimal) and pg_value == pg_value.to_integral_value():
+            # 整数列的 sum 在 PostgreSQL 中为 numeric
+            pg_value = int(pg_value)
+        sqlite_value = combine(*values) if combine else values[0]
+        results[name] = {"sqlite": sqlite_value, "postgresql": pg_value}
+        if not verify_values_match(sqlite_value, pg_value, tolerance, rows):
+            mismatches.append({"check": name, "sqlite": sqlite_value, "postgresql": pg_value})
+
+    result = {"rows": rows, "checks": results}
+    if options["verify_sample"]:
+        sample = pg_pool.run(
+            lambda pg_conn: diff_sampled_rows(
+                sqlite_conn, pg_conn, table, col_info, pg_table, options["verify_sample"], where, where_params
+            ),
+            f"sampling rows of {table}",
+        )
+        if sample is not None:
+            sampled_rows, row_mismatches = sample
+            result["sample"] = {
+                "rows": sampled_rows,
+                "mismatched_rows": len(row_mismatches),
+                "mismatches": [
+                    {"key": list(key), "reason": reason}
+                    for key, reason in row_mismatches[:VERIFY_MAX_REPORTED_KEYS]
+                ],
+            }
+            if row_mismatches:
+                mismatches.append(
+                    {"check": "matching sampled rows", "sqlite": sampled_rows, "postgresql": sampled_rows - len(row_mismatches)}
+                )
+    result["status"] = "mismatch" if mismatches else "ok"
+    result["mismatches"] = mismatches
+    result["seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+def verify_tables(sqlite_conn, pg_pool, options):
+    """
+    逐表校验迁移结果，打印每个表的结论并按 --verify-report 写出 JSON 报告，全部一致时返回 True
+    """
+    sqlite_conn.create_function(VERIFY_HASH_FUNCTION, -1, verify_text_hash, deterministic=True)
+    start_time = time.perf_counter()
+    report = {"ok": True, "tables": {}}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for table in list_tables(sqlite_conn, options):
+            try:
+                result = verify_table(sqlite_conn, pg_pool, table, options, executor)
+            except Exception as e:
+                result = {"status": "error", "error": str(e)}
+            report["tables"][table] = result
+
+            if result["status"] == "ok":
+                sample = result.get("sample")
+                sampled = f", {sample['rows']} sampled rows" if sample else ""
+                print(
+                    f"Verified table {table}: {result['rows']} rows, {len(result['checks'])} checks{sampled} "
+                    f"match in {result['seconds']:.2f}s"
+                )
+                continue
+            report["ok"] = False
+            if result["status"] == "error":
+                print(f"Error verifying table {table}: {result['error']}")
+                continue
+            print(f"Table {table} does not match:")
+            for mismatch in result["mismatches"]:
+                print(f"  {mismatch['check']}: SQLite {mismatch['sqlite']}, PostgreSQL {mismatch['postgresql']}")
+            for row in result.get("sample", {}).get("mismatches", []):
+                print(f"  row {tuple(row['key'])}: {row['reason']}")
+
+    report["seconds"] = round(time.perf_counter() - start_time, 3)
+    if options["verify_report"]:
+        with open(options["verify_report"], "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        print(f"Verification report written to {options['verify_report']}")
+    failed = [table for table, result in report["tables"].items() if result["status"] != "ok"]
+    if failed:
+        print(f"Verification failed for {len(failed)} of {len(report['tables'])} tables: {', '.join(failed)}")
+    else:
+        print(f"All {len(report['tables'])} tables match ({report['seconds']:.2f}s)")
+    return report["ok"]
+
+def count_table_rows(sqlite_conn, tables):
+    """
+    统计 SQLite 中各表的行数
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    counts = {}
+    for table in tables:
+        sqlite_cursor.execute(f"SELECT COUNT(*) FROM {table};")
+        counts[table] = sqlite_cursor.fetchone()[0]
+    return counts
+
+def count_rows_to_copy(sqlite_conn, options):
+    """
+    统计本次需要复制的总行数（遵循 --include/--exclude/--since），用于计算进度和 ETA
+    """
+    total_rows = 0
+    for table in list_tables(sqlite_conn, options):
+        col_info = sqlite_conn.execute(f"PRAGMA table_info({table});").fetchall()
+        where, where_params = build_window_filter(table, col_info, options)
+        query = f"SELECT COUNT(*) FROM {table}" + (f" WHERE {where}" if where else "")
+        total_rows += sqlite_conn.execute(query + ";", where_params).fetchone()[0]
+    return total_rows
+
+def migrate_table(sqlite_conn, pg_conn, table, options):
+    """
+    迁移或同步单个表的结构和数据
+    """
+    if options["incremental"] or options["checksum"]:
+        sync_table(sqlite_conn, pg_conn, table, options)
+    else:
+        prepare_table(sqlite_conn, pg_conn, table, options)
+        migrate_table_data(sqlite_conn, pg_conn, table, options)
+
+def migrate_tables_parallel(sqlite_conn, pg_pool, options):
+    """
+    使用多个工作线程并行迁移表结构和数据。
+    每个工作线程使用独立的 SQLite 连接，PostgreSQL 连接从连接池中获取，按行数从大到小调度表。
+    """
+    jobs = options["jobs"]
+    tables = list_tables(sqlite_conn, options)
+    counts = count_table_rows(sqlite_conn, tables)
+    tables.sort(key=lambda table: counts[table], reverse=True)
+    print(f"Migrating {len(tables)} tables with {jobs} workers")
+
+    worker = threading.local()
+    worker_conns = []
+    worker_conns_lock = threading.Lock()
+
+    def get_worker_connection():
+        if not hasattr(worker, "sqlite_conn"):
+            worker.sqlite_conn = open_source_sqlite(options, check_same_thread=False)
+            with worker_conns_lock:
+                worker_conns.append(worker.sqlite_conn)
+        return worker.sqlite_conn
+
+    def migrate_worker_table(table):
+        worker_sqlite_conn = get_worker_connection()
+        with profile_section(options, table):
+            pg_pool.run(
+                lambda pg_conn: migrate_table(worker_sqlite_conn, pg_conn, table, options),
+                f"migrating table {table}",
+            )
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(migrate_worker_table, table): table for table in tables}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # 单个表的错误不影响其他表
+                    print(f"Error migrating table {futures[future]}: {e}")
+    finally:
+        for worker_sqlite_conn in worker_conns:
+            worker_sqlite_conn.close()
+
+def get_index_statements(sqlite_conn, table):
+    """
+    根据 SQLite 的主键和索引生成 PostgreSQL 的 (主键语句, 索引语句列表)。
+    部分索引和表达式索引无法直接转换，跳过并打印提示。
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"PRAGMA table_info({table});")
+    pk_columns = get_primary_key_columns(table, sqlite_cursor.fetchall())
+    primary_key = None
+    if pk_columns:
+        primary_key = "ALTER TABLE {} ADD PRIMARY KEY ({});".format(
+            table, ", ".join(f'"{col}"' for col in pk_columns)
+        )
+
+    indexes = []
+    sqlite_cursor.execute(f"PRAGMA index_list({table});")
+    for _, index_name, unique, origin, partial in sqlite_cursor.fetchall():
+        # 主键索引由 primary_key 创建
+        if origin == "pk":
+            continue
+        if partial:
+            print(f"Skipping partial index {index_name} on table {table}")
+            continue
+        sqlite_cursor.execute(f"PRAGMA index_info({index_name});")
+        index_columns = [row[2] for row in sqlite_cursor.fetchall()]
+        if not index_columns or None in index_columns:
+            print(f"Skipping expression index {index_name} on table {table}")
+            continue
+        # UNIQUE 约束生成的自动索引使用 PostgreSQL 风格的名称
+        if origin == "u":
+            index_name = f"{table}_{'_'.join(index_columns)}_key"
+        indexes.append(
+            'CREATE {}INDEX IF NOT EXISTS "{}" ON {} ({});'.format(
+                "UNIQUE " if unique else "",
+                index_name,
+                table,
+                ", ".join(f'"{col}"' for col in index_columns),
+            )
+        )
+    return primary_key, indexes
+
+def build_indexes(sqlite_conn, options):
+    """
+    在数据写入后创建主键（快速导入模式）和 SQLite 中的索引，多个连接并行创建
+    """
+    jobs = options["index_jobs"]
+    primary_keys = []
+    secondary_indexes = []
+    tables = list_tables(sqlite_conn, options)
+    pg_conn = connect(options["pg_db_config"])
+    try:
+        # 一次读取所有表的当前结构
+        catalog = load_catalog(pg_conn, tables=tables)
+        pg_conn.rollback()
+    finally:
+        pg_conn.close()
+    for table in tables:
+        pg_table = catalog.get(table)
+        if pg_table is None:
+            continue
+        primary_key, indexes = get_index_statements(sqlite_conn, table)
+        # 已有主键的表不再创建
+        if primary_key and not pg_table.primary_key:
+            primary_keys.append((table, primary_key))
+            options["catalog"].invalidate(table)
+        secondary_indexes.extend((table, index) for index in indexes)
+
+    # 主键排在前面，先提交的语句先执行
+    statements = primary_keys + secondary_indexes
+
+    if not statements:
+        return
+    print(f"Building {len(statements)} primary keys and indexes with {jobs} workers")
+
+    def configure(conn):
+        if options["maintenance_work_mem"]:
+            conn.execute(
+                "SELECT set_config('maintenance_work_mem', %s, false);",
+                (options["maintenance_work_mem"],),
+            )
+
+    index_pool = ConnectionPool(
+        options["pg_db_config"], max_size=jobs, autocommit=True, configure=configure
+    )
+
+    def run_statement(table, statement):
+        start_time = time.perf_counter()
+        index_pool.run(lambda conn: conn.execute(statement), f"building index on {table}")
+        return time.perf_counter() - start_time
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(run_statement, table, statement): (table, statement)
+                for table, statement in statements
+            }
+            for future in as_completed(futures):
+                table, statement = futures[future]
+                try:
+                    elapsed = future.result()
+                    print(f"Built index on {table} in {elapsed:.2f}s: {statement}")
+                except Exception as e:
+                    # 单个索引的错误不影响其他索引
+                    print(f"Error building index on {table}: {e}")
+                    print(f"SQL was: {statement}")
+    finally:
+        index_pool.close()
+
+def sync_sequences(pg_conn):
+    """
+    同步所有表的序列值，确保自增ID从正确的值开始
+    """
+    try:
+        with pg_conn.cursor() as cursor:
+            for table, column, sequence in load_catalog(pg_conn).sequences():
+                try:
+                    cursor.execute(
+                        sql.SQL(
+                            "SELECT setval({}::regclass, COALESCE((SELECT MAX({}) FROM {}), 0) + 1, false)"
+                        ).format(sql.Literal(sequence), sql.Identifier(column), sql.Identifier(table))
+                    )
+                    print(f"Synchronized sequence for {table}.{column}")
+                except Exception as e:
+                    print(f"Error synchronizing sequence for {table}.{column}: {e}")
+    except Exception as e:
+        print(f"Error in sync_sequences: {e}")
+
+def add_migration_arguments(parser):
+    """
+    添加迁移参数，供 main 和基准测试脚本共用
+    """
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help=f"Rows read and written per chunk (default: migration.chunk_size in config or {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--loader",
+        choices=LOADERS,
+        default=None,
+        help="How rows are written: COPY FROM STDIN or batched executemany INSERT (default: copy)",
+    )
+    parser.add_argument(
+        "--pipeline-depth",
+        type=int,
+        default=None,
+        help="Chunks buffered between the read, convert and write stages, which run in separate threads "
+        f"so the next chunks are read and converted while one is being written; 0 runs them sequentially "
+        f"(default: {DEFAULT_DEPTH})",
+    )
+    parser.add_argument(
+        "--convert-processes",
+        type=int,
+        default=None,
+        help="Read and convert large tables in N worker processes by rowid range, producing COPY data "
+        "that is sent unchanged (copy loader only; per table or key range being loaded; default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of tables migrated in parallel, each worker with its own connections (default: 1)",
+    )
+    parser.add_argument(
+        "--split-parts",
+        type=int,
+        default=None,
+        help="Split tables above --split-threshold into N primary-key ranges copied concurrently (default: 1, disabled)",
+    )
+    parser.add_argument(
+        "--split-threshold",
+        type=int,
+        default=None,
+        help=f"Row count above which a table is split (default: {DEFAULT_SPLIT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Keep existing tables and copy only rows added or changed since the checkpoint in {STATE_TABLE}",
+    )
+    parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="Keep existing tables and repair them by comparing per-chunk checksums "
+        "(with --incremental, only for tables without a change column)",
+    )
+    parser.add_argument(
+        "--fast-load",
+        action="store_true",
+        help="Create tables without primary keys and add them, with all indexes, after the data is loaded",
+    )
+    parser.add_argument(
+        "--index-jobs",
+        type=int,
+        default=None,
+        help="Number of primary keys and indexes built in parallel after loading (default: --jobs)",
+    )
+    parser.add_argument(
+        "--maintenance-work-mem",
+        default=None,
+        help="maintenance_work_mem used when building indexes, e.g. 1GB",
+    )
+    parser.add_argument(
+        "--immutable",
+        action="store_true",
+        help="Open the SQLite file with immutable=1; only for snapshots that nothing else writes to",
+    )
+    parser.add_argument(
+        "--snapshot",
+        choices=SNAPSHOT_METHODS,
+        default=None,
+        help="Copy the SQLite file to a temporary snapshot first (backup API or VACUUM INTO) and migrate "
+        "from the snapshot, so the data is consistent across tables and the live database is not kept locked",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=None,
+        help="Directory for the snapshot, e.g. /dev/shm to keep it in memory (default: system temp directory)",
+    )
+    parser.add_argument(
+        "--mmap-size",
+        type=int,
+        default=None,
+        help=f"SQLite mmap_size in MB for each reading connection, 0 disables memory-mapped reads "
+        f"(default: {DEFAULT_MMAP_SIZE_MB})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=None,
+        help=f"SQLite page cache in MB for each reading connection (default: {DEFAULT_CACHE_SIZE_MB})",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=f"Commit every chunk and record progress in {CHECKPOINT_TABLE}; "
+        "rerun with --resume to keep existing tables and continue after the last committed key",
+    )
+    parser.add_argument(
+        "--schema-diff",
+        action="store_true",
+        help="Print the ALTER TABLE statements that would bring existing PostgreSQL tables in line with "
+        "the SQLite schema and exit without changing anything (--incremental/--checksum apply them)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Compare every table with PostgreSQL (row counts, key range, per-column aggregate fingerprints) "
+        "without changing anything; exits with status 1 on any mismatch",
+    )
+    parser.add_argument(
+        "--verify-sample",
+        type=int,
+        default=None,
+        help="With --verify, also compare N randomly sampled rows per table row by row (default: 0)",
+    )
+    parser.add_argument(
+        "--verify-report",
+        default=None,
+        help="With --verify, write the results as JSON to this file",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Append per-table and per-phase metrics (rows, bytes, rows/s, stage times, peak memory) "
+        "to this file as JSON lines",
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        default=None,
+        help="Write the metrics of the run to this file in the Prometheus text format "
+        "(for node_exporter's textfile collector)",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Print a progress line with rows/s and ETA to stderr while copying",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        metavar="DIR",
+        help="Profile each table and phase with cProfile and write <table>.pstats and summary.txt "
+        "(hottest functions) to DIR",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also trace allocations with tracemalloc and write the top allocation "
+        "sites of each table to DIR/<table>.memory.txt (much slower)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=None,
+        help=f"Functions and allocation sites listed in the profile summaries (default: {DEFAULT_PROFILE_TOP})",
+    )
+    add_filter_arguments(parser)
+
+def build_migration_options(args, config, sqlite_db_file, pg_db_config):
+    """
+    合并命令行参数和配置文件中的迁移参数，参数无效时返回 None
+    """
+    migration_config = config.get("migration", {})
+
+    def option(name, default):
+        value = getattr(args, name)
+        return value if value is not None else migration_config.get(name, default)
+
+    options = {
+        "sqlite_db_file": sqlite_db_file,
+        "pg_db_config": pg_db_config,
+        "chunk_size": option("chunk_size", DEFAULT_CHUNK_SIZE),
+        "loader": option("loader", "copy"),
+        "pipeline_depth": option("pipeline_depth", DEFAULT_DEPTH),
+        "convert_processes": option("convert_processes", 0),
+        "jobs": option("jobs", 1),
+        "split_parts": option("split_parts", 1),
+        "split_threshold": option("split_threshold", DEFAULT_SPLIT_THRESHOLD),
+        "incremental": args.incremental or migration_config.get("incremental", False),
+        "checksum": args.checksum or migration_config.get("checksum", False),
+        "fast_load": args.fast_load or migration_config.get("fast_load", False),
+        "immutable": args.immutable or migration_config.get("immutable", False),
+        "snapshot": option("snapshot", None),
+        "snapshot_dir": option("snapshot_dir", None),
+        "mmap_size": option("mmap_size", DEFAULT_MMAP_SIZE_MB),
+        "cache_size": option("cache_size", DEFAULT_CACHE_SIZE_MB),
+        "include": option("include", None),
+        "exclude": option("exclude", None),
+        "since": option("since", None),
+        "resume": args.resume or migration_config.get("resume", False),
+        "index_jobs": option("index_jobs", None),
+        "maintenance_work_mem": option("maintenance_work_mem", None),
+        "schema_diff": args.schema_diff,
+        "verify": args.verify,
+        "verify_sample": option("verify_sample", 0),
+        "verify_report": option("verify_report", None),
+        # 本次运行中 PostgreSQL 表结构的缓存
+        "catalog": CatalogCache(),
+        "metrics": MetricsRecorder(
+            "migrate_sqlite_to_pg",
+            option("metrics_file", None),
+            option("prometheus_file", None),
+            args.progress or migration_config.get("progress", False),
+        ),
+        "profile": option("profile", None),
+        "profile_top": option("profile_top", DEFAULT_PROFILE_TOP),
+        "profile_memory": args.profile_memory or migration_config.get("profile_memory", False),
+    }
+
+    if options["index_jobs"] is None:
+        options["index_jobs"] = options["jobs"]
+    if isinstance(options["since"], str):
+        options["since"] = parse_since(options["since"])
+    if options["resume"] and (options["incremental"] or options["checksum"]):
+        print("Option --resume cannot be used with --incremental or --checksum")
+        return None
+    if options["since"] and options["checksum"] and not options["incremental"]:
+        # 校验和比对会删除窗口之外的行
+        print("Option --since cannot be used with --checksum alone")
+        return None
+    if options["loader"] not in LOADERS:
+        print(f"Unknown loader {options['loader']}, expected one of: {', '.join(LOADERS)}")
+        return None
+    if options["snapshot"] is not None and options["snapshot"] not in SNAPSHOT_METHODS:
+        print(f"Unknown snapshot method {options['snapshot']}, expected one of: {', '.join(SNAPSHOT_METHODS)}")
+        return None
+    for name in ["chunk_size", "jobs", "split_parts", "index_jobs", "cache_size", "profile_top"]:
+        if options[name] <= 0:
+            print(f"Option {name} must be a positive integer")
+            return None
+    for name in ["pipeline_depth", "convert_processes", "mmap_size", "verify_sample"]:
+        if options[name] < 0:
+            print(f"Option {name} must not be negative")
+            return None
+    if options["convert_processes"] and options["loader"] != "copy":
+        print("Option --convert-processes requires the copy loader")
+        return None
+    options["read_pragmas"] = build_read_pragmas(options["mmap_size"], options["cache_size"])
+    options["profiler"] = (
+        Profiler(options["profile"], options["profile_top"], options["profile_memory"])
+        if options["profile"]
+        else None
+    )
+    return options
+
+def run_migration(sqlite_conn, pg_pool, options):
+    """
+    按选项依次执行迁移的各个阶段，阶段耗时记录在 options["metrics"] 中。
+    main() 和 bench_migration.py 共用
+    """
+    # 增量和校验和同步复制的行数事先未知，只显示速度
+    metrics = options["metrics"]
+    if metrics.progress and not (options["incremental"] or options["checksum"]):
+        metrics.set_expected_rows(count_rows_to_copy(sqlite_conn, options))
+
+    pg_pool.run(lambda pg_conn: prepare_progress_tables(pg_conn, options), "preparing progress tables")
+
+    # 执行迁移过程
+    if options["jobs"] > 1:
+        with metrics.phase("migrate_tables_parallel"):
+            migrate_tables_parallel(sqlite_conn, pg_pool, options)
+    elif options["incremental"] or options["checksum"]:
+        with metrics.phase("sync_tables"):
+            sync_tables(sqlite_conn, pg_pool, options)
+    else:
+        with metrics.phase("migrate_table_structure"), profile_section(options, "migrate_table_structure"):
+            migrate_table_structure(sqlite_conn, pg_pool, options)
+        with metrics.phase("migrate_data"):
+            migrate_data(sqlite_conn, pg_pool, options)
+    with metrics.phase("build_indexes"), profile_section(options, "build_indexes"):
+        build_indexes(sqlite_conn, options)
+    with metrics.phase("sync_sequences"), profile_section(options, "sync_sequences"):
+        pg_pool.run(sync_sequences, "synchronizing sequences")
+    if options["resume"]:
+        tables = list_tables(sqlite_conn, options)
+        pg_pool.run(
+            lambda pg_conn: clear_completed_checkpoints(pg_conn, tables), "clearing resume checkpoints"
+        )
+
+def main():
+    """
+    Main function to handle the database migration process
+    """
+    parser = argparse.ArgumentParser(description="Migrate SQLite database to PostgreSQL")
+    add_migration_arguments(parser)
+    args = parser.parse_args()
+
+    # 初始化连接变量
+    sqlite_conn = None
+    pg_pool = None
+    snapshot_file = None
+    metrics = None
+    profiler = None
+    succeeded = False
+    
+    try:
+        # 加载配置
+        config = load_config()
+        if not config:
+            print("Failed to load configuration. Exiting.")
             sys.exit(1)
         
-        # 测试PostgreSQL连接
-        if not test_pg_connection(pg_db_config):
-            print("PostgreSQL connection test failed. Exiting.")
+        # 设置连接参数
+        sqlite_db_file = config["database"]["sqlite_file"]
+        pg_db_config = get_db_config(config, "cloud")
+        
+        options = build_migration_options(args, config, sqlite_db_file, pg_db_config)
+        if not options:
+            print("Invalid migration options. Exiting.")
             sys.exit(1)
-            
-        # 连接PostgreSQL数据库
+
+        profiler = options["profiler"]
+
+        # 打印连接信息（不显示密码）
+        print(f"SQLite database: {sqlite_db_file}")
+        print(f"PostgreSQL host: {pg_db_config['host']}, port: {pg_db_config['port']}, database: {pg_db_config['dbname']}, user: {pg_db_config['user']}")
+        
+        # 先复制源库的快照，之后只读取快照；快照不会再被修改，以 immutable 方式打开
+        if options["snapshot"]:
+            start = time.perf_counter()
+            try:
+                snapshot_file = take_sqlite_snapshot(sqlite_db_file, options["snapshot"], options["snapshot_dir"])
+            except Exception as e:
+                print(f"Error creating SQLite snapshot: {e}")
+                sys.exit(1)
+            print(
+                f"SQLite snapshot ({options['snapshot']}) created at {snapshot_file} "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+            options["sqlite_db_file"] = snapshot_file
+            options["immutable"] = True
+
+        # 连接SQLite数据库
         try:
-            pg_conn = psycopg2.connect(**pg_db_config)
-            print("PostgreSQL connection established successfully.")
+            sqlite_conn = open_source_sqlite(options)
+            print("SQLite connection established successfully (read-only).")
         except Exception as e:
-            print(f"Error connecting to PostgreSQL database: {e}")
+            print(f"Error connecting to SQLite database: {e}")
             sys.exit(1)
         
-        # 执行迁移过程
-        migrate_table_structure(sqlite_conn, pg_conn)
-        migrate_data(sqlite_conn, pg_conn)
-        sync_sequences(pg_conn)
+        # 连接PostgreSQL数据库，第一个连接用完后放回连接池供迁移使用
+        pg_pool = ConnectionPool(pg_db_config, max_size=options["jobs"])
+        pg_conn = open_pg_connection(pg_pool)
+        if pg_conn is None:
+            print("PostgreSQL connection failed. Exiting.")
+            sys.exit(1)
+        print("PostgreSQL connection established successfully.")
+        pg_pool.putconn(pg_conn)
+
+        # 只比较表结构，不修改目标库
+        if options["schema_diff"]:
+            print_schema_diff(sqlite_conn, pg_pool, options)
+            return
+
+        # 只校验迁移结果，不一致时以状态码 1 退出
+        if options["verify"]:
+            if not verify_tables(sqlite_conn, pg_pool, options):
+                sys.exit(1)
+            return
+
+        metrics = options["metrics"]
+        run_migration(sqlite_conn, pg_pool, options)
+        succeeded = True
         
         print("Migration completed successfully.")
         
@@ -504,9 +2948,17 @@ def main():
         if sqlite_conn:
             sqlite_conn.close()
             print("SQLite connection closed.")
-        if pg_conn:
-            pg_conn.close()
-            print("PostgreSQL connection closed.")
+        if pg_pool:
+            pg_pool.close()
+            print("PostgreSQL connections closed.")
+        if snapshot_file:
+            remove_sqlite_snapshot(snapshot_file)
+            print("SQLite snapshot removed.")
+        if metrics:
+            metrics.close(succeeded)
+        if profiler:
+            print(profiler.close())
+            print(f"Profiles written to {options['profile']}")
 
 if __name__ == "__main__":
     main()
@@ -1,106 +1,78 @@
+import argparse
+import json
+import sys
+from contextlib import redirect_stdout
+
 import psycopg
 
-import tomllib
+from catalog_snapshot import load_catalog
+from db_conn import connect, get_db_config, load_config
+
+parser = argparse.ArgumentParser(description="Show the tables, columns and keys of the PostgreSQL database")
+parser.add_argument(
+    "--json",
+    action="store_true",
+    help="Print the catalog snapshot (tables, columns, constraints, sequences, estimated rows) as JSON",
+)
+args = parser.parse_args()
 
-# 读取配置文件
-with open("config.toml", "rb") as f:
-    config = tomllib.load(f)
+# 输出 JSON 时其他信息打印到标准错误，标准输出只有 JSON
+with redirect_stdout(sys.stderr if args.json else sys.stdout):
+    # 读取配置文件（与其他脚本相同，支持 CONFIG_PATH 和环境变量）
+    config = load_config()
+    if not config:
+        raise SystemExit("Failed to load configuration")
 
-# 获取 PostgreSQL 配置
-pg_db_config = {
-    "dbname": config["postgresql"]["cloud"]["dbname"],
-    "user": config["postgresql"]["cloud"]["user"],
-    "password": config["postgresql"]["cloud"]["password"],
-    "host": config["postgresql"]["cloud"]["host"],
-    "port": config["postgresql"]["cloud"]["port"],
-}
+    # 获取 PostgreSQL 配置
+    pg_db_config = get_db_config(config, "cloud")
 
 try:
     # 连接到 PostgreSQL 数据库
-    conn = psycopg.connect(**pg_db_config)
-    cursor = conn.cursor()
-    print("Successfully connected to PostgreSQL database.")
-
-    # 获取所有表名
-    cursor.execute(
-        """
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public' AND table_type = 'BASE TABLE';
-    """
-    )
-    tables = sorted(cursor.fetchall(), key=lambda x: x[0])
+    conn = connect(pg_db_config)
+    print("Successfully connected to PostgreSQL database.", file=sys.stderr if args.json else sys.stdout)
+
+    # 一次读取所有表的列、约束和序列
+    catalog = load_catalog(conn)
+    conn.rollback()
+
+    if args.json:
+        print(json.dumps(catalog.to_dict(), ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    tables = sorted(catalog.tables)
 
     print("\nTables in the database:")
-    for table in tables:
-        table_name = table[0]
+    for table_name in tables:
         print(f"- {table_name}")
 
-    # 遍历每个表，获取详细信息
-    for table in tables:
-        table_name = table[0]
+    # 遍历每个表，打印详细信息
+    for table_name in tables:
+        table = catalog.get(table_name)
         print(f"\nDetails for table '{table_name}':")
 
-        # 获取列信息
-        cursor.execute(
-            f"""
-            SELECT column_name, data_type, is_nullable, column_default
-            FROM information_schema.columns
-            WHERE table_name = %s;
-        """,
-            (table_name,),
-        )
-        columns = sorted(cursor.fetchall(), key=lambda x: x[0])
-
         # 打印表头
         print(f"{'Column Name':<20} {'Data Type':<15} {'Nullable':<8} {'Default':<15}")
         print("-" * 60)
 
-        for column in columns:
-            col_name = column[0]
-            col_type = column[1]
-            col_nullable = "YES" if column[2] == "YES" else "NO"
-            col_default = column[3] if column[3] else "None"
-
-            print(f"{col_name:<20} {col_type:<15} {col_nullable:<8} {col_default:<15}")
-
-        # 获取主键信息
-        cursor.execute(
-            f"""
-            SELECT kcu.column_name
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.key_column_usage kcu
-              ON tc.constraint_name = kcu.constraint_name
-            WHERE tc.table_name = %s AND tc.constraint_type = 'PRIMARY KEY';
-        """,
-            (table_name,),
-        )
-        primary_keys = [pk[0] for pk in cursor.fetchall()]
-
-        if primary_keys:
-            print(f"\nPrimary Keys: {', '.join(sorted(primary_keys))}")
-
-        # 获取外键信息
-        cursor.execute(
-            f"""
-            SELECT conname, confrelid::regclass, a.attname AS column_name, af.attname AS referenced_column
-            FROM pg_constraint c
-            JOIN pg_attribute a ON a.attnum = ANY(c.conkey) AND a.attrelid = c.conrelid
-            JOIN pg_attribute af ON af.attnum = ANY(c.confkey) AND af.attrelid = c.confrelid
-            WHERE c.contype = 'f' AND c.conrelid::regclass::text = %s;
-        """,
-            (table_name,),
-        )
-        foreign_keys = cursor.fetchall()
+        for col_name, column in sorted(table.columns.items()):
+            col_nullable = "NO" if column.not_null else "YES"
+            col_default = column.default if column.default else "None"
+
+            print(f"{col_name:<20} {column.data_type:<15} {col_nullable:<8} {col_default:<15}")
 
+        # 主键信息
+        if table.primary_key:
+            print(f"\nPrimary Keys: {', '.join(sorted(table.primary_key))}")
+
+        # 外键信息
+        foreign_keys = [
+            (fk_name, fk_from_col, fk_to_table, fk_to_col)
+            for fk_name, from_columns, fk_to_table, to_columns in table.foreign_keys
+            for fk_from_col, fk_to_col in zip(from_columns, to_columns)
+        ]
         if foreign_keys:
             print("\nForeign Keys:")
-            for fk in sorted(foreign_keys, key=lambda x: x[2]):
-                fk_name = fk[0]
-                fk_to_table = fk[1]
-                fk_from_col = fk[2]
-                fk_to_col = fk[3]
-
+            for fk_name, fk_from_col, fk_to_table, fk_to_col in sorted(foreign_keys, key=lambda x: x[1]):
                 print(
                     f"  - Name: {fk_name}, From: {fk_from_col}, To Table: {fk_to_table}, To Column: {fk_to_col}"
                 )
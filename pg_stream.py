@@ -0,0 +1,107 @@
+"""
+Stream rows between two PostgreSQL connections with binary COPY.
+
+Blocks read from COPY (SELECT ...) TO STDOUT (FORMAT binary) on the source
+are passed, undecoded, through a bounded queue to COPY ... FROM STDIN
+(FORMAT binary) on the destination. Reading and writing run in separate
+threads, so memory use is bounded by block_size * queue_size.
+"""
+
+import queue
+import threading
+
+import psycopg
+from psycopg import sql
+
+# 合并后写入队列的数据块大小
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# 队列中最多缓存的数据块数量
+DEFAULT_QUEUE_SIZE = 8
+
+def stream_copy(
+    src_conn,
+    dst_conn,
+    select_query,
+    dst_table,
+    columns,
+    block_size=DEFAULT_BLOCK_SIZE,
+    queue_size=DEFAULT_QUEUE_SIZE,
+):
+    """
+    将 select_query 的结果以二进制 COPY 写入目标表 dst_table 的 columns 列，返回 (写入行数, 传输字节数)。
+    两端列的类型必须一致。src_conn 在传输期间由读取线程独占使用。
+    """
+    blocks = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def put(item):
+        # 写入端失败后不再阻塞在已满的队列上
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        copy_out = sql.SQL("COPY ({}) TO STDOUT (FORMAT binary)").format(select_query)
+        cancelled = False
+        try:
+            with src_conn.cursor().copy(copy_out) as reader:
+                buffer = bytearray()
+                for data in reader:
+                    if cancelled:
+                        continue
+                    buffer += data
+                    if len(buffer) >= block_size:
+                        if not put(bytes(buffer)):
+                            # 写入端已失败，取消源端查询并读完剩余数据，使连接恢复可用
+                            cancelled = True
+                            src_conn.cancel_safe()
+                        buffer.clear()
+                if buffer:
+                    put(bytes(buffer))
+        except Exception as e:
+            if not (cancelled and isinstance(e, psycopg.errors.QueryCanceled)):
+                errors.append(e)
+        finally:
+            put(None)
+
+    reader_thread = threading.Thread(target=read, name=f"copy-{dst_table}", daemon=True)
+    reader_thread.start()
+
+    copy_in = sql.SQL("COPY {} ({}) FROM STDIN (FORMAT binary)").format(
+        sql.Identifier(dst_table), sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+    transferred = 0
+    cursor = dst_conn.cursor()
+    try:
+        with cursor.copy(copy_in) as writer:
+            while True:
+                block = blocks.get()
+                if block is None:
+                    break
+                writer.write(block)
+                transferred += len(block)
+            # 读取失败时放弃目标端的 COPY
+            if errors:
+                raise errors[0]
+    finally:
+        stop.set()
+        reader_thread.join()
+    # COPY 结束后 rowcount 为服务器返回的写入行数
+    return cursor.rowcount, transferred
+
+def copy_table(src_conn, dst_conn, table, columns, where=None, dst_table=None, **kwargs):
+    """
+    复制整张表（或 where 条件选中的行）到目标端的同名表或 dst_table，返回 (写入行数, 传输字节数)
+    """
+    select_query = sql.SQL("SELECT {} FROM {}").format(
+        sql.SQL(", ").join(map(sql.Identifier, columns)), sql.Identifier(table)
+    )
+    if where is not None:
+        select_query = sql.SQL("{} WHERE {}").format(select_query, where)
+    return stream_copy(src_conn, dst_conn, select_query, dst_table or table, columns, **kwargs)
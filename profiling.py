@@ -0,0 +1,175 @@
+"""
+Profile a migration per table with cProfile and tracemalloc.
+
+Profiler.section(name) runs a table copy (or a phase) under cProfile. The
+threads that work on the same table (the read and convert stages of
+chunk_pipeline, the key ranges of a split table) enter the section through
+thread_context(), and all their profiles are merged into DIR/<name>.pstats,
+which pstats, snakeviz or gprof2dot can open. With memory=True,
+tracemalloc traces allocations and a background thread keeps the top
+allocation sites of the largest snapshot seen during each section
+(DIR/<name>.memory.txt); tracing every allocation makes the conversion
+loop several times slower, so it is off by default. close() writes
+DIR/summary.txt with the hottest functions of the whole run.
+
+Before Python 3.12 a cProfile.Profile only sees the thread that enabled it,
+so every thread gets its own profile. From 3.12 cProfile is built on
+sys.monitoring: one profiler sees all threads and only one can be enabled
+at a time, so when tables run concurrently (--jobs) a table that starts
+while another one is profiled is counted in that table's profile.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# 汇总中列出的函数和分配位置数量
+DEFAULT_PROFILE_TOP = 20
+
+# 内存采样间隔（秒）
+MEMORY_SAMPLE_INTERVAL = 1.0
+
+# 每个线程使用独立的 Profile（3.12 起一个 Profile 记录所有线程，且同一时刻只能启用一个）
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+# 统计分配位置时忽略 tracemalloc 自身和导入机制
+MEMORY_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+class Profiler:
+    """
+    按表（或阶段）收集 cProfile 结果（memory 为 True 时还有 tracemalloc 结果），写入 directory。线程安全
+    """
+
+    def __init__(self, directory, top=DEFAULT_PROFILE_TOP, memory=False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.top = top
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # {名称: [Profile]}，同一名称在多个线程中的部分最后合并
+        self._profiles = {}
+        # {名称: 正在运行的部分数量}，内存采样计入这些名称
+        self._running = {}
+        # {名称: (跟踪的字节数, 最大分配位置)}
+        self._memory = {}
+        self._warned = False
+        self._stop = threading.Event()
+        self._sampler = None
+        if memory:
+            tracemalloc.start()
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-memory", daemon=True)
+            self._sampler.start()
+
+    @contextmanager
+    def section(self, name):
+        """
+        在 name 下分析当前线程中执行的代码；当前线程已在某个部分中时沿用外层部分
+        """
+        if getattr(self._local, "section", None) is not None:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 3.12 起已有其他表在分析，该表的代码计入那个表的结果
+            profile = None
+            with self._lock:
+                if not self._warned:
+                    self._warned = True
+                    print(
+                        f"Profiling {name} inside another table's profile: this Python allows only one "
+                        "profiler at a time, use --jobs 1 for separate per-table profiles"
+                    )
+        self._local.section = name
+        with self._lock:
+            self._running[name] = self._running.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            # 不到一个采样间隔就结束的部分也至少采样一次
+            if self._sampler is not None:
+                self.sample_memory()
+            self._local.section = None
+            with self._lock:
+                if profile is not None:
+                    self._profiles.setdefault(name, []).append(profile)
+                self._running[name] -= 1
+                if not self._running[name]:
+                    del self._running[name]
+
+    def thread_context(self):
+        """
+        在调用线程中调用，返回供其启动的后台线程使用的上下文管理器工厂，
+        后台线程中的代码计入调用线程当前的部分
+        """
+        name = getattr(self._local, "section", None)
+        if name is None or not PER_THREAD_PROFILES:
+            return nullcontext
+        return lambda: self.section(name)
+
+    def _sample_loop(self):
+        while not self._stop.wait(MEMORY_SAMPLE_INTERVAL):
+            self.sample_memory()
+
+    def sample_memory(self):
+        """
+        跟踪的内存超过正在运行的部分此前的最大值时，记录当前最大的分配位置
+        """
+        with self._lock:
+            running = list(self._running)
+        traced = tracemalloc.get_traced_memory()[0]
+        names = [name for name in running if traced > self._memory.get(name, (0, None))[0]]
+        if not names:
+            return
+        snapshot = tracemalloc.take_snapshot().filter_traces(MEMORY_FILTERS)
+        top_sites = snapshot.statistics("lineno")[: self.top]
+        with self._lock:
+            for name in names:
+                self._memory[name] = (traced, top_sites)
+
+    def close(self):
+        """
+        停止内存跟踪，写入每个部分的 .pstats 和分配位置以及整个运行的热点函数汇总，返回汇总文本
+        """
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            tracemalloc.stop()
+        with self._lock:
+            profiles = dict(self._profiles)
+            memory = dict(self._memory)
+
+        summary = io.StringIO()
+        run_stats = None
+        for name, parts in profiles.items():
+            stats = pstats.Stats(*parts)
+            stats.dump_stats(os.path.join(self.directory, f"{name}.pstats"))
+            summary.write(f"{name}: {stats.total_tt:.2f}s profiled in {len(parts)} part(s)\n")
+            if run_stats is None:
+                run_stats = pstats.Stats(*parts, stream=summary)
+            else:
+                run_stats.add(*parts)
+        for name, (traced, top_sites) in memory.items():
+            with open(os.path.join(self.directory, f"{name}.memory.txt"), "w", encoding="utf-8") as f:
+                f.write(f"Largest traced memory: {traced / 1024**2:.1f} MB\n")
+                f.writelines(f"{site}\n" for site in top_sites)
+        if run_stats is not None:
+            summary.write("\nHottest functions (own time) of the whole run:\n")
+            run_stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        text = summary.getvalue()
+        with open(os.path.join(self.directory, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        return text
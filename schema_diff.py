@@ -0,0 +1,153 @@
+"""
+Compare expected column definitions with an existing PostgreSQL table.
+
+The expected columns come from the SQLite schema (see
+migrate_sqlite_to_pg.build_column_definitions); the actual ones from the
+catalog snapshot (see catalog_snapshot.py). diff_table_columns returns a single
+ALTER TABLE statement with only the ADD COLUMN / ALTER COLUMN actions
+needed, so existing data is kept. Columns that exist only in PostgreSQL
+and primary keys are reported but never changed.
+"""
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from psycopg import sql
+
+# 目录中的类型名（与 information_schema.columns 的 data_type 相同）与建表语句中写法不同的类型
+PG_TYPE_NAMES = {
+    "character varying": "VARCHAR",
+    "character": "CHAR",
+    "time without time zone": "TIME",
+    "timestamp without time zone": "TIMESTAMP",
+    "double precision": "DOUBLE PRECISION",
+}
+
+# 可以用 <> 0 转换为 boolean 的类型
+INTEGER_TYPES = ["SMALLINT", "INTEGER", "BIGINT"]
+
+# 默认值末尾的类型转换，如 'abc'::text 或 '-1'::bigint
+DEFAULT_CAST_PATTERN = re.compile(r"(::[a-z ]+(\(\d+(,\s*\d+)?\))?)+$")
+
+def describe_pg_columns(pg_table):
+    """
+    从 catalog_snapshot.TableInfo 获取列定义：{列名: (类型, 是否 NOT NULL, 默认值表达式)}
+    """
+    return {
+        name: (
+            format_pg_type(
+                column.data_type,
+                column.character_maximum_length,
+                column.numeric_precision,
+                column.numeric_scale,
+            ),
+            column.not_null,
+            column.default,
+        )
+        for name, column in pg_table.columns.items()
+    }
+
+def format_pg_type(data_type, length=None, precision=None, scale=None):
+    """
+    将 information_schema 中的类型还原为建表语句中的写法，如 NUMERIC(10,2)、VARCHAR(32)
+    """
+    if data_type == "numeric":
+        return f"NUMERIC({precision},{scale})" if precision is not None else "NUMERIC"
+    name = PG_TYPE_NAMES.get(data_type, data_type.upper())
+    if length is not None and name in ["VARCHAR", "CHAR"]:
+        return f"{name}({length})"
+    return name
+
+def normalize_type(col_type):
+    """
+    统一类型写法的大小写和空白，便于比较
+    """
+    col_type = re.sub(r"\s+", " ", col_type.strip().upper())
+    return re.sub(r"\s*([(),])\s*", r"\1", col_type)
+
+def normalize_default(default):
+    """
+    去掉默认值表达式中的类型转换和引号，数值按大小比较，None 表示没有默认值
+    """
+    if default is None:
+        return None
+    value = DEFAULT_CAST_PATTERN.sub("", default.strip())
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        value = value[1:-1].replace("''", "'")
+    if value.lower() in ["true", "false"]:
+        return value.lower()
+    try:
+        return Decimal(value).normalize()
+    except InvalidOperation:
+        return value
+
+def render_type_change(col_name, current_type, col_type):
+    """
+    生成修改列类型的动作，整数列改为 boolean 时按是否为 0 转换
+    """
+    column = sql.Identifier(col_name)
+    if col_type == "BOOLEAN" and current_type in INTEGER_TYPES:
+        using = sql.SQL("{} <> 0").format(column)
+    else:
+        using = sql.SQL("{}::{}").format(column, sql.SQL(col_type))
+    return sql.SQL("ALTER COLUMN {} TYPE {} USING {}").format(column, sql.SQL(col_type), using)
+
+def diff_table_columns(table, expected_columns, pg_columns, pg_primary_key=()):
+    """
+    比较期望的列定义 [(列名, 类型, 是否 NOT NULL, 默认值表达式)] 与 describe_pg_columns 的结果，
+    返回 (ALTER TABLE 语句或 None, 说明列表)。缺少的列会被添加，类型、默认值和 NOT NULL 不同的列会被修改；
+    pg_primary_key 中的列在 PostgreSQL 中总是 NOT NULL，不做比较
+    """
+    actions = []
+    notes = []
+    for col_name, col_type, not_null, default in expected_columns:
+        column = sql.Identifier(col_name)
+        if col_name not in pg_columns:
+            actions.append(
+                sql.SQL("ADD COLUMN {} {}{}{}").format(
+                    column,
+                    sql.SQL(col_type),
+                    sql.SQL(" NOT NULL") if not_null else sql.SQL(""),
+                    sql.SQL(f" DEFAULT {default}") if default is not None else sql.SQL(""),
+                )
+            )
+            notes.append(f"add column {col_name} {col_type}")
+            continue
+
+        current_type, current_not_null, current_default = pg_columns[col_name]
+        type_changed = normalize_type(current_type) != normalize_type(col_type)
+        default_changed = normalize_default(current_default) != normalize_default(default)
+        if type_changed:
+            # 旧的默认值可能无法转换为新类型，先删除再按新类型设置
+            if current_default is not None:
+                actions.append(sql.SQL("ALTER COLUMN {} DROP DEFAULT").format(column))
+            actions.append(render_type_change(col_name, normalize_type(current_type), col_type))
+            notes.append(f"change column {col_name} type from {current_type} to {col_type}")
+        if default is not None and (type_changed or default_changed):
+            actions.append(sql.SQL(f"ALTER COLUMN {{}} SET DEFAULT {default}").format(column))
+            notes.append(f"set column {col_name} default to {default}")
+        elif default is None and current_default is not None and not type_changed:
+            actions.append(sql.SQL("ALTER COLUMN {} DROP DEFAULT").format(column))
+            notes.append(f"drop column {col_name} default")
+        if not_null != current_not_null and col_name not in pg_primary_key:
+            actions.append(
+                sql.SQL("ALTER COLUMN {} {} NOT NULL").format(
+                    column, sql.SQL("SET" if not_null else "DROP")
+                )
+            )
+            notes.append(f"{'set' if not_null else 'drop'} column {col_name} not null")
+
+    expected_names = {col[0] for col in expected_columns}
+    for col_name, (current_type, current_not_null, current_default) in pg_columns.items():
+        if col_name not in expected_names:
+            # 只存在于 PostgreSQL 的列保留不删除；NOT NULL 且没有默认值时写入会失败
+            blocking = current_not_null and current_default is None
+            notes.append(
+                f"column {col_name} exists only in PostgreSQL, keeping it"
+                + (" (NOT NULL without default, inserts will fail)" if blocking else "")
+            )
+
+    if not actions:
+        return None, notes
+    statement = sql.SQL("ALTER TABLE {} ").format(sql.Identifier(table)) + sql.SQL(", ").join(actions)
+    return statement, notes
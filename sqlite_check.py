@@ -1,7 +1,10 @@
 import sqlite3
 
-# 替换为你的 SQLite 数据库文件路径
-sqlite_db_file = "one-hub/api_dir/data/one-api.db"
+from db_conn import load_config
+
+# SQLite 数据库文件路径，优先使用配置文件中的 database.sqlite_file
+config = load_config()
+sqlite_db_file = config["database"]["sqlite_file"] if config else "one-hub/api_dir/data/one-api.db"
 
 try:
     conn = sqlite3.connect(sqlite_db_file)
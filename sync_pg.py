@@ -1,19 +1,22 @@
 import argparse
+import os
+import shutil
 import subprocess
-import tomllib
-import psycopg
+import tempfile
+import time
 from psycopg import sql
 
+from catalog_snapshot import load_catalog
+from db_conn import ConnectionPool, build_dsn, connect, get_db_config, load_config, retry
+from metrics import MetricsRecorder
+from pg_stream import copy_table
+from table_filters import WINDOW_COLUMNS, add_filter_arguments, filter_tables, window_bound
 
-def get_db_config(config, db_type):
-    """获取数据库配置"""
-    return {
-        "dbname": config["postgresql"][f"{db_type}"]["dbname"],
-        "user": config["postgresql"][f"{db_type}"]["user"],
-        "password": config["postgresql"][f"{db_type}"]["password"],
-        "host": config["postgresql"][f"{db_type}"]["host"],
-        "port": config["postgresql"][f"{db_type}"]["port"],
-    }
+# auto 模式下源数据库超过该大小时使用并行目录格式
+DEFAULT_DIRECTORY_THRESHOLD = 1024**3
+
+# incremental 模式下每个桶包含的主键数（或估计行数）
+DEFAULT_BUCKET_SIZE = 10000
 
 
 def check_postgresql_tools():
@@ -37,7 +40,67 @@ def clean_target_db(dst_config):
     print("✅ Skipping cleanup: target database is assumed to be empty")
 
 
-def replicate_db(src_config, dst_config):
+def parse_size(value):
+    """解析 500MB、2GB 这样的大小，返回字节数"""
+    units = {"KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
+    value = value.strip().upper()
+    for unit, factor in units.items():
+        if value.endswith(unit):
+            return int(float(value[: -len(unit)]) * factor)
+    return int(value)
+
+
+def get_database_size(db_config):
+    """获取数据库大小（字节）"""
+    with connect(db_config) as conn:
+        return conn.execute("SELECT pg_database_size(current_database())").fetchone()[0]
+
+
+def choose_method(src_config, method, threshold):
+    """auto 模式下根据源数据库大小选择流式管道或并行目录格式"""
+    if method != "auto":
+        return method
+    size = get_database_size(src_config)
+    chosen = "directory" if size >= threshold else "stream"
+    print(
+        f"📏 Source database size: {size / 1024**2:.1f} MB "
+        f"(threshold {threshold / 1024**2:.1f} MB), using {chosen} method"
+    )
+    return chosen
+
+
+# 作为阶段指标记录的 run_phase 名称，其余的名称是各个表
+METRIC_PHASES = ["size_check", "pg_dump", "pg_restore", "dump_and_restore", "sync_sequences"]
+
+
+def run_phase(timings, name, func, *args, **kwargs):
+    """执行一个阶段并记录耗时"""
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        timings[name] = time.perf_counter() - start
+        print(f"⏱️  {name}: {timings[name]:.2f}s")
+
+
+def record_table(metrics, table, phase, seconds, rows, transferred, **fields):
+    """将一个表的行数、字节数和耗时记入 metrics，未启用指标时忽略"""
+    if metrics is None:
+        return
+    metrics.add_chunk(table, rows, transferred)
+    metrics.finish_table(table, phase, rows, seconds, **fields)
+
+
+def build_dump_filter_args(include=None, exclude=None, since=None):
+    """将表过滤条件转换为 pg_dump 参数，限定时间窗口的表只导出结构"""
+    args = [f"--table={pattern}" for pattern in include or []]
+    args += [f"--exclude-table={pattern}" for pattern in exclude or []]
+    if since:
+        args += [f"--exclude-table-data={table}" for table in WINDOW_COLUMNS]
+    return args
+
+
+def replicate_db_stream(src_config, dst_config, dump_args=()):
     """使用 pg_dump 和 pg_restore 复制数据库（带详细错误输出）"""
 
     dump_cmd = [
@@ -45,7 +108,8 @@ def replicate_db(src_config, dst_config):
         "--format=custom",
         "--no-acl",
         "--no-owner",
-        f"--dbname=postgresql://{src_config['user']}:{src_config['password']}@{src_config['host']}:{src_config['port']}/{src_config['dbname']}",
+        *dump_args,
+        f"--dbname={build_dsn(src_config)}",
     ]
 
     restore_cmd = [
@@ -54,35 +118,497 @@ def replicate_db(src_config, dst_config):
         "--if-exists",
         "--no-acl",
         "--no-owner",
-        f"--dbname=postgresql://{dst_config['user']}:{dst_config['password']}@{dst_config['host']}:{dst_config['port']}/{dst_config['dbname']}",
+        f"--dbname={build_dsn(dst_config)}",
     ]
 
-    try:
-        # 执行 pg_dump 和 pg_restore
+    # 执行 pg_dump 和 pg_restore
+    with subprocess.Popen(
+        dump_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    ) as dump_process:
         with subprocess.Popen(
-            dump_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        ) as dump_process:
-            with subprocess.Popen(
-                restore_cmd, stdin=dump_process.stdout, stderr=subprocess.PIPE
-            ) as restore_process:
-                dump_process.stdout.close()
-                stdout, dump_err = dump_process.communicate()
-                _, restore_err = restore_process.communicate()
-
-                # 检查返回码
-                if dump_process.returncode != 0:
-                    print(f"❌ pg_dump failed with error:\n{dump_err.decode()}")
-                    raise Exception("❌ pg_dump failed")
-
-                if restore_process.returncode != 0:
-                    print(f"❌ pg_restore failed with error:\n{restore_err.decode()}")
-                    raise Exception("❌ pg_restore failed")
-
-        print("✅ Database replication completed successfully")
+            restore_cmd, stdin=dump_process.stdout, stderr=subprocess.PIPE
+        ) as restore_process:
+            dump_process.stdout.close()
+            stdout, dump_err = dump_process.communicate()
+            _, restore_err = restore_process.communicate()
+
+            # 检查返回码
+            if dump_process.returncode != 0:
+                print(f"❌ pg_dump failed with error:\n{dump_err.decode()}")
+                raise Exception("❌ pg_dump failed")
+
+            if restore_process.returncode != 0:
+                print(f"❌ pg_restore failed with error:\n{restore_err.decode()}")
+                raise Exception("❌ pg_restore failed")
+
+
+def run_tool(cmd):
+    """执行 pg_dump/pg_restore，失败时输出错误信息"""
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        print(f"❌ {cmd[0]} failed with error:\n{result.stderr.decode()}")
+        raise Exception(f"❌ {cmd[0]} failed")
+
+
+def replicate_db_directory(src_config, dst_config, jobs, staging_dir, timings, dump_args=()):
+    """使用目录格式并行导出到本地暂存目录，再并行导入"""
+    dump_dir = os.path.join(tempfile.mkdtemp(prefix="sync_pg_", dir=staging_dir), "dump")
+    try:
+        dump_cmd = [
+            "pg_dump",
+            "--format=directory",
+            f"--jobs={jobs}",
+            "--no-acl",
+            "--no-owner",
+            *dump_args,
+            f"--file={dump_dir}",
+            f"--dbname={build_dsn(src_config)}",
+        ]
+        restore_cmd = [
+            "pg_restore",
+            "--clean",
+            "--if-exists",
+            f"--jobs={jobs}",
+            "--no-acl",
+            "--no-owner",
+            f"--dbname={build_dsn(dst_config)}",
+            dump_dir,
+        ]
+        print(f"📦 Dumping with {jobs} jobs to {dump_dir}")
+        run_phase(timings, "pg_dump", run_tool, dump_cmd)
+        print(f"📥 Restoring with {jobs} jobs")
+        run_phase(timings, "pg_restore", run_tool, restore_cmd)
+    finally:
+        # 删除暂存目录
+        shutil.rmtree(os.path.dirname(dump_dir), ignore_errors=True)
+
+
+def prepare_sync_session(conn):
+    """统一两端的输出格式，保证同样的数据得到同样的行文本和哈希"""
+    for setting, value in [
+        ("TimeZone", "UTC"),
+        ("DateStyle", "ISO, YMD"),
+        ("IntervalStyle", "postgres"),
+        ("extra_float_digits", "1"),
+        ("bytea_output", "hex"),
+    ]:
+        conn.execute(sql.SQL("SET {} TO {}").format(sql.Identifier(setting), sql.Literal(value)))
+
+
+def load_public_catalog(pool, tables=None):
+    """用连接池中的连接读取 public 模式下（或指定的）表的结构"""
+    return pool.run(lambda conn: load_catalog(conn, "public", tables), "loading catalog")
+
+
+def build_window_condition(pg_table, since):
+    """根据 --since 生成时间窗口的 WHERE 条件，表不需要过滤时返回 None"""
+    column_types = pg_table.column_types()
+    column = WINDOW_COLUMNS.get(pg_table.name)
+    if since is None or column not in column_types:
+        return None
+    column, bound = window_bound(pg_table.name, since, column_types[column])
+    return sql.SQL("{} >= {}").format(sql.Identifier(column), sql.Literal(bound))
+
+
+def build_bucket_expression(pk_columns, integer_key, bucket_size, bucket_count):
+    """
+    整数主键按 key / bucket_size 分桶，便于按范围读取；
+    其他主键按主键文本的 md5 取模分桶；没有主键时整表为一个桶
+    """
+    if integer_key:
+        return sql.SQL("({} / {})").format(sql.Identifier(pk_columns[0]), sql.Literal(bucket_size))
+    if pk_columns:
+        key_text = sql.SQL("ROW({})::text").format(sql.SQL(", ").join(map(sql.Identifier, pk_columns)))
+        return sql.SQL("(('x' || substr(md5({}), 1, 8))::bit(32)::bigint % {})").format(
+            key_text, sql.Literal(bucket_count)
+        )
+    return sql.SQL("0")
+
+
+def fetch_bucket_hashes(conn, table, columns, bucket_expr, where=None):
+    """计算每个桶的行数和行哈希之和（与行顺序无关）"""
+    row_text = sql.SQL("ROW({})::text").format(sql.SQL(", ").join(map(sql.Identifier, columns)))
+    query = sql.SQL(
+        "SELECT {bucket} AS bucket, count(*), "
+        "sum(('x' || substr(md5({row}), 1, 15))::bit(60)::bigint) "
+        "FROM {table} WHERE {where} GROUP BY 1"
+    ).format(
+        bucket=bucket_expr,
+        row=row_text,
+        table=sql.Identifier(table),
+        where=where if where is not None else sql.SQL("true"),
+    )
+    return {row[0]: (row[1], row[2]) for row in conn.execute(query).fetchall()}
+
+
+def build_bucket_condition(pk_columns, integer_key, bucket_size, bucket_expr, buckets):
+    """生成选取指定桶的 WHERE 条件，整数主键的连续桶合并为一个范围"""
+    if not integer_key:
+        return sql.SQL("{} = ANY({})").format(bucket_expr, sql.Literal(sorted(buckets)))
+
+    ranges = []
+    for bucket in sorted(buckets):
+        if ranges and ranges[-1][1] == bucket:
+            ranges[-1][1] = bucket + 1
+        else:
+            ranges.append([bucket, bucket + 1])
+    key = sql.Identifier(pk_columns[0])
+    # key / bucket_size 向零取整：桶 0 包含 -(bucket_size - 1) 到 bucket_size - 1 的主键，
+    # 从桶 0 开始的范围下界为 key > -bucket_size；从负数桶开始的范围直接按桶号比较
+    return sql.SQL(" OR ").join(
+        sql.SQL("({} / {} >= {} AND {} / {} < {})").format(
+            key, sql.Literal(bucket_size), sql.Literal(low), key, sql.Literal(bucket_size), sql.Literal(high)
+        )
+        if low < 0
+        else sql.SQL("({} > {} AND {} < {})").format(
+            key, sql.Literal(-bucket_size), key, sql.Literal(high * bucket_size)
+        )
+        if low == 0
+        else sql.SQL("({} >= {} AND {} < {})").format(
+            key, sql.Literal(low * bucket_size), key, sql.Literal(high * bucket_size)
+        )
+        for low, high in ranges
+    )
+
+
+def replicate_table_incremental(src_conn, dst_conn, src_table, dst_table, bucket_size, since=None):
+    """
+    比较两端每个桶的哈希，只传输不一致的桶并合并到目标表，返回 (变化的桶数, 传输行数, 传输字节数)。
+    src_table/dst_table 为两端的 TableInfo，指定 since 时只比较和同步时间窗口内的行
+    """
+    table = src_table.name
+    column_types = src_table.column_types()
+    if list(column_types.items()) != list(dst_table.column_types().items()):
+        print(f"⚠️  Skipping {table}: columns differ between source and destination, run a full sync")
+        return 0, 0, 0
+    column_names = list(column_types)
+    pk_columns = src_table.primary_key
+    integer_key = len(pk_columns) == 1 and column_types[pk_columns[0]] in ["smallint", "integer", "bigint"]
+
+    # 哈希分桶的数量由源表的估计行数决定，两端使用相同的值
+    bucket_count = max(1, (src_table.estimated_rows or 0) // bucket_size)
+    bucket_expr = build_bucket_expression(pk_columns, integer_key, bucket_size, bucket_count)
+
+    window = build_window_condition(src_table, since)
+    src_buckets = fetch_bucket_hashes(src_conn, table, column_names, bucket_expr, window)
+    dst_buckets = fetch_bucket_hashes(dst_conn, table, column_names, bucket_expr, window)
+    changed = {
+        bucket
+        for bucket in src_buckets.keys() | dst_buckets.keys()
+        if src_buckets.get(bucket) != dst_buckets.get(bucket)
+    }
+    if not changed:
+        return 0, 0, 0
+
+    staging_table = f"{table}_sync_staging"
+    column_list = sql.SQL(", ").join(map(sql.Identifier, column_names))
+    table_ident = sql.Identifier(table)
+    condition = build_bucket_condition(pk_columns, integer_key, bucket_size, bucket_expr, changed)
+    if window is not None:
+        condition = sql.SQL("({}) AND {}").format(condition, window)
+
+    with dst_conn.transaction():
+        dst_conn.execute(
+            sql.SQL("CREATE TEMP TABLE {} (LIKE {}) ON COMMIT DROP").format(
+                sql.Identifier(staging_table), table_ident
+            )
+        )
+        rows, transferred = copy_table(
+            src_conn, dst_conn, table, column_names, where=condition, dst_table=staging_table
+        )
+
+        if pk_columns:
+            pk_list = sql.SQL(", ").join(map(sql.Identifier, pk_columns))
+            # 删除源端已不存在的行
+            dst_conn.execute(
+                sql.SQL(
+                    "DELETE FROM {table} t WHERE ({cond}) AND NOT EXISTS "
+                    "(SELECT 1 FROM {staging} s WHERE ({s_pk}) = ({t_pk}))"
+                ).format(
+                    table=table_ident,
+                    cond=condition,
+                    staging=sql.Identifier(staging_table),
+                    s_pk=sql.SQL(", ").join(sql.Identifier("s", col) for col in pk_columns),
+                    t_pk=sql.SQL(", ").join(sql.Identifier("t", col) for col in pk_columns),
+                )
+            )
+            non_pk = [col for col in column_names if col not in pk_columns]
+            conflict_action = (
+                sql.SQL("DO UPDATE SET {}").format(
+                    sql.SQL(", ").join(
+                        sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(col), sql.Identifier(col))
+                        for col in non_pk
+                    )
+                )
+                if non_pk
+                else sql.SQL("DO NOTHING")
+            )
+            dst_conn.execute(
+                sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}").format(
+                    table_ident,
+                    column_list,
+                    column_list,
+                    sql.Identifier(staging_table),
+                    pk_list,
+                    conflict_action,
+                )
+            )
+        else:
+            # 没有主键的表整表替换
+            dst_conn.execute(sql.SQL("DELETE FROM {}").format(table_ident))
+            dst_conn.execute(
+                sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+                    table_ident, column_list, column_list, sql.Identifier(staging_table)
+                )
+            )
+    return len(changed), rows, transferred
+
+
+def sync_sequences(conn):
+    """将目标库中序列的值同步为对应列的最大值"""
+    for table, column, sequence in load_catalog(conn, "public").sequences():
+        conn.execute(
+            sql.SQL(
+                "SELECT setval({}::regclass, COALESCE((SELECT MAX({}) FROM {}), 0) + 1, false)"
+            ).format(
+                sql.Literal(sequence),
+                sql.Identifier(column),
+                sql.Identifier("public", table),
+            )
+        )
+
+
+def run_with_connections(src_pool, dst_pool, operation, description, *args):
+    """用两端连接池中的连接执行幂等操作 operation(src_conn, dst_conn, *args)，连接中断时换连接重试"""
+
+    def attempt():
+        with src_pool.connection() as src_conn, dst_pool.connection() as dst_conn:
+            return operation(src_conn, dst_conn, *args)
+
+    return retry(attempt, dst_pool.db_config, description)
+
+
+def sync_dst_sequences(src_conn, dst_conn):
+    """同步目标库的序列，供 run_with_connections 调用"""
+    sync_sequences(dst_conn)
+
+
+def replicate_table(src_conn, dst_conn, src_table, dst_table, since=None):
+    """清空目标表后整表（或时间窗口内的行）复制，返回 (行数, 传输字节数)"""
+    table = src_table.name
+    column_types = src_table.column_types()
+    if list(column_types.items()) != list(dst_table.column_types().items()):
+        raise Exception(f"❌ Columns of table {table} differ between source and destination")
+    with dst_conn.transaction():
+        dst_conn.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(table)))
+        return copy_table(
+            src_conn,
+            dst_conn,
+            table,
+            list(column_types),
+            where=build_window_condition(src_table, since),
+        )
+
+
+def replicate_tables(src_config, dst_config, tables, timings, since=None, metrics=None):
+    """只复制指定的表，要求目标库已有相同的表结构"""
+    with ConnectionPool(src_config, max_size=1, autocommit=True) as src_pool, ConnectionPool(
+        dst_config, max_size=1, autocommit=True
+    ) as dst_pool:
+        src_catalog = load_public_catalog(src_pool, tables)
+        dst_catalog = load_public_catalog(dst_pool, tables)
+        missing = [table for table in tables if table not in dst_catalog.tables]
+        if missing:
+            raise Exception(f"❌ Tables not found in destination: {', '.join(missing)}")
+        missing = [table for table in tables if table not in src_catalog.tables]
+        if missing:
+            raise Exception(f"❌ Tables not found in source: {', '.join(missing)}")
+        for table in tables:
+            start = time.perf_counter()
+            rows, transferred = run_phase(
+                timings,
+                table,
+                run_with_connections,
+                src_pool,
+                dst_pool,
+                replicate_table,
+                f"copying table {table}",
+                src_catalog.get(table),
+                dst_catalog.get(table),
+                since,
+            )
+            elapsed = time.perf_counter() - start
+            record_table(metrics, table, "copy", elapsed, rows, transferred)
+            rate = transferred / 1024**2 / elapsed if elapsed > 0 else 0
+            print(f"📦 {table}: {transferred / 1024**2:.2f} MB copied ({rate:.1f} MB/s)")
+        run_phase(
+            timings,
+            "sync_sequences",
+            run_with_connections,
+            src_pool,
+            dst_pool,
+            sync_dst_sequences,
+            "synchronizing sequences",
+        )
+
+
+def replicate_db_incremental(src_config, dst_config, bucket_size, timings, tables, since=None, metrics=None):
+    """逐表比较并只复制变化的行，要求目标库已有相同的表结构"""
+    with ConnectionPool(
+        src_config, max_size=1, autocommit=True, configure=prepare_sync_session
+    ) as src_pool, ConnectionPool(
+        dst_config, max_size=1, autocommit=True, configure=prepare_sync_session
+    ) as dst_pool:
+        src_catalog = load_public_catalog(src_pool, tables)
+        dst_catalog = load_public_catalog(dst_pool, tables)
+        total_bytes = 0
+        for table in tables:
+            if table not in dst_catalog.tables:
+                print(f"⚠️  Skipping {table}: table does not exist in destination, run a full sync")
+                continue
+            if table not in src_catalog.tables:
+                print(f"⚠️  Skipping {table}: table does not exist in source")
+                continue
+            # 每个表在目标端的一个事务中合并，中断后可以重新比较和同步
+            changed, rows, transferred = run_phase(
+                timings,
+                table,
+                run_with_connections,
+                src_pool,
+                dst_pool,
+                replicate_table_incremental,
+                f"syncing table {table}",
+                src_catalog.get(table),
+                dst_catalog.get(table),
+                bucket_size,
+                since,
+            )
+            total_bytes += transferred
+            record_table(
+                metrics, table, "incremental", timings[table], rows, transferred, changed_buckets=changed
+            )
+            if changed:
+                print(f"🔄 {table}: {changed} changed buckets, {transferred / 1024**2:.2f} MB transferred")
+            else:
+                print(f"✅ {table}: up to date")
+        run_phase(
+            timings,
+            "sync_sequences",
+            run_with_connections,
+            src_pool,
+            dst_pool,
+            sync_dst_sequences,
+            "synchronizing sequences",
+        )
+        print(f"📦 Transferred {total_bytes / 1024**2:.2f} MB in total")
+
+
+def copy_window(src_conn, dst_conn, src_table, since):
+    """复制单个表时间窗口内的行，返回 (行数, 传输字节数)"""
+    return copy_table(
+        src_conn,
+        dst_conn,
+        src_table.name,
+        list(src_table.columns),
+        where=build_window_condition(src_table, since),
+    )
+
+
+def copy_windowed_rows(src_config, dst_config, include, exclude, since, timings, metrics=None):
+    """pg_dump 只导出了时间窗口表的结构，这里复制窗口内的行"""
+    with ConnectionPool(src_config, max_size=1, autocommit=True) as src_pool, ConnectionPool(
+        dst_config, max_size=1, autocommit=True
+    ) as dst_pool:
+        src_catalog = load_public_catalog(src_pool, list(WINDOW_COLUMNS))
+        windowed = [table for table in WINDOW_COLUMNS if table in src_catalog.tables]
+        for table in filter_tables(windowed, include, exclude):
+            # 单条 COPY 失败时整体回滚，可以直接重试
+            rows, transferred = run_phase(
+                timings,
+                f"{table}_since",
+                run_with_connections,
+                src_pool,
+                dst_pool,
+                copy_window,
+                f"copying recent rows of table {table}",
+                src_catalog.get(table),
+                since,
+            )
+            record_table(metrics, table, "copy_since", timings[f"{table}_since"], rows, transferred)
+            print(f"📦 {table}: {transferred / 1024**2:.2f} MB copied since {since.date()}")
+        run_phase(
+            timings,
+            "sync_sequences",
+            run_with_connections,
+            src_pool,
+            dst_pool,
+            sync_dst_sequences,
+            "synchronizing sequences",
+        )
+
+
+def replicate_db(
+    src_config,
+    dst_config,
+    method="auto",
+    jobs=4,
+    threshold=DEFAULT_DIRECTORY_THRESHOLD,
+    staging_dir=None,
+    bucket_size=DEFAULT_BUCKET_SIZE,
+    tables=None,
+    include=None,
+    exclude=None,
+    since=None,
+    metrics=None,
+):
+    """
+    复制数据库：小库使用流式管道，大库使用并行目录格式，incremental 只复制变化的行。
+    指定 tables 时只复制这些表（incremental 只比较这些表）。
+    include/exclude 按模式过滤表，since 只复制 logs/statistics 时间窗口内的行。
+    指定 metrics（MetricsRecorder）时记录各阶段和各表的指标
+    """
+    timings = {}
+    start = time.perf_counter()
+    try:
+        if tables and method != "incremental":
+            method = "tables"
+        else:
+            method = run_phase(timings, "size_check", choose_method, src_config, method, threshold)
+
+        if method in ["tables", "incremental"]:
+            if not tables:
+                with connect(src_config) as src_conn:
+                    tables = sorted(load_catalog(src_conn, "public").tables)
+            tables = filter_tables(tables, include, exclude)
+
+        if method == "tables":
+            replicate_tables(src_config, dst_config, tables, timings, since, metrics)
+        elif method == "incremental":
+            replicate_db_incremental(src_config, dst_config, bucket_size, timings, tables, since, metrics)
+        else:
+            dump_args = build_dump_filter_args(include, exclude, since)
+            if method == "directory":
+                replicate_db_directory(src_config, dst_config, jobs, staging_dir, timings, dump_args)
+            else:
+                run_phase(timings, "dump_and_restore", replicate_db_stream, src_config, dst_config, dump_args)
+            if since:
+                copy_windowed_rows(src_config, dst_config, include, exclude, since, timings, metrics)
+
+        print(
+            f"✅ Database replication completed successfully in "
+            f"{time.perf_counter() - start:.2f}s ({method})"
+        )
+        return timings
 
     except Exception as e:
         raise Exception(f"❌ Database replication failed: {e}")
 
+    finally:
+        if metrics is not None:
+            for name in METRIC_PHASES:
+                if name in timings:
+                    metrics.record_phase(name, timings[name])
+
 
 def main():
     # 解析命令行参数
@@ -92,12 +618,63 @@ def main():
         choices=["cloud-to-local", "local-to-cloud"],
         help="Replication direction: cloud-to-local or local-to-cloud",
     )
+    parser.add_argument(
+        "--method",
+        choices=["auto", "stream", "directory", "incremental"],
+        default="auto",
+        help="stream pipes a custom-format dump into pg_restore; directory dumps to a local "
+        "staging directory and restores with --jobs; auto picks by database size (default: auto); "
+        "incremental compares tables bucket by bucket and copies only changed rows",
+    )
+    parser.add_argument(
+        "--bucket-size",
+        type=int,
+        default=DEFAULT_BUCKET_SIZE,
+        help=f"Primary-key values (or rows) per bucket for the incremental method (default: {DEFAULT_BUCKET_SIZE})",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="Parallel pg_dump/pg_restore jobs for the directory method (default: 4)",
+    )
+    parser.add_argument(
+        "--directory-threshold",
+        type=parse_size,
+        default=DEFAULT_DIRECTORY_THRESHOLD,
+        help="Database size from which auto uses the directory method, e.g. 500MB (default: 1GB)",
+    )
+    parser.add_argument(
+        "--tables",
+        type=lambda value: [table.strip() for table in value.split(",") if table.strip()],
+        default=None,
+        help="Comma-separated tables to copy with a streaming binary COPY instead of dumping the "
+        "whole database (with --method incremental, only these tables are compared)",
+    )
+    parser.add_argument(
+        "--staging-dir",
+        default=None,
+        help="Where the directory dump is written (default: system temp directory)",
+    )
 
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Append per-phase and per-table metrics (rows, bytes, seconds, peak RSS) as JSON lines",
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        default=None,
+        help="Write the run's metrics in the Prometheus textfile format (for node_exporter)",
+    )
+
+    add_filter_arguments(parser)
     args = parser.parse_args()
 
-    # 读取配置文件
-    with open("config.toml", "rb") as f:
-        config = tomllib.load(f)
+    # 读取配置文件（与 migrate_sqlite_to_pg.py 相同，支持 CONFIG_PATH）
+    config = load_config()
+    if not config:
+        raise SystemExit("❌ Failed to load configuration")
 
     # 确定源和目标数据库
     if args.direction == "cloud-to-local":
@@ -108,8 +685,28 @@ def main():
         dst_config = get_db_config(config, "cloud")
 
     # 清理目标数据库并执行复制
-    clean_target_db(dst_config)
-    replicate_db(src_config, dst_config)
+    metrics = MetricsRecorder("sync_pg", args.metrics_file, args.prometheus_file)
+    succeeded = False
+    try:
+        clean_target_db(dst_config)
+        timings = replicate_db(
+            src_config,
+            dst_config,
+            args.method,
+            args.jobs,
+            args.directory_threshold,
+            args.staging_dir,
+            args.bucket_size,
+            args.tables,
+            args.include,
+            args.exclude,
+            args.since,
+            metrics,
+        )
+        succeeded = True
+    finally:
+        metrics.close(succeeded)
+    print("⏱️  Phase timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
 
     print("✅ PostgreSQL database replication completed successfully!")
 
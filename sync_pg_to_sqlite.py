@@ -0,0 +1,392 @@
+"""
+Build a local SQLite snapshot of the cloud or local PostgreSQL database.
+
+All tables are read in one REPEATABLE READ transaction through server-side
+cursors, so the snapshot is consistent. Values are converted back to what
+one-hub stores in SQLite on the PostgreSQL side (booleans to 0/1, JSONB and
+dates to text, timestamps to UTC text). They are written with batched
+executemany into a new SQLite file inside a single transaction, with
+journaling and fsync turned off. Reading and writing overlap through
+chunk_pipeline. Tables whose columns match the existing SQLite file keep its
+original CREATE TABLE and CREATE INDEX statements, since the migration to
+PostgreSQL loses varchar lengths and decimal types; other tables get a
+schema generated from the catalog. Secondary indexes are created after the
+data is loaded. The file is built next to the output path and moved into
+place when complete.
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+from decimal import Decimal, InvalidOperation
+
+import psycopg
+from psycopg import sql
+
+from catalog_snapshot import load_catalog
+from chunk_pipeline import DEFAULT_DEPTH, format_stats, run_pipeline
+from db_conn import connect, get_db_config, load_config, retry
+from migrate_sqlite_to_pg import CHECKPOINT_TABLE, STATE_TABLE
+from schema_diff import DEFAULT_CAST_PATTERN
+from sync_pg import build_window_condition
+from table_filters import add_filter_arguments, filter_tables
+
+# 每次从 PostgreSQL 读取并写入 SQLite 的默认行数
+DEFAULT_CHUNK_SIZE = 10000
+
+# 写入期间 SQLite 页缓存的默认大小（MB）
+DEFAULT_CACHE_SIZE_MB = 256
+
+# 迁移脚本的进度表，不属于 one-hub 的数据
+SKIPPED_TABLES = [STATE_TABLE, CHECKPOINT_TABLE]
+
+# 可作为 rowid 主键的整数类型
+INTEGER_TYPES = ["smallint", "integer", "bigint"]
+
+# PostgreSQL 类型对应的 SQLite 列类型，与 one-hub 在 SQLite 中的建表语句一致
+SQLITE_TYPES = {
+    "smallint": "INTEGER",
+    "integer": "INTEGER",
+    "bigint": "INTEGER",
+    "boolean": "numeric",
+    "numeric": "REAL",
+    "real": "real",
+    "double precision": "real",
+    "text": "TEXT",
+    "json": "JSON",
+    "jsonb": "JSON",
+    "timestamp with time zone": "datetime",
+    "timestamp without time zone": "datetime",
+    "date": "date",
+    "bytea": "blob",
+}
+
+# 读取后可以直接写入 SQLite 的类型，其他类型在 PostgreSQL 端转换为文本
+PASSTHROUGH_TYPES = INTEGER_TYPES + ["real", "double precision", "text", "character varying", "character", "bytea"]
+
+
+def quote_identifier(name):
+    """SQLite 标识符加双引号"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sqlite_column_type(column):
+    """PostgreSQL 列对应的 SQLite 列类型，varchar/char 保留长度"""
+    if column.data_type in ["character varying", "character"]:
+        name = "varchar" if column.data_type == "character varying" else "char"
+        return f"{name}({column.character_maximum_length})" if column.character_maximum_length else "TEXT"
+    return SQLITE_TYPES.get(column.data_type, "TEXT")
+
+
+def sqlite_default(column):
+    """将 PostgreSQL 的默认值转换为 SQLite 的 DEFAULT 子句，序列和函数等表达式不保留"""
+    if column.default is None:
+        return ""
+    value = DEFAULT_CAST_PATTERN.sub("", column.default.strip())
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return f" DEFAULT {value}"
+    if value in ["true", "false"]:
+        return f" DEFAULT {int(value == 'true')}"
+    try:
+        Decimal(value)
+    except InvalidOperation:
+        return ""
+    return f" DEFAULT {value}"
+
+
+def integer_primary_key(pg_table):
+    """单一整数主键的列名，用作 SQLite 的 rowid（INTEGER PRIMARY KEY），否则返回 None"""
+    pk_columns = pg_table.primary_key
+    if len(pk_columns) == 1 and pg_table.columns[pk_columns[0]].data_type in INTEGER_TYPES:
+        return pk_columns[0]
+    return None
+
+
+def build_create_statement(pg_table):
+    """生成 SQLite 建表语句：单一整数主键为 INTEGER PRIMARY KEY AUTOINCREMENT，其他主键为表约束"""
+    rowid_column = integer_primary_key(pg_table)
+    definitions = []
+    for name, column in pg_table.columns.items():
+        definition = f"{quote_identifier(name)} {sqlite_column_type(column)}"
+        if name == rowid_column:
+            definition = f"{quote_identifier(name)} INTEGER PRIMARY KEY AUTOINCREMENT"
+        elif column.not_null and name not in pg_table.primary_key:
+            definition += " NOT NULL"
+        definitions.append(definition + sqlite_default(column))
+    if pg_table.primary_key and rowid_column is None:
+        definitions.append(f"PRIMARY KEY ({', '.join(map(quote_identifier, pg_table.primary_key))})")
+    return f"CREATE TABLE {quote_identifier(pg_table.name)} ({', '.join(definitions)})"
+
+
+def build_index_statements(pg_table):
+    """生成主键以外的索引（包括唯一约束）的建索引语句"""
+    return [
+        "CREATE {}INDEX {} ON {} ({})".format(
+            "UNIQUE " if unique else "",
+            quote_identifier(name),
+            quote_identifier(pg_table.name),
+            ", ".join(map(quote_identifier, columns)),
+        )
+        for name, (unique, columns) in pg_table.indexes.items()
+    ]
+
+
+def load_template_schema(path):
+    """
+    读取已有 SQLite 文件中的建表和建索引语句：{表名: (建表语句, [列名], [建索引语句])}。
+    迁移到 PostgreSQL 时 varchar(n)、decimal 等类型会变为 TEXT/NUMERIC，列相同的表沿用原来的定义
+    """
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        schema = {}
+        for table, statement in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ):
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({quote_identifier(table)})")]
+            schema[table] = (statement, columns, [])
+        for table, statement in conn.execute(
+            "SELECT tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ):
+            if table in schema:
+                schema[table][2].append(statement)
+        return schema
+    except sqlite3.DatabaseError as e:
+        print(f"⚠️ Cannot read the schema of {path}, generating it from PostgreSQL: {e}")
+        return {}
+    finally:
+        conn.close()
+
+
+def select_expression(column):
+    """读取列的表达式：在 PostgreSQL 端转换为 SQLite 中 one-hub 使用的表示"""
+    ident = sql.Identifier(column.name)
+    if column.data_type in PASSTHROUGH_TYPES:
+        return ident
+    if column.data_type == "boolean":
+        return sql.SQL("{}::int").format(ident)
+    if column.data_type == "numeric":
+        return sql.SQL("{}::float8").format(ident)
+    # 时间与 one-hub 写入 SQLite 的格式相同：小数秒去掉末尾的 0，带时区时转换为 UTC
+    if column.data_type == "timestamp with time zone":
+        return sql.SQL(
+            "rtrim(rtrim(to_char({} AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS.US'), '0'), '.') || '+00:00'"
+        ).format(ident)
+    if column.data_type == "timestamp without time zone":
+        return sql.SQL("rtrim(rtrim(to_char({}, 'YYYY-MM-DD HH24:MI:SS.US'), '0'), '.')").format(ident)
+    # jsonb、date 等其他类型使用文本表示
+    return sql.SQL("{}::text").format(ident)
+
+
+def build_select_statement(pg_table, since=None):
+    """生成读取整个表（或时间窗口内的行）的查询，按主键排序使 SQLite 的主键索引顺序追加"""
+    query = sql.SQL("SELECT {} FROM {}").format(
+        sql.SQL(", ").join(select_expression(column) for column in pg_table.columns.values()),
+        sql.Identifier(pg_table.name),
+    )
+    window = build_window_condition(pg_table, since)
+    if window is not None:
+        query += sql.SQL(" WHERE {}").format(window)
+    if pg_table.primary_key:
+        query += sql.SQL(" ORDER BY {}").format(sql.SQL(", ").join(map(sql.Identifier, pg_table.primary_key)))
+    return query
+
+
+def open_snapshot_file(path, cache_size_mb):
+    """打开新的 SQLite 文件：关闭日志和 fsync，使用较大的页缓存，临时数据放在内存中"""
+    sqlite_conn = sqlite3.connect(path, isolation_level=None)
+    sqlite_conn.execute("PRAGMA journal_mode=OFF")
+    sqlite_conn.execute("PRAGMA synchronous=OFF")
+    sqlite_conn.execute(f"PRAGMA cache_size=-{int(cache_size_mb) * 1024}")
+    sqlite_conn.execute("PRAGMA temp_store=MEMORY")
+    sqlite_conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    return sqlite_conn
+
+
+def copy_table_to_sqlite(pg_conn, sqlite_conn, pg_table, chunk_size, depth, since=None):
+    """用服务端游标分块读取表，在后台线程中读取的同时批量写入 SQLite，返回写入的行数"""
+    table = pg_table.name
+    query = build_select_statement(pg_table, since)
+    insert = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote_identifier(table),
+        ", ".join(map(quote_identifier, pg_table.columns)),
+        ", ".join("?" * len(pg_table.columns)),
+    )
+    loaded_rows = 0
+
+    def read():
+        with pg_conn.cursor(name=f"snapshot_{table}") as cursor:
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    def write(rows, _):
+        nonlocal loaded_rows
+        sqlite_conn.executemany(insert, rows)
+        loaded_rows += len(rows)
+
+    stats = run_pipeline(read, lambda rows: None, write, depth)
+    if loaded_rows > chunk_size:
+        print(f"  {table} stages: {format_stats(stats)}")
+    return loaded_rows
+
+
+def sync_autoincrement(pg_conn, sqlite_conn, pg_table):
+    """AUTOINCREMENT 表的 sqlite_sequence 不小于 PostgreSQL 序列的当前值，已删除的 ID 不会被重用"""
+    rowid_column = integer_primary_key(pg_table)
+    sequence = pg_table.sequences.get(rowid_column)
+    if sequence is None:
+        return
+    last_value = pg_conn.execute(sql.SQL("SELECT last_value FROM {}").format(sql.SQL(sequence))).fetchone()[0]
+    updated = sqlite_conn.execute(
+        "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (last_value, pg_table.name)
+    ).rowcount
+    if not updated:
+        sqlite_conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (pg_table.name, last_value))
+
+
+def build_snapshot(db_config, output, options):
+    """将 PostgreSQL 的所有表写入 output 旁边的临时文件，完成后替换 output，返回 {表名: 行数}"""
+    temp_path = f"{output}.{os.getpid()}.tmp"
+    rows_by_table = {}
+    pg_conn = connect(db_config)
+    sqlite_conn = None
+    try:
+        # 所有表在同一个只读快照中读取，数据一致
+        pg_conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        pg_conn.read_only = True
+        catalog = load_catalog(pg_conn)
+        tables = [table for table in sorted(catalog.tables) if table not in SKIPPED_TABLES]
+        tables = filter_tables(tables, options["include"], options["exclude"])
+
+        template = load_template_schema(options["template"]) if options["template"] else {}
+        index_statements = []
+        sqlite_conn = open_snapshot_file(temp_path, options["cache_size"])
+        if os.path.exists(output):
+            shutil.copymode(output, temp_path)
+        sqlite_conn.execute("BEGIN")
+        for table in tables:
+            pg_table = catalog.get(table)
+            start = time.perf_counter()
+            if table in template and sorted(template[table][1]) == sorted(pg_table.columns):
+                create_statement, _, table_indexes = template[table]
+            else:
+                create_statement, table_indexes = build_create_statement(pg_table), build_index_statements(pg_table)
+            sqlite_conn.execute(create_statement)
+            index_statements.extend(table_indexes)
+            rows_by_table[table] = copy_table_to_sqlite(
+                pg_conn, sqlite_conn, pg_table, options["chunk_size"], options["pipeline_depth"], options["since"]
+            )
+            sync_autoincrement(pg_conn, sqlite_conn, pg_table)
+            elapsed = time.perf_counter() - start
+            rate = rows_by_table[table] / elapsed if elapsed > 0 else 0
+            print(f"📦 {table}: {rows_by_table[table]} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+
+        # 数据写入后再创建索引
+        start = time.perf_counter()
+        for statement in index_statements:
+            sqlite_conn.execute(statement)
+        sqlite_conn.execute("COMMIT")
+        print(f"🔧 Built {len(index_statements)} indexes in {time.perf_counter() - start:.2f}s")
+        pg_conn.rollback()
+
+        sqlite_conn.execute(f"PRAGMA journal_mode={options['journal_mode']}")
+        sqlite_conn.close()
+        sqlite_conn = None
+        # 旧文件的 -wal/-shm 与新文件不匹配，替换前删除
+        for suffix in ["-wal", "-shm"]:
+            if os.path.exists(output + suffix):
+                os.remove(output + suffix)
+        os.replace(temp_path, output)
+        return rows_by_table
+    finally:
+        if sqlite_conn is not None:
+            sqlite_conn.close()
+        pg_conn.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a SQLite snapshot of a PostgreSQL database")
+    parser.add_argument(
+        "db_type",
+        nargs="?",
+        choices=["cloud", "local"],
+        default="cloud",
+        help="PostgreSQL database to read from (default: cloud)",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="SQLite file to write, replaced when the snapshot is complete (default: database.sqlite_file in config)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Rows fetched from the server-side cursor and inserted per batch (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--pipeline-depth",
+        type=int,
+        default=DEFAULT_DEPTH,
+        help=f"Chunks buffered between reading PostgreSQL and writing SQLite; 0 runs them sequentially "
+        f"(default: {DEFAULT_DEPTH})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE_MB,
+        help=f"SQLite page cache in MB while loading (default: {DEFAULT_CACHE_SIZE_MB})",
+    )
+    parser.add_argument(
+        "--journal-mode",
+        choices=["wal", "delete"],
+        default="wal",
+        help="Journal mode of the finished SQLite file (default: wal)",
+    )
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    if args.chunk_size <= 0 or args.pipeline_depth < 0 or args.cache_size <= 0:
+        raise SystemExit("❌ --chunk-size and --cache-size must be positive, --pipeline-depth must not be negative")
+
+    # 读取配置文件（与其他脚本相同，支持 CONFIG_PATH 和环境变量）
+    config = load_config()
+    if not config:
+        raise SystemExit("❌ Failed to load configuration")
+    db_config = get_db_config(config, args.db_type)
+    output = args.output or config["database"]["sqlite_file"]
+    # 沿用输出文件（不存在时为配置中的 SQLite 文件）的表定义
+    template = output if os.path.exists(output) else config["database"]["sqlite_file"]
+
+    options = {
+        "chunk_size": args.chunk_size,
+        "pipeline_depth": args.pipeline_depth,
+        "cache_size": args.cache_size,
+        "journal_mode": args.journal_mode,
+        "template": template,
+        "include": args.include,
+        "exclude": args.exclude,
+        "since": args.since,
+    }
+    print(f"🔄 Copying {args.db_type} PostgreSQL ({db_config['host']}:{db_config['port']}/{db_config['dbname']}) to {output}")
+    start = time.perf_counter()
+    # 中断时丢弃未完成的文件，从头重新读取
+    rows_by_table = retry(
+        lambda: build_snapshot(db_config, output, options), db_config, "building SQLite snapshot"
+    )
+    print(
+        f"✅ SQLite snapshot with {len(rows_by_table)} tables and {sum(rows_by_table.values())} rows "
+        f"written to {output} in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
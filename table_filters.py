@@ -0,0 +1,85 @@
+"""
+Table selection shared by migrate_sqlite_to_pg.py and sync_pg.py.
+
+--include/--exclude take shell-style patterns (fnmatch, also understood by
+pg_dump -t/-T). --since limits the time-series tables in WINDOW_COLUMNS to
+recent rows so a development copy can be built quickly.
+"""
+
+import argparse
+import re
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatchcase
+
+# 支持按时间窗口过滤的表及其时间列：logs.created_at 为 Unix 时间戳，statistics.date 为日期
+WINDOW_COLUMNS = {
+    "logs": "created_at",
+    "statistics": "date",
+}
+
+def parse_patterns(value):
+    """
+    解析逗号分隔的表名模式，如 "logs,stat*"
+    """
+    return [pattern.strip() for pattern in value.split(",") if pattern.strip()]
+
+def parse_since(value):
+    """
+    解析时间窗口的起点：7d 表示最近 7 天（从当天 0 点 UTC 起算），
+    也可以是 2024-06-01 这样的日期，返回 UTC 时间
+    """
+    match = re.fullmatch(r"(\d+)d", value.strip())
+    if match:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=int(match.group(1)))
+    try:
+        since = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid --since value {value!r}, expected e.g. 7d or 2024-06-01")
+    return since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+
+def filter_tables(tables, include=None, exclude=None):
+    """
+    按 include/exclude 模式过滤表名，include 为空时包含所有表
+    """
+    return [
+        table
+        for table in tables
+        if (not include or any(fnmatchcase(table, pattern) for pattern in include))
+        and not any(fnmatchcase(table, pattern) for pattern in (exclude or []))
+    ]
+
+def window_bound(table, since, column_type):
+    """
+    返回表的时间窗口列和下界取值，不需要过滤时返回 None。
+    整数列（Unix 时间戳）使用秒数，其他列使用 ISO 日期
+    """
+    if since is None or table not in WINDOW_COLUMNS:
+        return None
+    if column_type.lower() in ["integer", "bigint", "smallint"]:
+        return WINDOW_COLUMNS[table], int(since.timestamp())
+    return WINDOW_COLUMNS[table], since.date().isoformat()
+
+def add_filter_arguments(parser):
+    """
+    添加 --include/--exclude/--since 参数
+    """
+    parser.add_argument(
+        "--include",
+        type=parse_patterns,
+        default=None,
+        help="Comma-separated table name patterns to transfer, e.g. 'options,users,log*' (default: all)",
+    )
+    parser.add_argument(
+        "--exclude",
+        type=parse_patterns,
+        default=None,
+        help="Comma-separated table name patterns to skip",
+    )
+    parser.add_argument(
+        "--since",
+        type=parse_since,
+        default=None,
+        help=f"Only transfer rows of {', '.join(f'{t}.{c}' for t, c in WINDOW_COLUMNS.items())} "
+        "from this point on: Nd for the last N days or a date such as 2024-06-01",
+    )
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from migrate_sqlite_to_pg import build_delta_filter
+
+# PRAGMA table_info 的行：(cid, name, type, notnull, dflt_value, pk)
+COL_INFO = [
+    (0, "id", "integer", 1, None, 1),
+    (1, "updated_at", "bigint", 0, None, 0),
+    (2, "created_at", "datetime", 0, None, 0),
+]
+KEYSET = ("id", 0)
+
+
+@pytest.mark.parametrize(
+    "keyset, change_column, state, expected",
+    [
+        # 没有检查点：全量读取
+        (KEYSET, None, None, (None, None, ())),
+        (KEYSET, "updated_at", None, (None, None, ())),
+        # 只追加的表：从检查点的下一个主键开始（start_key 包含在内）
+        (KEYSET, None, (41, None, None), (42, None, ())),
+        (KEYSET, None, (0, None, None), (1, None, ())),
+        (KEYSET, None, (-5, None, None), (-4, None, ())),
+        # 检查点没有主键：全量读取
+        (KEYSET, None, (None, None, None), (None, None, ())),
+        # 变更列：新主键不包含检查点本身，变更时间包含检查点（同一秒内的修改会重新读取）
+        (KEYSET, "updated_at", (41, "updated_at", "1700000000"), (None, "id > ? OR updated_at >= ?", (41, 1700000000))),
+        (KEYSET, "updated_at", (None, "updated_at", "1700000000"), (None, "updated_at >= ?", (1700000000,))),
+        # 文本类型的变更列保持文本
+        (KEYSET, "created_at", (7, "created_at", "2024-06-01 00:00:00"), (None, "id > ? OR created_at >= ?", (7, "2024-06-01 00:00:00"))),
+        # 没有整数主键的表只按变更列过滤
+        (None, "updated_at", (None, "updated_at", "5"), (None, "updated_at >= ?", (5,))),
+        # 变更列与检查点记录的不同，或检查点没有变更值：全量读取
+        (KEYSET, "updated_at", (41, "created_at", "2024-06-01"), (None, None, ())),
+        (KEYSET, "updated_at", (41, "updated_at", None), (None, None, ())),
+    ],
+)
+def test_build_delta_filter(keyset, change_column, state, expected):
+    assert build_delta_filter(COL_INFO, keyset, change_column, state) == expected
+
+
+def test_build_delta_filter_selects_new_and_changed_rows():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, updated_at BIGINT, created_at DATETIME)")
+    conn.executemany(
+        "INSERT INTO t VALUES (?, ?, NULL)",
+        [(1, 100), (2, 200), (3, 300), (4, 250), (5, 150)],
+    )
+    _, where, params = build_delta_filter(COL_INFO, KEYSET, "updated_at", (3, "updated_at", "200"))
+    rows = conn.execute(f"SELECT id FROM t WHERE {where} ORDER BY id", params).fetchall()
+    # id 4、5 是新行，id 2 的修改时间等于检查点，id 3 在检查点之后修改
+    assert [row[0] for row in rows] == [2, 3, 4, 5]
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+import pytest
+
+from schema_diff import normalize_default
+
+
+@pytest.mark.parametrize(
+    "default, expected",
+    [
+        (None, None),
+        # PostgreSQL 返回带类型转换的默认值，SQLite 返回原始字面量
+        ("'abc'::character varying", "abc"),
+        ("'abc'::character varying(255)", "abc"),
+        ("'abc'", "abc"),
+        ("'it''s'::text", "it's"),
+        ("''::text", ""),
+        ("'1'::bigint", Decimal(1)),
+        ("0", Decimal(0)),
+        ("1.50", Decimal("1.5")),
+        ("'1.5'::numeric(10, 2)", Decimal("1.5")),
+        ("-1", Decimal(-1)),
+        ("true", "true"),
+        ("TRUE", "true"),
+        ("'false'::boolean", "false"),
+        ("CURRENT_TIMESTAMP", "CURRENT_TIMESTAMP"),
+        ("  'x'::text  ", "x"),
+    ],
+)
+def test_normalize_default(default, expected):
+    assert normalize_default(default) == expected
+
+
+@pytest.mark.parametrize(
+    "sqlite_default, pg_default",
+    [
+        ("0", "'0'::bigint"),
+        ("1.0", "1"),
+        ("'default'", "'default'::character varying"),
+        ("1", "1::smallint"),
+    ],
+)
+def test_equivalent_defaults_compare_equal(sqlite_default, pg_default):
+    assert normalize_default(sqlite_default) == normalize_default(pg_default)
@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+from psycopg import sql
+
+from sync_pg import build_bucket_condition, build_bucket_expression
+
+BUCKET_SIZE = 10
+KEYS = range(-35, 36)
+
+
+def render(composable):
+    # psycopg 在负数字面量前加空格，比较前合并空白
+    return " ".join(composable.as_string(None).split())
+
+
+def bucket_of(key):
+    # PostgreSQL 的整数除法向零取整
+    return int(key / BUCKET_SIZE)
+
+
+@pytest.fixture(scope="module")
+def keys_db():
+    # SQLite 的整数除法同样向零取整，可以直接执行生成的条件
+    conn = sqlite3.connect(":memory:")
+    conn.execute('CREATE TABLE t ("id" INTEGER PRIMARY KEY)')
+    conn.executemany("INSERT INTO t VALUES (?)", [(key,) for key in KEYS])
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "buckets",
+    [{0}, {1}, {-1}, {0, 1}, {-1, 0}, {-1, 0, 1}, {-3, -2}, {-2, 0, 3}, {-3, 3}, {2, 3}],
+)
+def test_integer_bucket_condition_selects_bucket_keys(keys_db, buckets):
+    bucket_expr = build_bucket_expression(["id"], True, BUCKET_SIZE, None)
+    condition = render(build_bucket_condition(["id"], True, BUCKET_SIZE, bucket_expr, buckets))
+    rows = keys_db.execute(f"SELECT id FROM t WHERE {condition} ORDER BY id").fetchall()
+    assert [row[0] for row in rows] == [key for key in KEYS if bucket_of(key) in buckets]
+
+
+def test_integer_bucket_expression_matches_condition(keys_db):
+    bucket_expr = render(build_bucket_expression(["id"], True, BUCKET_SIZE, None))
+    rows = keys_db.execute(f"SELECT id, {bucket_expr} FROM t ORDER BY id").fetchall()
+    assert rows == [(key, bucket_of(key)) for key in KEYS]
+
+
+@pytest.mark.parametrize(
+    "buckets, expected",
+    [
+        # 桶 0 从 -(bucket_size - 1) 开始
+        ({0}, '("id" > -10 AND "id" < 10)'),
+        ({0, 1, 2}, '("id" > -10 AND "id" < 30)'),
+        ({3}, '("id" >= 30 AND "id" < 40)'),
+        # 连续桶合并为一个范围
+        ({1, 2, 4}, '("id" >= 10 AND "id" < 30) OR ("id" >= 40 AND "id" < 50)'),
+        ({-2, -1, 0}, '("id" / 10 >= -2 AND "id" / 10 < 1)'),
+    ],
+)
+def test_integer_bucket_condition_merges_ranges(buckets, expected):
+    bucket_expr = build_bucket_expression(["id"], True, BUCKET_SIZE, None)
+    assert render(build_bucket_condition(["id"], True, BUCKET_SIZE, bucket_expr, buckets)) == expected
+
+
+@pytest.mark.parametrize(
+    "pk_columns, integer_key, expected",
+    [
+        (["id"], True, '("id" / 10)'),
+        (["id"], False, "(('x' || substr(md5(ROW(\"id\")::text), 1, 8))::bit(32)::bigint % 64)"),
+        (
+            ["user_id", "token"],
+            False,
+            "(('x' || substr(md5(ROW(\"user_id\", \"token\")::text), 1, 8))::bit(32)::bigint % 64)",
+        ),
+        ([], False, "0"),
+    ],
+)
+def test_build_bucket_expression(pk_columns, integer_key, expected):
+    assert render(build_bucket_expression(pk_columns, integer_key, BUCKET_SIZE, 64)) == expected
+
+
+def test_hashed_bucket_condition_lists_sorted_buckets():
+    bucket_expr = build_bucket_expression(["token"], False, BUCKET_SIZE, 64)
+    condition = render(build_bucket_condition(["token"], False, BUCKET_SIZE, bucket_expr, {5, 0, 63}))
+    assert condition == f"{render(bucket_expr)} = ANY({render(sql.Literal([0, 5, 63]))})"
@@ -0,0 +1,69 @@
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from table_filters import filter_tables, parse_since, window_bound
+
+TABLES = ["logs", "statistics", "log_archive", "users", "Logs"]
+
+
+@pytest.mark.parametrize("value, days", [("0d", 0), ("7d", 7), (" 30d ", 30)])
+def test_parse_since_days_counts_from_utc_midnight(value, days):
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    assert parse_since(value) == today - timedelta(days=days)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        # 不带时区的日期和时间按 UTC 处理
+        ("2024-06-01", datetime(2024, 6, 1, tzinfo=timezone.utc)),
+        ("2024-06-01T12:30:00", datetime(2024, 6, 1, 12, 30, tzinfo=timezone.utc)),
+        ("2024-06-01 12:30:00+08:00", datetime(2024, 6, 1, 4, 30, tzinfo=timezone.utc)),
+    ],
+)
+def test_parse_since_iso_dates(value, expected):
+    assert parse_since(value) == expected
+
+
+@pytest.mark.parametrize("value", ["7", "d", "7 days", "-7d", "2024-13-01", ""])
+def test_parse_since_rejects_invalid_values(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_since(value)
+
+
+@pytest.mark.parametrize(
+    "include, exclude, expected",
+    [
+        (None, None, TABLES),
+        ([], [], TABLES),
+        (["logs"], None, ["logs"]),
+        # 模式区分大小写，结果保持原有顺序
+        (["log*"], None, ["logs", "log_archive"]),
+        (["users", "log*"], None, ["logs", "log_archive", "users"]),
+        (None, ["log*"], ["statistics", "users", "Logs"]),
+        (["log*", "stat*"], ["*_archive"], ["logs", "statistics"]),
+        (["log?"], None, ["logs"]),
+        (["missing"], None, []),
+    ],
+)
+def test_filter_tables(include, exclude, expected):
+    assert filter_tables(TABLES, include, exclude) == expected
+
+
+@pytest.mark.parametrize(
+    "table, column_type, expected",
+    [
+        ("logs", "INTEGER", ("created_at", 1717200000)),
+        ("logs", "bigint", ("created_at", 1717200000)),
+        ("statistics", "date", ("date", "2024-06-01")),
+        ("users", "integer", None),
+    ],
+)
+def test_window_bound(table, column_type, expected):
+    assert window_bound(table, datetime(2024, 6, 1, tzinfo=timezone.utc), column_type) == expected
+
+
+def test_window_bound_without_since():
+    assert window_bound("logs", None, "integer") is None